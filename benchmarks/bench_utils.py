@@ -0,0 +1,236 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import gc
+import io
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import lib.config.config_defn as config_defn
+from lib.clients.http_encoding import ResponseStream, accepts_gzip
+
+
+class BenchResult:
+
+    def __init__(self, _name, _wall_time, _peak_mem, _size=None, _allocs=None):
+        self.name = _name
+        self.wall_time = _wall_time
+        self.peak_mem = _peak_mem
+        self.size = _size
+        self.allocs = _allocs
+
+    def mb_per_sec(self):
+        if not self.size or not self.wall_time:
+            return 0.0
+        return self.size / self.wall_time / 1024 / 1024
+
+
+def measure(_name, _func, *args, trace_mem=True, **kwargs):
+    """
+    Calls the function once and returns a tuple of the BenchResult
+    and the value returned by the function.  Wall time is measured
+    without tracemalloc running since tracing slows python down
+    considerably, then the call is repeated with tracing enabled
+    to obtain the peak memory and number of allocations.
+    The function may return a tuple of (size, object) in which case
+    the allocations counted are the blocks still held by the object.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    value = _func(*args, **kwargs)
+    wall_time = time.perf_counter() - start
+    size = result_size(value)
+    peak_mem = None
+    allocs = None
+    if trace_mem:
+        value = None
+        gc.collect()
+        tracemalloc.start()
+        value = _func(*args, **kwargs)
+        snapshot = tracemalloc.take_snapshot()
+        peak_mem = tracemalloc.get_traced_memory()[1]
+        allocs = sum(stat.count for stat in snapshot.statistics('filename'))
+        tracemalloc.stop()
+    return BenchResult(_name, wall_time, peak_mem, size, allocs), value
+
+
+def result_size(_value):
+    if _value is None:
+        return None
+    elif isinstance(_value, tuple):
+        return result_size(_value[0])
+    elif isinstance(_value, (bytes, bytearray)):
+        return len(_value)
+    elif isinstance(_value, str):
+        return len(_value.encode())
+    elif isinstance(_value, int):
+        return _value
+    elif isinstance(_value, io.BytesIO):
+        return _value.getbuffer().nbytes
+    else:
+        return None
+
+
+def format_bytes(_num):
+    if _num is None:
+        return '-'
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(_num) < 1024:
+            return '{:.1f}{}'.format(_num, unit)
+        _num /= 1024
+    return '{:.1f}TB'.format(_num)
+
+
+def print_results(_title, _results, show_rate=False, show_allocs=False):
+    print()
+    print(_title)
+    header = '{:<40} {:>10} {:>10} {:>10}'.format('benchmark', 'time(s)', 'peak mem', 'size')
+    if show_rate:
+        header += ' {:>10}'.format('MB/s')
+    if show_allocs:
+        header += ' {:>10}'.format('blocks')
+    print(header)
+    print('-' * len(header))
+    for res in _results:
+        line = '{:<40} {:>10.4f} {:>10} {:>10}'.format(
+            res.name, res.wall_time, format_bytes(res.peak_mem), format_bytes(res.size))
+        if show_rate:
+            line += ' {:>10.1f}'.format(res.mb_per_sec())
+        if show_allocs:
+            line += ' {:>10}'.format('-' if res.allocs is None else res.allocs)
+        print(line)
+
+
+class BenchEnv:
+    """
+    Creates a temporary data area with a default configuration so the
+    database classes can be used without a running cabernet instance.
+    """
+
+    def __init__(self, _keep=False):
+        self.keep = _keep
+        self.tmp_dir = tempfile.mkdtemp(prefix='cabernet_bench_')
+        self.config = config_defn.load_default_config_defns().get_default_config()
+        paths = self.config['paths']
+        paths['main_dir'] = os.getcwd()
+        paths['data_dir'] = self.tmp_dir
+        for folder in ['db_dir', 'logs_dir', 'thumbnails_dir', 'tmp_dir']:
+            paths[folder] = os.path.join(self.tmp_dir, folder)
+            os.makedirs(paths[folder], exist_ok=True)
+        paths['config_file'] = os.path.join(self.tmp_dir, 'config.ini')
+
+    def add_instance(self, _namespace, _instance, _enabled=True, _prefix=None):
+        """
+        Adds the minimal plugin and instance sections used by the
+        channel and epg generators
+        """
+        ns = _namespace.lower()
+        if ns not in self.config:
+            self.config[ns] = {'enabled': True, 'epg-days': 7,
+                               'epg-days_start_refresh': 1}
+        self.config[ns + '_' + _instance] = {
+            'enabled': _enabled,
+            'epg-enabled': True,
+            'epg-prefix': _prefix,
+            'epg-suffix': None,
+            'player-stream_type': 'internalproxy',
+            'channel-group_name': None,
+        }
+
+    def cleanup(self):
+        if not self.keep:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class FakeInstance:
+
+    def __init__(self):
+        self.enabled = True
+
+
+class FakePlugin:
+
+    def __init__(self, _namespace, _instances, _enabled=True):
+        self.enabled = _enabled
+        self.plugin_settings = {
+            'name': _namespace,
+            'website': 'https://example.com/' + _namespace.lower()}
+        # a disabled plugin never creates its plugin object
+        self.plugin_obj = self if _enabled else None
+        self.instances = {inst: FakeInstance() for inst in _instances}
+
+
+class FakePlugins:
+    """
+    Minimal stand in for the PluginHandler object
+    """
+
+    def __init__(self, _config_obj, _plugins):
+        self.config_obj = _config_obj
+        self.plugins = _plugins
+
+
+class FakeConfigObj:
+
+    def __init__(self, _config):
+        self.data = _config
+
+
+class FakeWebserver:
+    """
+    Minimal stand in for the WebHTTPHandler object.  All output is
+    written to an in-memory buffer.
+    """
+
+    def __init__(self, _config, _plugins, _query_data=None):
+        self.config = _config
+        self.plugins = _plugins
+        self.query_data = {'name': None, 'instance': None}
+        if _query_data:
+            self.query_data.update(_query_data)
+        self.headers = {}
+        self.stream_url = '127.0.0.1:5004'
+        self.wfile = io.BytesIO()
+        self.response_code = None
+
+    def do_mime_response(self, _code, _mime, _reply_str=None):
+        self.response_code = _code
+        if _reply_str:
+            self.wfile.write(_reply_str.encode())
+
+    def do_dict_response(self, _rsp_dict):
+        self.response_code = _rsp_dict['code']
+        if _rsp_dict['text']:
+            self.wfile.write(_rsp_dict['text'].encode())
+
+    def do_write(self, _data):
+        self.wfile.write(_data)
+
+    def do_stream_response(self, _code, _headers):
+        self.response_code = _code
+        return ResponseStream(self.wfile)
+
+    def is_gzip_response(self):
+        return accepts_gzip(self.headers.get('Accept-Encoding'))
+
+    def reset(self):
+        self.wfile = io.BytesIO()
+        self.response_code = None
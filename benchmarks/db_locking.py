@@ -0,0 +1,154 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Benchmark for sqlite lock contention between processes.  Writer
+processes store large json blobs, like an EPG refresh, while reader
+processes look up records, like the admin pages and tuners.
+
+usage: python -m benchmarks.db_locking [--writers N] [--readers N] [--seconds N]
+
+Each run is done twice, once with the legacy connection settings
+(rollback journal, no pragmas) and once with the current settings
+(WAL and tuned pragmas).  Reports the operations completed, the
+latency of each operation, which includes any time waiting on a
+lock, and the number of "database is locked" retries.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import random
+import time
+
+import lib.db.db as db
+from benchmarks.bench_utils import BenchEnv
+from lib.db.db_temp import DBTemp
+
+NAMESPACE = 'bench'
+BLOB_SIZE = 50000
+
+
+class RetryCounter(logging.Handler):
+    """
+    Counts the retry warnings logged by the DB class
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.retries = 0
+
+    def emit(self, record):
+        if 'retrying' in record.getMessage():
+            self.retries += 1
+
+
+def set_mode(_mode):
+    if _mode == 'legacy':
+        db.DB.pragmas = []
+        db.BUSY_TIMEOUT = 5000
+    else:
+        db.DB.pragmas = db.SQL_PRAGMAS
+        db.BUSY_TIMEOUT = 10000
+
+
+def worker(_mode, _config, _role, _records, _seconds, _results):
+    set_mode(_mode)
+    counter = RetryCounter()
+    logging.getLogger().addHandler(counter)
+    db_temp = DBTemp(_config)
+    blob = {'data': 'x' * BLOB_SIZE}
+    latencies = []
+    end_time = time.time() + _seconds
+    while time.time() < end_time:
+        key = str(random.randrange(_records))
+        start = time.perf_counter()
+        if _role == 'writer':
+            db_temp.save_json(NAMESPACE, key, 'blob', blob)
+        else:
+            db_temp.get_record(NAMESPACE, key, 'blob')
+        latencies.append(time.perf_counter() - start)
+    _results.put((_role, latencies, counter.retries))
+
+
+def percentile(_values, _pct):
+    if not _values:
+        return 0.0
+    values = sorted(_values)
+    return values[min(int(len(values) * _pct / 100), len(values) - 1)]
+
+
+def run_mode(_mode, _args):
+    env = BenchEnv(_args.keep)
+    set_mode(_mode)
+    db_temp = DBTemp(env.config)
+    blob = {'data': 'x' * BLOB_SIZE}
+    for i in range(_args.records):
+        db_temp.save_json(NAMESPACE, str(i), 'blob', blob)
+    db_temp.close()
+
+    results = multiprocessing.Queue()
+    procs = []
+    for role, count in [('writer', _args.writers), ('reader', _args.readers)]:
+        for i in range(count):
+            procs.append(multiprocessing.Process(
+                target=worker, args=(_mode, env.config, role, _args.records,
+                                     _args.seconds, results)))
+    for proc in procs:
+        proc.start()
+    stats = {'writer': ([], 0), 'reader': ([], 0)}
+    for i in range(len(procs)):
+        role, latencies, retries = results.get()
+        stats[role][0].extend(latencies)
+        stats[role] = (stats[role][0], stats[role][1] + retries)
+    for proc in procs:
+        proc.join()
+    env.cleanup()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='sqlite lock contention benchmark')
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--records', type=int, default=200)
+    parser.add_argument('--seconds', type=int, default=5)
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the temporary database folder')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print()
+    print('{} writers, {} readers for {} seconds'.format(
+        args.writers, args.readers, args.seconds))
+    header = '{:<8} {:<7} {:>8} {:>9} {:>9} {:>9} {:>9} {:>8}'.format(
+        'mode', 'role', 'ops', 'ops/s', 'p50(ms)', 'p95(ms)', 'max(ms)', 'retries')
+    print(header)
+    print('-' * len(header))
+    for mode in ['legacy', 'wal']:
+        stats = run_mode(mode, args)
+        for role in ['writer', 'reader']:
+            latencies, retries = stats[role]
+            print('{:<8} {:<7} {:>8} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8}'.format(
+                mode, role, len(latencies), len(latencies) / args.seconds,
+                percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                max(latencies or [0]) * 1000, retries))
+
+
+if __name__ == '__main__':
+    main()
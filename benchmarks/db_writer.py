@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Benchmark for writes from many threads in one process, like the
+tuner handlers updating channels while scheduler tasks and admin
+edits run.  Writer threads store small records while reader threads
+look up records.
+
+usage: python -m benchmarks.db_writer [--writers N] [--readers N] [--seconds N]
+
+Each run is done twice, once with each thread committing its own
+writes and once with the single writer thread enabled.  Reports the
+operations completed and the latency of each operation, which
+includes any time waiting on a lock or for the acknowledgement.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import random
+import threading
+import time
+
+from benchmarks.bench_utils import BenchEnv
+from benchmarks.db_locking import percentile
+from lib.db.db_temp import DBTemp
+from lib.db.db_writer import DBWriter
+
+NAMESPACE = 'bench'
+
+
+def worker(_config, _role, _records, _seconds, _results):
+    db_temp = DBTemp(_config)
+    latencies = []
+    end_time = time.time() + _seconds
+    while time.time() < end_time:
+        key = str(random.randrange(_records))
+        start = time.perf_counter()
+        if _role == 'writer':
+            db_temp.save_json(NAMESPACE, key, 'rec', {'atsc': key})
+        else:
+            db_temp.get_record(NAMESPACE, key, 'rec')
+        latencies.append(time.perf_counter() - start)
+    _results.append((_role, latencies))
+
+
+def run_mode(_mode, _args, _queue):
+    """
+    Runs in its own process so the connections of the other mode are not reused
+    """
+    env = BenchEnv(_args.keep)
+    env.config['datamgmt']['db-single_writer'] = _mode == 'single'
+    db_temp = DBTemp(env.config)
+    for i in range(_args.records):
+        db_temp.save_json(NAMESPACE, str(i), 'rec', {'atsc': i})
+
+    results = []
+    threads = []
+    for role, count in [('writer', _args.writers), ('reader', _args.readers)]:
+        for i in range(count):
+            threads.append(threading.Thread(
+                target=worker, args=(env.config, role, _args.records,
+                                     _args.seconds, results)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    DBWriter.stop_all()
+    env.cleanup()
+    stats = {'writer': [], 'reader': []}
+    for role, latencies in results:
+        stats[role].extend(latencies)
+    _queue.put(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='sqlite single writer benchmark')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--seconds', type=int, default=5)
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the temporary database folder')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print()
+    print('{} writer threads, {} reader threads for {} seconds'.format(
+        args.writers, args.readers, args.seconds))
+    header = '{:<8} {:<7} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+        'mode', 'role', 'ops', 'ops/s', 'p50(ms)', 'p95(ms)', 'max(ms)')
+    print(header)
+    print('-' * len(header))
+    for mode in ['direct', 'single']:
+        stats_queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run_mode, args=(mode, args, stats_queue))
+        proc.start()
+        stats = stats_queue.get()
+        proc.join()
+        for role in ['writer', 'reader']:
+            latencies = stats[role]
+            print('{:<8} {:<7} {:>8} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+                mode, role, len(latencies), len(latencies) / args.seconds,
+                percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                max(latencies or [0]) * 1000))
+
+
+if __name__ == '__main__':
+    main()
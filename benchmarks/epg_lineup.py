@@ -0,0 +1,262 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Benchmark for the EPG and lineup generators using a synthetic
+channel and program data set.
+
+usage: python -m benchmarks.epg_lineup [--channels N] [--days N] ...
+
+Reports the wall time, peak python memory and response size for the
+xmltv.xml, channels.m3u, lineup.json, lineup.xml and channel editor
+page builders and the /auto/v channel number lookup.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import time
+
+import lib.common.utils as utils
+from benchmarks.bench_utils import BenchEnv, BenchResult, FakeConfigObj, \
+    FakePlugin, FakePlugins, FakeWebserver, measure, print_results
+from lib.clients.channels.channels import get_channels_json, \
+    get_channels_m3u, get_channels_xml
+from lib.clients.channels.channels_form_html import ChannelsFormHTML
+from lib.clients.epg2xml import EPG
+from lib.clients.now_next import NowNext
+from lib.clients.channels.lineup_cache import LineupCache, send_document
+from lib.clients.web_tuner import ChannelNumbers
+from lib.clients.xmltv_artifact import XMLTVArtifact, serve
+from lib.db.db_channels import DBChannels
+from lib.db.db_config_defn import DBConfigDefn
+from lib.db.db_epg import DBepg
+from lib.db.db_epg_programs import DBEpgPrograms
+
+STREAM_URL = '127.0.0.1:5004'
+GENRES = ['News', 'Sports', 'Movie', 'Comedy', 'Drama', 'Kids', 'Music']
+
+
+def gen_channel(_ns, _inst, _idx):
+    uid = '{}{}{:06d}'.format(_ns, _inst, _idx)
+    return {
+        'id': uid,
+        'enabled': True,
+        'callsign': 'CALL{}'.format(_idx),
+        'number': str(_idx + 1),
+        'name': '{} Channel {}'.format(_ns, _idx),
+        'HD': _idx % 2,
+        'group_hdtv': 'HD',
+        'group_sdtv': 'SD',
+        'groups_other': None,
+        'thumbnail': 'https://example.com/logos/{}.png'.format(uid),
+        'thumbnail_size': (180, 120),
+        'VOD': False,
+        'stream_url': 'https://example.com/live/{}.m3u8'.format(uid),
+    }
+
+
+def gen_program(_ch_id, _start, _minutes, _idx):
+    stop = _start + datetime.timedelta(minutes=_minutes)
+    return {
+        'channel': _ch_id, 'progid': '{}.{}'.format(_ch_id, _idx),
+        'start': _start.strftime('%Y%m%d%H%M%S +0000'),
+        'stop': stop.strftime('%Y%m%d%H%M%S +0000'),
+        'length': _minutes, 'title': 'Program Title {} & Friends'.format(_idx % 97),
+        'subtitle': 'Episode <{}>'.format(_idx),
+        'entity_type': None,
+        'desc': 'A long description of the program number {} with '
+                'enough text to look like a real listing.'.format(_idx),
+        'short_desc': 'Short description {}'.format(_idx),
+        'video_quality': 'HDTV' if _idx % 2 else None,
+        'cc': bool(_idx % 3), 'live': False, 'finale': False,
+        'premiere': not _idx % 11, 'air_date': '20210101',
+        'formatted_date': '2021/01/01',
+        'icon': 'https://example.com/images/{}.jpg'.format(_idx % 500),
+        'rating': 'TV-PG', 'is_new': bool(_idx % 2),
+        'genres': [GENRES[_idx % len(GENRES)], GENRES[(_idx + 3) % len(GENRES)]],
+        'directors': ['Director {}'.format(_idx % 13)],
+        'actors': ['Actor {}'.format(_idx % 17), 'Actor {}'.format(_idx % 19)],
+        'season': 1, 'episode': _idx % 24,
+        'se_common': 'S01E{:02d}'.format(_idx % 24),
+        'se_xmltv_ns': '0.{}.'.format(_idx % 24),
+        'se_progid': 'EP{:08d}.{:04d}'.format(_idx % 5000, _idx % 24)}
+
+
+def populate(_env, _args):
+    """
+    Fills the channels, epg and epg_programs databases.  Channels are
+    evenly split across all namespace/instance pairs.
+    """
+    config = _env.config
+    channels_db = DBChannels(config)
+    epg_db = DBepg(config)
+    programs_db = DBEpgPrograms(config)
+    plugins = {}
+    pairs = []
+    for n in range(_args.namespaces):
+        ns = 'Bench{}'.format(n)
+        inst_list = ['Inst{}'.format(i) for i in range(_args.instances)]
+        plugins[ns] = FakePlugin(ns, inst_list)
+        for inst in inst_list:
+            _env.add_instance(ns, inst)
+            pairs.append((ns, inst))
+    plugins['BenchDisabled'] = FakePlugin('BenchDisabled', [], _enabled=False)
+
+    per_instance = max(1, _args.channels // len(pairs))
+    slot_min = int(24 * 60 / _args.programs)
+    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    prog_ids = set()
+    for ns, inst in pairs:
+        ch_list = [gen_channel(ns, inst, i) for i in range(per_instance)]
+        channels_db.save_channel_list(ns, inst, ch_list)
+        for d in range(_args.days):
+            day_start = today + datetime.timedelta(days=d)
+            prog_list = []
+            idx = 0
+            for ch in ch_list:
+                for p in range(_args.programs):
+                    start = day_start + datetime.timedelta(minutes=p * slot_min)
+                    prog = gen_program(ch['id'], start, slot_min, idx)
+                    prog_list.append(prog)
+                    if prog['se_progid'] not in prog_ids:
+                        prog_ids.add(prog['se_progid'])
+                        programs_db.save_program(ns, prog['se_progid'], prog)
+                    idx += 1
+            epg_db.save_program_list(ns, inst, day_start.date(), prog_list)
+    # /auto/v reads the instance prefix and suffix from the saved config
+    DBConfigDefn(config).add_config(config)
+    return plugins, pairs
+
+
+def run_epg(_plugins, _config, _namespace=None, _instance=None, _filters=None):
+    webserver = FakeWebserver(_config, _plugins,
+                              {'name': _namespace, 'instance': _instance})
+    epg = EPG(_plugins, _namespace, _instance, _filters)
+    epg.get_epg_xml(webserver)
+    return webserver.wfile.getbuffer().nbytes
+
+
+def run_epg_prebuilt(_plugins, _config, _headers=None):
+    webserver = FakeWebserver(_config, _plugins)
+    webserver.headers = _headers or {}
+    serve(webserver)
+    return webserver.wfile.getbuffer().nbytes
+
+
+def run_now_next(_config, _cached=False):
+    if not _cached:
+        NowNext.listings.clear()
+    return json.dumps(NowNext(_config).get())
+
+
+def run_lineup_cached(_plugins, _config, _builder, _headers=None):
+    webserver = FakeWebserver(_config, _plugins)
+    webserver.headers = _headers or {}
+    send_document(webserver, 'application/json', _builder)
+    return webserver.wfile.getbuffer().nbytes
+
+
+def run_autov_scan(_config, _chnum):
+    """
+    The /auto/v lookup before the channel number map
+    """
+    station_list = DBChannels(_config).get_channels(None, None)
+    for station in station_list.keys():
+        updated_chnum = utils.wrap_chnum(
+            str(station_list[station][0]['display_number']), station_list[station][0]['namespace'],
+            station_list[station][0]['instance'], _config)
+        if updated_chnum == _chnum:
+            return station
+    return None
+
+
+def run_benchmarks(_env, _plugins, _pairs, _trace_mem):
+    config = _env.config
+    plugins_obj = FakePlugins(FakeConfigObj(config), _plugins)
+    plugin_dict = plugins_obj.plugins
+    ns, inst = _pairs[0]
+    # an unknown number is the worst case for the scan
+    missing_chnum = '99999'
+    results = []
+    tests = [
+        ('xmltv.xml all', run_epg, (plugins_obj, config)),
+        ('xmltv.xml one instance', run_epg, (plugins_obj, config, ns, inst)),
+        ('xmltv.xml 24 hours', run_epg, (plugins_obj, config, None, None, {
+            'start': int(time.time()), 'end': int(time.time()) + 86400})),
+        ('xmltv.xml 10 channels', run_epg, (plugins_obj, config, None, None, {
+            'channel': {str(x) for x in range(1, 11)}})),
+        ('xmltv.xml prebuild', lambda: XMLTVArtifact(plugins_obj).build(), ()),
+        ('xmltv.xml prebuilt', run_epg_prebuilt, (plugins_obj, config)),
+        ('xmltv.xml prebuilt gzip', run_epg_prebuilt,
+            (plugins_obj, config, {'Accept-Encoding': 'gzip'})),
+        ('nownext.json', run_now_next, (config,)),
+        ('nownext.json cached', run_now_next, (config, True)),
+        ('channels.m3u', get_channels_m3u, (config, STREAM_URL, None, None, plugin_dict)),
+        ('lineup.json', get_channels_json, (config, STREAM_URL, None, None, plugin_dict)),
+        ('lineup.xml', get_channels_xml, (config, STREAM_URL, None, None, plugin_dict)),
+        ('lineup.json cache build', run_lineup_cached, (plugins_obj, config, get_channels_json)),
+        ('lineup.json cached', run_lineup_cached, (plugins_obj, config, get_channels_json)),
+        ('lineup.json cached gzip', run_lineup_cached,
+            (plugins_obj, config, get_channels_json, {'Accept-Encoding': 'gzip'})),
+        ('lineup.json not modified', lambda: run_lineup_cached(
+            plugins_obj, config, get_channels_json, {'If-None-Match': '"{}"'.format(
+                LineupCache.get(get_channels_json, config, STREAM_URL, None, None,
+                                plugin_dict).fingerprint)}), ()),
+        ('/auto/v scan unknown number', run_autov_scan, (config, missing_chnum)),
+        ('/auto/v map build', ChannelNumbers.get_uid,
+            (config, DBChannels(config), None, None, missing_chnum)),
+        ('/auto/v lookup unknown number', ChannelNumbers.get_uid,
+            (config, DBChannels(config), None, None, missing_chnum)),
+        ('channel editor one namespace',
+            lambda: ChannelsFormHTML(DBChannels(config), config).get(ns, None, None, None), ()),
+    ]
+    for name, func, args in tests:
+        res, value = measure(name, func, *args, trace_mem=_trace_mem)
+        results.append(res)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EPG and lineup generation benchmark')
+    parser.add_argument('--channels', type=int, default=1000, help='total number of channels')
+    parser.add_argument('--days', type=int, default=7, help='number of EPG days')
+    parser.add_argument('--programs', type=int, default=24, help='programs per channel per day')
+    parser.add_argument('--namespaces', type=int, default=2, help='number of plugins')
+    parser.add_argument('--instances', type=int, default=2, help='instances per plugin')
+    parser.add_argument('--no-mem', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary data folder')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    env = BenchEnv(args.keep)
+    try:
+        start = time.perf_counter()
+        plugins, pairs = populate(env, args)
+        populate_res = BenchResult('populate databases', time.perf_counter() - start, None)
+        print('Data: {} channels, {} days, {} programs/channel/day, {} instances, folder {}'
+              .format(args.channels, args.days, args.programs, len(pairs), env.tmp_dir))
+        results = run_benchmarks(env, plugins, pairs, not args.no_mem)
+        print_results('EPG and lineup generation', [populate_res] + results)
+    finally:
+        env.cleanup()
+
+
+if __name__ == '__main__':
+    main()
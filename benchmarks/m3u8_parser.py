@@ -0,0 +1,152 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Benchmark for the m3u8 parser and model construction using synthetic
+media playlists with thousands of segments, cue-out/cue-in markers,
+key rotation, program-date-time tags and LL-HLS partial segments.
+
+usage: python -m benchmarks.m3u8_parser [--segments N] [--repeat N]
+
+Reports the time, peak python memory and number of memory blocks held
+by the results of parse(), loads() (parse plus model objects) and dumps().
+"""
+
+import argparse
+import datetime
+import logging
+
+import lib.m3u8 as m3u8
+from benchmarks.bench_utils import measure, print_results
+
+BASE_URI = 'https://example.com/live/channel/'
+
+
+def gen_playlist(_segments, _cue_every, _key_every, _parts, _pdt=True):
+    """
+    Generates a live media playlist.  When _parts is non-zero, the last
+    segments include LL-HLS partial segments, a preload hint and
+    rendition reports.
+    """
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:9',
+        '#EXT-X-TARGETDURATION:6',
+        '#EXT-X-MEDIA-SEQUENCE:1000',
+        '#EXT-X-DISCONTINUITY-SEQUENCE:3',
+    ]
+    if _parts:
+        lines.append('#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK=3.0,'
+                     'CAN-SKIP-UNTIL=36.0')
+        lines.append('#EXT-X-PART-INF:PART-TARGET=1.0')
+    pdt = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    cue_len = 5
+    for i in range(_segments):
+        if _key_every and i % _key_every == 0:
+            lines.append('#EXT-X-KEY:METHOD=AES-128,URI="{}keys/{}.key",IV=0x{:032x}'
+                         .format(BASE_URI, i // _key_every, i))
+        if _cue_every and i % _cue_every == 0 and i:
+            lines.append('#EXT-X-DISCONTINUITY')
+            lines.append('#EXT-X-CUE-OUT:DURATION={}'.format(cue_len * 6))
+        elif _cue_every and i % _cue_every < cue_len and i > _cue_every:
+            lines.append('#EXT-X-CUE-OUT-CONT:ElapsedTime={},Duration={},SCTE35=/DAlAAAAAAAAAP/wFAUAAAABf+/+'
+                         .format(i % _cue_every * 6, cue_len * 6))
+        elif _cue_every and i % _cue_every == cue_len and i > _cue_every:
+            lines.append('#EXT-X-CUE-IN')
+        if _pdt:
+            lines.append('#EXT-X-PROGRAM-DATE-TIME:' + pdt.isoformat(timespec='milliseconds'))
+        if _parts and i >= _segments - _parts:
+            for p in range(6):
+                lines.append('#EXT-X-PART:DURATION=1.0,URI="part{}.{}.ts"{}'
+                             .format(i, p, ',INDEPENDENT=YES' if p == 0 else ''))
+        lines.append('#EXTINF:6.006,')
+        lines.append('segment{}.ts'.format(i))
+        pdt += datetime.timedelta(seconds=6.006)
+    if _parts:
+        lines.append('#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part{}.0.ts"'.format(_segments))
+        lines.append('#EXT-X-RENDITION-REPORT:URI="../alt/index.m3u8",LAST-MSN={},LAST-PART=2'
+                     .format(1000 + _segments))
+    return '\n'.join(lines) + '\n'
+
+
+def gen_master(_variants):
+    lines = ['#EXTM3U', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for i in range(_variants):
+        lines.append('#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud{}",NAME="English",LANGUAGE="en",'
+                     'DEFAULT=YES,URI="audio/{}/index.m3u8"'.format(i, i))
+        lines.append('#EXT-X-STREAM-INF:BANDWIDTH={},AVERAGE-BANDWIDTH={},RESOLUTION=1280x720,'
+                     'CODECS="avc1.4d401f,mp4a.40.2",FRAME-RATE=29.970,AUDIO="aud{}"'
+                     .format(800000 + i * 1000, 700000 + i * 1000, i))
+        lines.append('video/{}/index.m3u8'.format(i))
+    return '\n'.join(lines) + '\n'
+
+
+def run_parse(_content, _repeat):
+    parsed = [m3u8.parse(_content) for i in range(_repeat)]
+    return len(_content) * _repeat, parsed
+
+
+def run_loads(_content, _repeat):
+    playlists = [m3u8.loads(_content, BASE_URI + 'index.m3u8') for i in range(_repeat)]
+    return len(_content) * _repeat, playlists
+
+
+def run_dumps(_playlist, _repeat):
+    size = 0
+    for i in range(_repeat):
+        size += len(_playlist.dumps())
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='m3u8 parser benchmark')
+    parser.add_argument('--segments', type=int, default=3000, help='segments per playlist')
+    parser.add_argument('--cue-every', type=int, default=50, help='segments between cue-out markers')
+    parser.add_argument('--key-every', type=int, default=10, help='segments between key changes')
+    parser.add_argument('--parts', type=int, default=4, help='segments with LL-HLS parts')
+    parser.add_argument('--variants', type=int, default=50, help='variants in the master playlist')
+    parser.add_argument('--repeat', type=int, default=3, help='number of passes per test')
+    parser.add_argument('--no-mem', action='store_true', help='skip the tracemalloc pass')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    playlists = {
+        'plain': gen_playlist(args.segments, 0, 0, 0, False),
+        'pdt+keys': gen_playlist(args.segments, 0, args.key_every, 0),
+        'pdt+keys+cues': gen_playlist(args.segments, args.cue_every, args.key_every, 0),
+        'll-hls': gen_playlist(args.segments, args.cue_every, args.key_every, args.parts),
+        'master': gen_master(args.variants),
+    }
+    results = []
+    for name, content in playlists.items():
+        res, value = measure('parse ' + name, run_parse, content, args.repeat,
+                             trace_mem=not args.no_mem)
+        results.append(res)
+        res, value = measure('loads ' + name, run_loads, content, args.repeat,
+                             trace_mem=not args.no_mem)
+        results.append(res)
+        playlist = m3u8.loads(content, BASE_URI + 'index.m3u8')
+        res, value = measure('dumps ' + name, run_dumps, playlist, args.repeat,
+                             trace_mem=not args.no_mem)
+        results.append(res)
+    print('{} segments per media playlist, {} passes per test'.format(args.segments, args.repeat))
+    print_results('m3u8 parse and model construction', results, show_rate=True, show_allocs=True)
+
+
+if __name__ == '__main__':
+    main()
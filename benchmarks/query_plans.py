@@ -0,0 +1,213 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Checks the query plans of the channel and epg queries.  Each database
+method is called against a small database while the sql statements
+are recorded, then EXPLAIN QUERY PLAN is run on each statement.
+
+usage: python -m benchmarks.query_plans [--verbose]
+
+Exits with a non-zero status when a statement does a full table scan
+or sorts using a temporary b-tree.
+"""
+
+import argparse
+import logging
+import sys
+
+from benchmarks.bench_utils import BenchEnv
+from lib.db.db import DB
+from lib.db.db_channels import DBChannels
+from lib.db.db_epg import DBepg
+
+NAMESPACES = ['PlutoTV', 'XUMO']
+INSTANCES = ['Default', 'Second']
+
+
+class QueryRecorder:
+    """
+    Records the select, update and delete statements run by the DB class
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.sql_exec = DB.sql_exec
+        self.get_dict_iter = DB.get_dict_iter
+
+    def start(self):
+        recorder = self
+
+        def sql_exec(_self, _sqlcmd, _bindings=None):
+            recorder.statements.append((_self, _sqlcmd, _bindings))
+            return recorder.sql_exec(_self, _sqlcmd, _bindings)
+
+        def get_dict_iter(_self, _table, _where=None, sql=None, **kwargs):
+            sqlcmd = sql or _self.sqlcmds[_table + '_get']
+            recorder.statements.append((_self, sqlcmd, _where))
+            return recorder.get_dict_iter(_self, _table, _where, sql, **kwargs)
+        DB.sql_exec = sql_exec
+        DB.get_dict_iter = get_dict_iter
+
+    def stop(self):
+        DB.sql_exec = self.sql_exec
+        DB.get_dict_iter = self.get_dict_iter
+
+    def take(self):
+        statements = [x for x in self.statements
+                      if x[1].split()[0].upper() in ['SELECT', 'UPDATE', 'DELETE']]
+        self.statements = []
+        return statements
+
+
+def populate(_config):
+    db_channels = DBChannels(_config)
+    db_epg = DBepg(_config)
+    for ns in NAMESPACES:
+        for inst in INSTANCES:
+            ch_list = [{
+                'id': '{}{}'.format(ns, i), 'number': str(i), 'name': 'ch{}'.format(i),
+                'groups_other': None, 'thumbnail': None, 'thumbnail_size': 0, 'HD': 1}
+                for i in range(200)]
+            db_channels.save_channel_list(ns, inst, ch_list)
+            for day in range(5):
+                db_epg.save_program_list(ns, inst, '2023-01-0{}'.format(day + 1), [{
+                    'channel': '{}{}'.format(ns, i),
+                    'start': '2023010{}{:02d}0000 +0000'.format(day + 1, hour),
+                    'stop': '2023010{}{:02d}0000 +0000'.format(day + 1, hour + 1)}
+                    for i in range(20) for hour in range(23)])
+
+
+def epg_query(_db_epg, _namespace, _instance):
+    """
+    get_programs is a generator, the query starts on the first row
+    """
+    return next(_db_epg.get_programs(_namespace, _instance, '2023-01-01'), None)
+
+
+def epg_save(_db_epg, _changed):
+    """
+    Saves a day of programs, with one channel changed when _changed is set
+    """
+    prog_list = [{
+        'channel': 'PlutoTV{}'.format(i),
+        'start': '20230102{:02d}0000 +0000'.format(hour),
+        'stop': '20230102{:02d}0000 +0000'.format(hour + 1),
+        'title': 'changed' if _changed and i == 0 else None}
+        for i in range(20) for hour in range(23)]
+    return _db_epg.save_program_list('PlutoTV', 'Default', '2023-01-02', prog_list)
+
+
+def get_checks(_config):
+    """
+    Returns the list of (name, function[, allow_sort]) to check.
+    allow_sort is set when only the namespace is filtered, the rows
+    of each instance are read in order from the index but the merge
+    of the instances needs a sort.
+    """
+    db_channels = DBChannels(_config)
+    db_epg = DBepg(_config)
+    return [
+        ('channels all', lambda: db_channels.get_channel_cache()),
+        ('channel one', lambda: db_channels.get_channel('PlutoTV1', 'PlutoTV', None)),
+        ('channels sorted ns', lambda: db_channels.get_sorted_channels('PlutoTV', None), True),
+        ('channels sorted all', lambda: db_channels.get_sorted_channels(None, None)),
+        ('channels sorted display', lambda: db_channels.get_sorted_channels(
+            None, None, ['display_number', True])),
+        ('channel names', lambda: db_channels.get_channel_names()),
+        ('channel status', lambda: db_channels.get_status('PlutoTV', 'Default')),
+        ('epg query ns', lambda: epg_query(db_epg, 'PlutoTV', None), True),
+        ('epg query inst', lambda: epg_query(db_epg, 'PlutoTV', 'Default')),
+        ('epg query all', lambda: epg_query(db_epg, None, None)),
+        ('epg channel', lambda: db_epg.get_channel_programs(
+            'PlutoTV', 'Default', 'PlutoTV1', 1672578000, 1672581600)),
+        ('epg channel window', lambda: list(db_epg.get_channel_window(
+            [('PlutoTV', 'Default', 'PlutoTV1')], 1672660000, 1672760000))),
+        ('epg now next', lambda: db_epg.get_now_next(
+            [('PlutoTV', 'Default', 'PlutoTV1')], 1672660000)),
+        ('epg one day', lambda: db_epg.get_epg_one('PlutoTV', 'Default', '2023-01-02')),
+        ('epg last update', lambda: db_epg.get_last_update('PlutoTV', None, '2023-01-01')),
+        ('epg del old', lambda: db_epg.del_old_programs('XUMO', 'Second')),
+        ('epg del old all', lambda: db_epg.del_old_programs(None, None)),
+        ('epg save day', lambda: epg_save(db_epg, False)),
+        ('epg save unchanged', lambda: epg_save(db_epg, False)),
+        ('epg save changed', lambda: epg_save(db_epg, True)),
+        ('epg set last update', lambda: db_epg.set_last_update('XUMO', 'Default')),
+        ('epg del instance', lambda: db_epg.del_instance('XUMO', None)),
+        ('channels del', lambda: db_channels.del_channels('XUMO', 'Default')),
+    ]
+
+
+def check_plan(_db, _sqlcmd, _bindings, _allow_sort=False):
+    """
+    Returns the plan details and the list of problems found
+    """
+    cur = _db.sql_exec('EXPLAIN QUERY PLAN ' + _sqlcmd, _bindings)
+    details = [row[3] for row in cur.fetchall()]
+    cur.close()
+    problems = []
+    for detail in details:
+        if detail.startswith('SCAN (subquery'):
+            # reads the rows of a subquery, whose own plan is checked
+            continue
+        if detail.startswith('SCAN') and 'USING' not in detail:
+            problems.append(detail)
+        elif 'TEMP B-TREE' in detail and not _allow_sort:
+            problems.append(detail)
+    return details, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='channel and epg query plan check')
+    parser.add_argument('--verbose', action='store_true',
+                        help='display the plan of every statement')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the temporary database folder')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    env = BenchEnv(args.keep)
+    populate(env.config)
+    recorder = QueryRecorder()
+    failed = 0
+    try:
+        for check in get_checks(env.config):
+            name, func = check[:2]
+            allow_sort = len(check) > 2 and check[2]
+            recorder.start()
+            func()
+            recorder.stop()
+            for db, sqlcmd, bindings in recorder.take():
+                details, problems = check_plan(db, sqlcmd, bindings, allow_sort)
+                status = 'FAIL' if problems else 'ok'
+                if problems:
+                    failed += 1
+                print('{:<4} {:<24} {}'.format(status, name, ' '.join(sqlcmd.split())[:70]))
+                if args.verbose or problems:
+                    for detail in details:
+                        print('       {}'.format(detail))
+    finally:
+        recorder.stop()
+        env.cleanup()
+    print()
+    print('{} statements with full scans or temporary sorts'.format(failed))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
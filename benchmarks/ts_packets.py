@@ -0,0 +1,278 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Micro-benchmark for the MPEG-TS packet processing used by the stream
+pipeline.  Generates synthetic multi-megabyte segments with and without
+SDT and ATSC PSIP packets and an AES-128 encrypted copy.
+
+usage: python -m benchmarks.ts_packets [--size MB] [--repeat N]
+
+Reports the throughput in MB/s of the segment for each function.
+"""
+
+import argparse
+import logging
+import os
+import struct
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.backends import default_backend
+
+import lib.common.utils as utils
+from benchmarks.bench_utils import BenchEnv, measure, print_results
+from lib.streams.atsc import ATSCMsg, ATSC_MSG_LEN
+from lib.streams.m3u8_queue import M3U8Queue
+from lib.streams.pts_validation import PTSValidation
+from lib.streams.video import Video
+
+PID_PAT = 0x0000
+PID_SDT = 0x0011
+PID_PMT = 0x1000
+PID_VIDEO = 0x0100
+PID_AUDIO = 0x0101
+PID_PSIP = 0x1ffb
+KEY_URI = 'https://example.com/bench.key'
+KEY_DATA = bytes(range(16))
+KEY_IV = '0x000102030405060708090a0b0c0d0e0f'
+
+
+class TSGenerator:
+    """
+    Builds 188 byte transport stream packets with a continuity counter per pid.
+    SDT and PSIP packets are inserted at a fixed interval when enabled.
+    """
+
+    def __init__(self, _with_sdt, _with_atsc):
+        self.with_sdt = _with_sdt
+        self.with_atsc = _with_atsc
+        self.counters = {}
+        self.atsc_msg = ATSCMsg()
+
+    def header(self, _pid, _pusi=False, _adapt=False):
+        cc = self.counters.get(_pid, 0)
+        self.counters[_pid] = (cc + 1) & 0xf
+        word = 0x47000000 | (_pid << 8) | cc
+        if _pusi:
+            word |= 0x400000
+        if _adapt:
+            word |= 0x30
+        else:
+            word |= 0x10
+        return struct.pack('>I', word)
+
+    def section_packet(self, _pid, _table):
+        crc = self.atsc_msg.gen_crc_mpeg(_table)
+        packet = self.header(_pid, True) + b'\x00' + _table + crc
+        return packet.ljust(ATSC_MSG_LEN, b'\xff')
+
+    def pat(self):
+        table = b'\x00\xb0\x0d\x00\x01\xc1\x00\x00\x00\x01' + struct.pack('>H', 0xe000 | PID_PMT)
+        return self.section_packet(PID_PAT, table)
+
+    def pmt(self):
+        table = b'\x02\xb0\x17\x00\x01\xc1\x00\x00' + struct.pack('>H', 0xe000 | PID_VIDEO) \
+            + b'\xf0\x00\x1b' + struct.pack('>H', 0xe000 | PID_VIDEO) + b'\xf0\x00' \
+            + b'\x0f' + struct.pack('>H', 0xe000 | PID_AUDIO) + b'\xf0\x00'
+        return self.section_packet(PID_PMT, table)
+
+    def sdt(self):
+        descr = b'\x01\x08Provider\x07Service'
+        descr = b'\x48' + bytes([len(descr)]) + descr
+        table = b'\x42\xf0\x25\x00\x01\xc1\x00\x00\x00\x01\xff' \
+            + b'\x00\x01\xfc\x80' + bytes([len(descr)]) + descr
+        return self.section_packet(PID_SDT, table)
+
+    def psip(self):
+        # STT table padded out to the 7 packet ATSC block
+        return self.atsc_msg.gen_stt()
+
+    def media(self, _pid, _idx):
+        if _idx % 50 == 0:
+            # adaptation field with a PCR every so often
+            adapt = b'\x07\x10' + os.urandom(6)
+            return self.header(_pid, True, True) + adapt + os.urandom(ATSC_MSG_LEN - 4 - len(adapt))
+        return self.header(_pid) + os.urandom(ATSC_MSG_LEN - 4)
+
+    def segment(self, _size):
+        packets = []
+        num_packets = _size // ATSC_MSG_LEN
+        idx = 0
+        while len(packets) < num_packets:
+            if idx % 400 == 0:
+                packets.append(self.pat())
+                packets.append(self.pmt())
+                if self.with_sdt:
+                    packets.append(self.sdt())
+                if self.with_atsc:
+                    psip = self.psip()
+                    packets.extend(psip[i:i + ATSC_MSG_LEN] for i in range(0, len(psip), ATSC_MSG_LEN))
+            if idx % 8 == 7:
+                packets.append(self.media(PID_AUDIO, idx))
+            else:
+                packets.append(self.media(PID_VIDEO, idx))
+            idx += 1
+        return b''.join(packets[:num_packets])
+
+
+def encrypt(_data):
+    # PKCS7 padding as used by HLS AES-128 segments
+    pad = 16 - len(_data) % 16
+    _data = _data + bytes([pad]) * pad
+    iv = bytearray.fromhex(KEY_IV[2:])
+    encryptor = Cipher(algorithms.AES(KEY_DATA), modes.CBC(iv), default_backend()).encryptor()
+    return encryptor.update(_data) + encryptor.finalize()
+
+
+def gen_pts_json(_data, _jump_pct):
+    """
+    Simulates the ffprobe packet output for the segment with a single
+    large PTS jump at the requested percentage of the packets
+    """
+    packets = []
+    pts = 900000
+    num_packets = len(_data) // ATSC_MSG_LEN
+    jump_at = int(num_packets * _jump_pct / 100)
+    for i in range(num_packets):
+        if i == jump_at:
+            pts += 90000 * 60
+        packets.append({'pts': pts, 'pos': str(i * ATSC_MSG_LEN),
+                        'size': str(ATSC_MSG_LEN), 'duration': 3003})
+        pts += 3003
+    return {'packets': packets}
+
+
+def new_m3u8_queue(_config):
+    """
+    M3U8Queue starts a thread in its constructor, so only the state used
+    by decrypt_stream is created here.
+    """
+    queue = M3U8Queue.__new__(M3U8Queue)
+    queue.logger = logging.getLogger(__name__)
+    queue.config = _config
+    queue.video = Video(_config)
+    queue.key_list = {KEY_URI: KEY_DATA}
+    return queue
+
+
+def run_decode(_atsc_msg, _data):
+    for i in range(0, len(_data) - ATSC_MSG_LEN + 1, ATSC_MSG_LEN):
+        _atsc_msg.decode_ts_packet(_data[i:i + ATSC_MSG_LEN])
+    return len(_data)
+
+
+def run_continuity(_atsc_msg, _data):
+    for i in range(0, len(_data) - ATSC_MSG_LEN + 1, ATSC_MSG_LEN):
+        _atsc_msg.update_continuity_counter(_data[i:i + ATSC_MSG_LEN])
+    return len(_data)
+
+
+def run_crc(_atsc_msg, _data, _msg_len=180):
+    for i in range(0, len(_data) - _msg_len + 1, ATSC_MSG_LEN):
+        _atsc_msg.gen_crc_mpeg(_data[i:i + _msg_len])
+    return len(_data) // ATSC_MSG_LEN * _msg_len
+
+
+def run_sdt(_atsc_msg, _config, _data):
+    video = Video(_config)
+    video.data = _data
+    _atsc_msg.update_sdt_names(video, b'Cabernet', b'Bench Service')
+    return len(_data)
+
+
+def run_psip(_atsc_msg, _data):
+    # extract_psip only looks at the first 7 packets, so the segment is
+    # passed in 7 packet blocks to measure a scan of the whole segment
+    block_len = 7 * ATSC_MSG_LEN
+    for i in range(0, len(_data) - block_len + 1, block_len):
+        _atsc_msg.extract_psip(_data[i:i + block_len])
+    return len(_data) // block_len * block_len
+
+
+def run_pts(_pts_validation, _pts_json, _size):
+    _pts_validation.pts_json = _pts_json
+    _pts_validation.find_bad_pkt_offset(from_front=True)
+    _pts_validation.find_bad_pkt_offset(from_front=False)
+    return _size
+
+
+def run_decrypt(_queue, _data):
+    _queue.video.data = _data
+    _queue.decrypt_stream({'key': {'uri': KEY_URI, 'iv': KEY_IV}})
+    return len(_data)
+
+
+def repeat(_count, _func, *args):
+    size = 0
+    for i in range(_count):
+        size += _func(*args)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TS packet processing benchmark')
+    parser.add_argument('--size', type=float, default=4, help='segment size in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='number of passes per function')
+    parser.add_argument('--crc-size', type=float, default=0.25,
+                        help='MB of packets to run through gen_crc_mpeg')
+    parser.add_argument('--mem', action='store_true', help='include a tracemalloc pass')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    env = BenchEnv()
+    try:
+        env.add_instance('Bench', 'Inst')
+        config = env.config
+        config[utils.instance_config_section('Bench', 'Inst')]['player-pts_max_delta'] = 10000000
+        channel_dict = {'namespace': 'Bench', 'instance': 'Inst', 'uid': 'bench'}
+        size = int(args.size * 1024 * 1024)
+        segments = {
+            'plain': TSGenerator(False, False).segment(size),
+            'sdt': TSGenerator(True, False).segment(size),
+            'sdt+atsc': TSGenerator(True, True).segment(size),
+        }
+        encrypted = encrypt(segments['plain'])
+        crc_data = segments['plain'][:int(args.crc_size * 1024 * 1024)]
+        pts_json = gen_pts_json(segments['plain'], 90)
+        pts_validation = PTSValidation(config, channel_dict)
+        queue = new_m3u8_queue(config)
+        atsc_msg = ATSCMsg()
+
+        tests = []
+        for name, data in segments.items():
+            tests.append(('decode_ts_packet ' + name, run_decode, (atsc_msg, data)))
+        tests.append(('update_continuity_counter', run_continuity, (atsc_msg, segments['plain'])))
+        tests.append(('gen_crc_mpeg', run_crc, (atsc_msg, crc_data)))
+        for name, data in segments.items():
+            tests.append(('update_sdt_names ' + name, run_sdt, (atsc_msg, config, data)))
+            tests.append(('extract_psip ' + name, run_psip, (atsc_msg, data)))
+        tests.append(('find_bad_pkt_offset', run_pts, (pts_validation, pts_json, size)))
+        tests.append(('decrypt_stream aes-128', run_decrypt, (queue, encrypted)))
+
+        results = []
+        for name, func, func_args in tests:
+            res, value = measure(name, repeat, args.repeat, func, *func_args, trace_mem=args.mem)
+            results.append(res)
+        print('Segment size {:.1f}MB, {} passes per function'.format(args.size, args.repeat))
+        print_results('TS packet processing', results, show_rate=True)
+    finally:
+        env.cleanup()
+
+
+if __name__ == '__main__':
+    main()
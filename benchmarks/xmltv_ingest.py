@@ -0,0 +1,211 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+"""
+Benchmark for the ingest of a gzip xmltv file served over http by
+a local web server.
+
+usage: python -m benchmarks.xmltv_ingest [--channels N] [--days N]
+
+Compares downloading and extracting the file and parsing it once for
+each day with the single pass ingest, which parses the file while it
+is downloaded.  The single pass ingest is run a second time with the
+same file to show the cost when nothing changed.  The programs saved
+by both methods are compared.
+"""
+
+import argparse
+import datetime
+import functools
+import gzip
+import http.server
+import logging
+import os
+import threading
+from xml.sax.saxutils import escape
+
+from benchmarks.bench_utils import BenchEnv, format_bytes, measure, print_results
+from lib.common.exceptions import CabernetException
+from lib.common.xmltv import XMLTV
+from lib.db.db_epg import DBepg
+
+NAMESPACE = 'bench'
+GENRES = ['News', 'Sports', 'Movie', 'Comedy', 'Drama', 'Kids', 'Music']
+
+
+def gen_xmltv_file(_path, _channels, _days):
+    """
+    Writes a gzip xmltv file with 30 minute programs listed by channel
+    """
+    start_day = datetime.datetime.combine(datetime.date.today(), datetime.time(),
+                                          tzinfo=datetime.timezone.utc)
+    with gzip.open(_path, 'wt', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv>\n')
+        for ch in range(_channels):
+            f.write('<channel id="ch{}"><display-name>Channel {}</display-name></channel>\n'
+                    .format(ch, ch))
+        for ch in range(_channels):
+            for slot in range(_days * 48):
+                start = start_day + datetime.timedelta(minutes=30 * slot)
+                stop = start + datetime.timedelta(minutes=30)
+                f.write(''.join([
+                    '<programme start="', start.strftime('%Y%m%d%H%M%S +0000'),
+                    '" stop="', stop.strftime('%Y%m%d%H%M%S +0000'),
+                    '" channel="ch', str(ch), '">',
+                    '<title>', escape('Show {} & Co'.format(slot % 97)), '</title>',
+                    '<sub-title>Episode ', str(slot), '</sub-title>',
+                    '<desc>', escape('Description of show {} on channel {} <live>'
+                                     .format(slot, ch)), '</desc>',
+                    '<category>', GENRES[slot % len(GENRES)], '</category>',
+                    '<episode-num system="xmltv_ns">', '{}.{}.'.format(ch % 9, slot % 20),
+                    '</episode-num>',
+                    '<date>2023</date>',
+                    '</programme>\n']))
+        f.write('</tv>\n')
+    return [start_day.date() + datetime.timedelta(days=x) for x in range(_days)]
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, _format, *args):
+        pass
+
+
+def start_server(_folder):
+    handler = functools.partial(QuietHandler, directory=_folder)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    t_server = threading.Thread(target=server.serve_forever, args=())
+    t_server.daemon = True
+    t_server.start()
+    return server
+
+
+def folder_size(_folder):
+    size = 0
+    for root, dirs, files in os.walk(_folder):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+def run_per_day(_config, _url, _instance, _days, _disk_used):
+    """
+    Download, extract and parse the file once for each day
+    """
+    db = DBepg(_config)
+    xmltv = XMLTV(_config, _url, '.gz')
+    count = 0
+    for day in _days:
+        xmltv.set_date(day)
+        prog_list = []
+        iterator = iter(xmltv)
+        while True:
+            prog = next(iterator)
+            if prog is None:
+                break
+            prog_list.append(prog)
+        db.save_program_list(NAMESPACE, _instance, day, prog_list)
+        count += len(prog_list)
+    _disk_used.append(folder_size(_config['paths']['tmp_dir']))
+    xmltv.cleanup_tmp_folder()
+    return count
+
+
+def run_ingest(_config, _url, _instance, _days, _db=None):
+    if _db is None:
+        _db = DBepg(_config)
+    return XMLTV(_config, _url, '.gz', _stream=True).ingest(_db, NAMESPACE, _instance, _days)
+
+
+def saved_programs(_db, _instance, _days):
+    return [sorted(row['json'] for row in
+                   _db.get_dict('epg_program_one', (NAMESPACE, _instance, day)) or [])
+            for day in _days]
+
+
+def run_cut_ingest(_config, _url, _instance, _days, _db):
+    """
+    Ingests a file that ends part way and returns True when the saved
+    programs are unchanged.  The fingerprints are cleared first, like
+    days saved before fingerprints were kept, so every day is replaced.
+    """
+    where, values = _db.build_where([('namespace', NAMESPACE), ('instance', _instance)])
+    _db.delete(None, values, sql=_db.sqlcmds['epg_channel_del'].format(where=where))
+    before = saved_programs(_db, _instance, _days)
+    try:
+        run_ingest(_config, _url, _instance, _days, _db)
+    except CabernetException:
+        pass
+    return saved_programs(_db, _instance, _days) == before
+
+
+def main():
+    parser = argparse.ArgumentParser(description='xmltv ingest benchmark')
+    parser.add_argument('--channels', type=int, default=200)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the temporary database folder')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    env = BenchEnv(args.keep)
+    source_folder = os.path.join(env.tmp_dir, 'source')
+    os.makedirs(source_folder)
+    source_path = os.path.join(source_folder, 'guide.xml.gz')
+    days = gen_xmltv_file(source_path, args.channels, args.days)
+    server = start_server(source_folder)
+    url = 'http://127.0.0.1:{}/guide.xml.gz'.format(server.server_address[1])
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    with open(os.path.join(source_folder, 'guide_cut.xml.gz'), 'wb') as f:
+        f.write(data[:len(data) // 2])
+    cut_url = 'http://127.0.0.1:{}/guide_cut.xml.gz'.format(server.server_address[1])
+
+    instances = iter(range(100))
+    disk_used = []
+    results = []
+    # the program count is returned as the object so it is not shown as a size
+    res, value = measure('per day passes', lambda: (None, run_per_day(
+        env.config, url, 'per_day{}'.format(next(instances)), days, disk_used)))
+    results.append(res)
+    res, value = measure('single pass ingest', lambda: (None, run_ingest(
+        env.config, url, 'ingest{}'.format(next(instances)), days)))
+    results.append(res)
+    db = DBepg(env.config)
+    run_ingest(env.config, url, 'ingest_same', days)
+    db.reset_changes()
+    res, count = measure('single pass ingest, unchanged', lambda: (None, run_ingest(
+        env.config, url, 'ingest_same', days, db)), trace_mem=False)
+    results.append(res)
+    unchanged = db.changes
+    print_results('{} channels, {} days, {} programs, {} compressed'.format(
+        args.channels, args.days, count[1], format_bytes(os.path.getsize(source_path))), results)
+    print()
+    print('temporary files written by the per day passes: {}'.format(
+        format_bytes(disk_used[0])))
+    print('channel days rewritten when unchanged: {} of {}'.format(
+        unchanged['channels_changed'], unchanged['channels']))
+    same = saved_programs(db, 'per_day0', days) == saved_programs(db, 'ingest2', days)
+    print('programs saved by both methods match: {}'.format(same))
+    print('programs kept when the file ends part way: {}'.format(
+        run_cut_ingest(env.config, cut_url, 'ingest_same', days, db)))
+    server.shutdown()
+    env.cleanup()
+
+
+if __name__ == '__main__':
+    main()
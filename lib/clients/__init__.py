@@ -1,2 +1,3 @@
 import lib.clients.epg2xml
 import lib.clients.channels
+import lib.clients.now_next
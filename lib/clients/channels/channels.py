@@ -22,6 +22,7 @@ import urllib.request
 from io import StringIO
 from xml.sax.saxutils import escape
 
+import lib.clients.channels.lineup_cache as lineup_cache
 import lib.common.utils as utils
 from lib.clients.channels.templates import ch_templates
 from lib.common.decorators import getrequest
@@ -39,32 +40,36 @@ def playlist(_webserver):
 
 @getrequest.route('/channels.m3u')
 def channels_m3u(_webserver):
-    _webserver.do_mime_response(200, 'audio/x-mpegurl', get_channels_m3u(
-        _webserver.config, _webserver.stream_url,
-        _webserver.query_data['name'],
-        _webserver.query_data['instance'],
-        _webserver.plugins.plugins
-    ))
+    lineup_cache.send_document(_webserver, 'audio/x-mpegurl', get_channels_m3u)
 
 
 @getrequest.route('/lineup.xml')
 def lineup_xml(_webserver):
-    _webserver.do_mime_response(200, 'application/xml', get_channels_xml(
-        _webserver.config, _webserver.stream_url,
-        _webserver.query_data['name'],
-        _webserver.query_data['instance'],
-        _webserver.plugins.plugins
-    ))
+    lineup_cache.send_document(_webserver, 'application/xml', get_channels_xml)
 
 
 @getrequest.route('/lineup.json')
 def lineup_json(_webserver):
-    _webserver.do_mime_response(200, 'application/json', get_channels_json(
-        _webserver.config, _webserver.stream_url,
-        _webserver.query_data['name'],
-        _webserver.query_data['instance'],
-        _webserver.plugins.plugins
-    ))
+    lineup_cache.send_document(_webserver, 'application/json', get_channels_json)
+
+
+def get_channel_groups(_config, _ch_data):
+    """
+    Returns the list of groups of the channel, starting with the namespace
+    """
+    config_section = utils.instance_config_section(_ch_data['namespace'], _ch_data['instance'])
+    groups = [_ch_data['namespace']]
+    inst_group = _config[config_section]['channel-group_name']
+    if inst_group is not None:
+        groups.append(inst_group)
+    if _ch_data['group_tag']:
+        groups.append(_ch_data['group_tag'])
+    if _ch_data['json']['HD']:
+        if _ch_data['json']['group_hdtv']:
+            groups.append(_ch_data['json']['group_hdtv'])
+    elif _ch_data['json']['group_sdtv']:
+        groups.append(_ch_data['json']['group_sdtv'])
+    return groups
 
 
 def get_channels_m3u(_config, _base_url, _namespace, _instance, _plugins):
@@ -79,12 +84,12 @@ def get_channels_m3u(_config, _base_url, _namespace, _instance, _plugins):
         '%s\n' % format_descriptor
     )
 
-    sids_processed = []
+    sids_processed = set()
     for sid, sid_data_list in ch_data.items():
         for sid_data in sid_data_list:
             if sid in sids_processed:
                 continue
-            sids_processed.append(sid)
+            sids_processed.add(sid)
             if not sid_data['enabled'] \
                     or not _plugins.get(sid_data['namespace']) \
                     or not _plugins[sid_data['namespace']].enabled:
@@ -105,17 +110,7 @@ def get_channels_m3u(_config, _base_url, _namespace, _instance, _plugins):
             # either 'group-title' or 'tvh-tags'
             # if a ';' is used in group-title, tvheadend will use the 
             # entire string as a tag
-            groups = sid_data['namespace']
-            inst_group = _config[config_section]['channel-group_name']
-            if inst_group is not None:
-                groups += '|' + inst_group
-            if sid_data['group_tag']:
-                groups += '|' + '|'.join([sid_data['group_tag']])
-            if sid_data['json']['HD']:
-                if sid_data['json']['group_hdtv']:
-                    groups += '|' + sid_data['json']['group_hdtv']
-            elif sid_data['json']['group_sdtv']:
-                groups += '|' + sid_data['json']['group_sdtv']
+            groups = '|'.join(get_channel_groups(_config, sid_data))
 
             updated_chnum = utils.wrap_chnum(
                 str(sid_data['display_number']), sid_data['namespace'],
@@ -148,13 +143,13 @@ def get_channels_json(_config, _base_url, _namespace, _instance, _plugins):
     db = DBChannels(_config)
     ch_obj = ChannelsURL(_config, _base_url)
     ch_data = db.get_channels(_namespace, _instance)
-    return_json = ''
-    sids_processed = []
+    return_json = []
+    sids_processed = set()
     for sid, sid_data_list in ch_data.items():
         for sid_data in sid_data_list:
             if sid in sids_processed:
                 continue
-            sids_processed.append(sid)
+            sids_processed.add(sid)
             if not sid_data['enabled']:
                 continue
             if not _plugins.get(sid_data['namespace']):
@@ -175,27 +170,26 @@ def get_channels_json(_config, _base_url, _namespace, _instance, _plugins):
             updated_chnum = utils.wrap_chnum(
                 str(sid_data['display_number']), sid_data['namespace'],
                 sid_data['instance'], _config)
-            return_json = return_json + ch_templates['jsonLineup'].format(
+            return_json.append(ch_templates['jsonLineup'].format(
                 sid_data['json']['callsign'],
                 updated_chnum,
                 sid_data['display_name'],
                 uri,
-                sid_data['json']['HD'])
-            return_json = return_json + ','
-    return "[" + return_json[:-1] + "]"
+                sid_data['json']['HD']))
+    return "[" + ','.join(return_json) + "]"
 
 
 def get_channels_xml(_config, _base_url, _namespace, _instance, _plugins):
     db = DBChannels(_config)
     ch_obj = ChannelsURL(_config, _base_url)
     ch_data = db.get_channels(_namespace, _instance)
-    return_xml = ''
-    sids_processed = []
+    return_xml = []
+    sids_processed = set()
     for sid, sid_data_list in ch_data.items():
         for sid_data in sid_data_list:
             if sid in sids_processed:
                 continue
-            sids_processed.append(sid)
+            sids_processed.add(sid)
             if not sid_data['enabled']:
                 continue
             if not _plugins.get(sid_data['namespace']):
@@ -217,12 +211,12 @@ def get_channels_xml(_config, _base_url, _namespace, _instance, _plugins):
             updated_chnum = utils.wrap_chnum(
                 str(sid_data['display_number']), sid_data['namespace'],
                 sid_data['instance'], _config)
-            return_xml = return_xml + ch_templates['xmlLineup'].format(
+            return_xml.append(ch_templates['xmlLineup'].format(
                 updated_chnum,
                 escape(sid_data['display_name']),
                 uri,
-                sid_data['json']['HD'])
-    return "<Lineup>" + return_xml + "</Lineup>"
+                sid_data['json']['HD']))
+    return "<Lineup>" + ''.join(return_xml) + "</Lineup>"
 
 
 class ChannelsURL:
@@ -0,0 +1,115 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import hashlib
+import threading
+
+import lib.clients.http_encoding as http_encoding
+from lib.db.db_channels import DBChannels
+from lib.db.db_config_defn import DBConfigDefn
+
+MAX_DOCUMENTS = 64      # cached documents before the cache is cleared
+
+
+def send_document(_webserver, _mime, _builder):
+    """
+    Sends the document built by _builder(config, base_url, namespace,
+    instance, plugins) from the cache, or a 304 when the client has it
+    """
+    doc = LineupCache.get(_builder, _webserver.config, _webserver.stream_url,
+                          _webserver.query_data['name'], _webserver.query_data['instance'],
+                          _webserver.plugins.plugins)
+    use_gzip = len(doc.data) >= http_encoding.MIN_GZIP_SIZE and _webserver.is_gzip_response()
+    etag = '"{}{}"'.format(doc.fingerprint, '-gz' if use_gzip else '')
+    headers = {
+        'Content-type': _mime,
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'}
+    if_none_match = _webserver.headers.get('If-None-Match')
+    if if_none_match is not None and http_encoding.etag_matches(if_none_match, etag):
+        _webserver.do_dict_response({'code': 304, 'headers': headers, 'text': None})
+        return
+    if use_gzip:
+        data = doc.get_gzip()
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        data = doc.data
+    headers['Content-Length'] = str(len(data))
+    _webserver.do_dict_response({'code': 200, 'headers': headers, 'text': None})
+    _webserver.do_write(data)
+
+
+def get_enabled_state(_plugins):
+    """
+    The plugins and instances are disabled at runtime when they fail,
+    which changes the documents without changing the config
+    """
+    state = []
+    for name, plugin in _plugins.items():
+        if plugin.plugin_obj is None:
+            # disabled plugins never create their plugin object
+            state.append((name, plugin.enabled))
+        else:
+            state.append((name, plugin.enabled, tuple(
+                (key, inst.enabled) for key, inst in plugin.plugin_obj.instances.items())))
+    return tuple(state)
+
+
+class RenderedDocument:
+
+    def __init__(self, _text, _versions):
+        self.data = _text.encode('utf-8')
+        self.versions = _versions
+        self.fingerprint = hashlib.sha1(self.data).hexdigest()[:16]
+        self.gzip_data = None
+
+    def get_gzip(self):
+        if self.gzip_data is None:
+            self.gzip_data = http_encoding.gzip_bytes(self.data)
+        return self.gzip_data
+
+
+class LineupCache:
+    """
+    Rendered channels.m3u, lineup.json and lineup.xml documents by
+    namespace, instance and host.  A document is rebuilt when the
+    channels, config or enabled plugins change.
+    """
+    documents = {}
+    documents_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, _builder, _config, _base_url, _namespace, _instance, _plugins):
+        key = (_builder.__name__, _base_url,
+               _namespace.lower() if _namespace else None,
+               _instance.lower() if _instance else None)
+        versions = (
+            DBChannels(_config).get_generation(),
+            DBConfigDefn(_config).get_config_version(),
+            get_enabled_state(_plugins))
+        with cls.documents_lock:
+            doc = cls.documents.get(key)
+        if doc is None or doc.versions != versions:
+            doc = RenderedDocument(
+                _builder(_config, _base_url, _namespace, _instance, _plugins), versions)
+            with cls.documents_lock:
+                if len(cls.documents) >= MAX_DOCUMENTS:
+                    cls.documents.clear()
+                cls.documents[key] = doc
+        return doc
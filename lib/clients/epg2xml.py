@@ -20,22 +20,37 @@ substantial portions of the Software.
 import datetime
 import errno
 import logging
-import re
-import xml.dom.minidom as minidom
-from xml.etree import ElementTree
+import math
+import time
+import urllib.parse
 
+import lib.clients.xmltv_artifact as xmltv_artifact
 import lib.common.utils as utils
 import lib.tvheadend.epg_category as epg_category
+from lib.clients.channels.channels import get_channel_groups
+from lib.clients.xmltv_writer import XMLTVWriter
 from lib.common.decorators import getrequest
 from lib.db.db_channels import DBChannels
 from lib.db.db_epg import DBepg
 from lib.web.pages.templates import web_templates
 
+NO_END_TIME = 2 ** 62
+
 
 @getrequest.route('/xmltv.xml')
 def xmltv_xml(_webserver):
     try:
-        epg = EPG(_webserver)
+        filters = get_filters(_webserver.query_data)
+    except ValueError as ex:
+        _webserver.do_mime_response(
+            400, 'text/html',
+            web_templates['htmlError'].format('400 - Invalid filter: {}'.format(ex)))
+        return
+    try:
+        if filters is None and xmltv_artifact.serve(_webserver):
+            return
+        epg = EPG(_webserver.plugins, _webserver.query_data['name'],
+                  _webserver.query_data['instance'], filters)
         epg.get_epg_xml(_webserver)
     except MemoryError as e:
         _webserver.do_mime_response(
@@ -43,47 +58,148 @@ def xmltv_xml(_webserver):
             web_templates['htmlError'].format('501 - MemoryError: {}'.format(e)))
 
 
+def get_filters(_query_data):
+    """
+    Returns the channel, group and time filters in the query or None
+    when there are none.  channel and group are comma separated lists,
+    a channel is an id or a number.  start and end are seconds since
+    the epoch or a UTC time like 20230101120000 and hours is the length
+    of the guide from start.  start is now when only end or hours is used.
+    """
+    filters = {}
+    for key in ['channel', 'group']:
+        value = _query_data.get(key)
+        if value:
+            filters[key] = {x.strip().lower() for x in urllib.parse.unquote(value).split(',')
+                            if x.strip()}
+    start_time = parse_time(_query_data.get('start'))
+    stop_time = parse_time(_query_data.get('end'))
+    hours = _query_data.get('hours')
+    if start_time is not None or stop_time is not None or hours:
+        if start_time is None:
+            start_time = int(time.time())
+        if stop_time is None:
+            stop_time = start_time + parse_hours(hours) if hours else NO_END_TIME
+        if stop_time <= start_time:
+            raise ValueError('end is not after start')
+        filters['start'] = start_time
+        filters['end'] = stop_time
+    return filters or None
+
+
+def parse_hours(_value):
+    """
+    Returns the hours as seconds
+    """
+    hours = float(urllib.parse.unquote(_value))
+    if not math.isfinite(hours) or abs(hours) * 3600 >= NO_END_TIME:
+        raise ValueError('hours out of range: {}'.format(_value))
+    return int(hours * 3600)
+
+
+def parse_time(_value):
+    if not _value:
+        return None
+    value = urllib.parse.unquote(_value).strip()
+    if value.isdigit() and len(value) == 14:
+        return int(datetime.datetime.strptime(value, '%Y%m%d%H%M%S')
+                   .replace(tzinfo=datetime.timezone.utc).timestamp())
+    elif value.isdigit():
+        if int(value) >= NO_END_TIME:
+            raise ValueError('time out of range: {}'.format(value))
+        return int(value)
+    tm = datetime.datetime.fromisoformat(value)
+    if tm.tzinfo is None:
+        tm = tm.replace(tzinfo=datetime.timezone.utc)
+    return int(tm.timestamp())
+
+
 class EPG:
     # https://github.com/XMLTV/xmltv/blob/master/xmltv.dtd
-    def __init__(self, _webserver):
+    def __init__(self, _plugins, _namespace=None, _instance=None, _filters=None):
         self.logger = logging.getLogger(__name__)
-        self.webserver = _webserver
-        self.config = _webserver.plugins.config_obj.data
+        self.config = _plugins.config_obj.data
         self.epg_db = DBepg(self.config)
         self.channels_db = DBChannels(self.config)
-        self.plugins = _webserver.plugins
-        self.namespace = _webserver.query_data['name']
-        self.instance = _webserver.query_data['instance']
-        self.tv_tag = False
+        self.plugins = _plugins
+        self.namespace = _namespace
+        self.instance = _instance
+        self.filters = _filters
+        self.xml = None
         self.today = datetime.datetime.utcnow().date()
-        self.prog_processed = []
-
-    def get_next_epg_day(self):
-        is_enabled = False
-        day_data = None
-        ns = None
-        inst = None
-        day = None
-        while not is_enabled:
-            day_data, ns, inst, day = self.epg_db.get_next_row()
-            if day_data is None:
-                break
-            if day < self.today:
-                continue
-            config_section = utils.instance_config_section(ns, inst)
-            
-            if not self.config.get(ns.lower()) \
-                    or not self.config[ns.lower()]['enabled'] \
-                    or not self.config.get(config_section) \
-                    or not self.config[config_section]['enabled'] \
-                    or not self.config[config_section].get('epg-enabled'):
-                continue
-            is_enabled = True
-        return day_data, ns, inst, day
+        self.last_prog = None
+        self.shared_channels = set()
+        self.prog_processed = set()
+
+    def get_epg_programs(self):
+        """
+        Generator returning the programs of the enabled namespace/instances
+        in channel and time order
+        """
+        enabled = {}
+        ns_inst = None
+        for prog, ns, inst, day in self.epg_db.get_programs(
+                self.namespace, self.instance, self.today):
+            if (ns, inst) != ns_inst:
+                ns_inst = (ns, inst)
+                self.logger.debug('Processing EPG data {}:{}'.format(ns, inst))
+                if ns_inst not in enabled:
+                    enabled[ns_inst] = utils.is_epg_enabled(self.config, ns, inst)
+            if enabled[ns_inst]:
+                yield prog, ns, inst
+
+    def get_filtered_programs(self, _channel_list):
+        """
+        Generator returning the programs of the channels in _channel_list
+        within the time filter, read a channel at a time from the
+        channel and start time index
+        """
+        start_time = self.filters.get('start')
+        stop_time = self.filters.get('end', NO_END_TIME)
+        if start_time is None:
+            start_time = int(datetime.datetime.combine(
+                self.today, datetime.time(), tzinfo=datetime.timezone.utc).timestamp())
+        enabled = {}
+        channels = set()
+        for ch_list in _channel_list.values():
+            for ch_data in ch_list:
+                ns_inst = (ch_data['namespace'], ch_data['instance'])
+                if ns_inst not in enabled:
+                    enabled[ns_inst] = utils.is_epg_enabled(self.config, *ns_inst)
+                if ch_data['enabled'] and enabled[ns_inst]:
+                    channels.add(ns_inst + (ch_data['uid'],))
+        channels = sorted(channels, key=lambda x: (x[0].lower(), x[1].lower(), x[2]))
+        for prog, ns, inst, day in self.epg_db.get_channel_window(
+                channels, start_time, stop_time):
+            yield prog, ns, inst
+
+    def filter_channels(self, _channel_list):
+        """
+        Returns the channels in _channel_list matching the channel and group filters
+        """
+        channel_filter = self.filters.get('channel')
+        group_filter = self.filters.get('group')
+        channel_list = {}
+        for uid, ch_list in (_channel_list or {}).items():
+            for ch_data in ch_list:
+                if channel_filter is not None \
+                        and uid.lower() not in channel_filter \
+                        and str(ch_data['display_number']).lower() not in channel_filter \
+                        and utils.wrap_chnum(
+                            ch_data['display_number'], ch_data['namespace'],
+                            ch_data['instance'], self.config).lower() not in channel_filter:
+                    continue
+                if group_filter is not None:
+                    if not self.config.get(utils.instance_config_section(
+                            ch_data['namespace'], ch_data['instance'])):
+                        continue
+                    groups = {x.lower() for x in get_channel_groups(self.config, ch_data)}
+                    if not groups & group_filter:
+                        continue
+                channel_list.setdefault(uid, []).append(ch_data)
+        return channel_list
 
     def get_epg_xml(self, _webserver):
-        xml_out = None
-        
         if self.namespace is not None \
                 and not self.plugins.plugins.get(self.namespace):
             _webserver.do_mime_response(
@@ -92,34 +208,9 @@ class EPG:
             return
 
         try:
-            _webserver.do_dict_response({
-                'code': 200,
-                'headers': {'Content-type': 'application/xml; Transfer-Encoding: chunked'},
-                'text': None})
-            xml_out = self.gen_header_xml()
-            channel_list = self.channels_db.get_channels(self.namespace, self.instance)
-            self.gen_channel_xml(xml_out, channel_list)
-            self.write_xml(xml_out, keep_xml_prolog=True)
-            xml_out = None
-
-            self.epg_db.init_get_query(self.namespace, self.instance)
-
-            day_data, ns, inst, day = self.get_next_epg_day()
-            self.logger.debug('Processing EPG data {}:{} {}'
-                              .format(ns, inst, day))
-            self.prog_processed = []
-            while day_data:
-                xml_out = EPG.gen_minimal_header_xml()
-                self.gen_program_xml(xml_out, day_data, channel_list, ns, inst)
-                self.write_xml(xml_out)
-                xml_out.clear()
-                day_data, ns, inst, day = self.get_next_epg_day()
-                self.logger.debug('Processing EPG data {}:{} {}'
-                                  .format(ns, inst, day))
-            day_data = None
-            self.epg_db.close_query()
-            self.webserver.wfile.write(b'</tv>\r\n')
-            self.webserver.wfile.flush()
+            wfile = _webserver.do_stream_response(200, {'Content-type': 'application/xml'})
+            self.write_xml(wfile)
+            wfile.close()
         except MemoryError as e:
             self.logger.error('MemoryError parsing large xml')
             raise e
@@ -129,64 +220,51 @@ class EPG:
                 # Normal process.  Client request end of stream
                 self.logger.info('Connection dropped by client {}'
                                  .format(ex))
-                xml_out.clear()
                 return
             else:
                 self.logger.error('{}{}'.format(
                     'UNEXPECTED EXCEPTION=', ex))
                 raise
 
-        xml_out = None   # clear to help garbage collection
-
-    def write_xml(self, _xml, keep_xml_prolog=False):
-        if self.config['epg']['epg_prettyprint']:
-            if not keep_xml_prolog:
-                epg_dom = minidom.parseString(ElementTree.tostring(_xml, encoding='UTF-8', method='xml')).toprettyxml()
-                if epg_dom.endswith('</tv>\n'):
-                    epg_dom = epg_dom.replace('<?xml version="1.0" ?>\n<tv>', '', 1)
-                    epg_dom = epg_dom.replace('</tv>', '', 1)
-                else:
-                    epg_dom = ''
-            else:
-                epg_dom = minidom.parseString(ElementTree.tostring(_xml, encoding='UTF-8', method='xml')).toprettyxml()
-                if epg_dom.endswith('</tv>\n'):
-                    epg_dom = re.sub('</tv>\n$', '', epg_dom)
-                else:
-                    epg_dom = re.sub('"/>\n$', '">', epg_dom)
-            self.webserver.wfile.write(epg_dom.encode())
-        else:
-            if not keep_xml_prolog:
-                epg_dom = ElementTree.tostring(_xml)
-                if epg_dom.endswith(b'<tv />'):
-                    epg_dom = b''
-                else:
-                    epg_dom = epg_dom.replace(b'<tv>', b'', 1)
-                    epg_dom = epg_dom.replace(b'</tv>', b'', 1)
+    def write_xml(self, _wfile):
+        """
+        Writes the xmltv document to the binary stream _wfile
+        """
+        try:
+            self.xml = XMLTVWriter(_wfile, self.config['epg']['epg_prettyprint'])
+            self.gen_header_xml()
+            channel_list = self.channels_db.get_channels(self.namespace, self.instance)
+            if self.filters is None:
+                programs = self.get_epg_programs()
             else:
-                epg_dom = ElementTree.tostring(_xml)
-                if epg_dom.endswith(b'</tv>'):
-                    epg_dom = re.sub(b'</tv>$', b'', epg_dom)
-                else:
-                    epg_dom = re.sub(b'" />$', b'">', epg_dom)
-            self.webserver.wfile.write(epg_dom + b'\r\n')
-        epg_dom = None      # clear to help garbage collection
-        return True
-
-    def gen_channel_xml(self, _et_root, _channel_list):
-        sids_processed = []
+                channel_list = self.filter_channels(channel_list)
+                programs = self.get_filtered_programs(channel_list)
+            self.gen_channel_xml(channel_list)
+
+            self.last_prog = None
+            # programs are in instance order, so a channel id used by
+            # several instances has its programs kept to remove copies
+            self.shared_channels = {
+                uid for uid, ch_list in channel_list.items()
+                if len({(x['namespace'], x['instance']) for x in ch_list}) > 1}
+            self.prog_processed = set()
+            for prog_data, ns, inst in programs:
+                self.gen_program_xml(prog_data, channel_list, ns, inst)
+            self.xml.end_tv()
+            return self.xml.bytes_written
+        finally:
+            self.xml = None
+
+    def gen_channel_xml(self, _channel_list):
+        sids_processed = set()
         for sid, sid_data_list in _channel_list.items():
             if sid in sids_processed:
                 continue
-            sids_processed.append(sid)
+            sids_processed.add(sid)
             for ch_data in sid_data_list:
                 if not ch_data['enabled']:
                     continue
-                config_section = utils.instance_config_section(ch_data['namespace'], ch_data['instance'])
-                if not self.config.get(ch_data['namespace'].lower()) \
-                        or not self.config[ch_data['namespace'].lower()]['enabled'] \
-                        or not self.config.get(config_section) \
-                        or not self.config[config_section]['enabled'] \
-                        or not self.config[config_section].get('epg-enabled'):
+                if not utils.is_epg_enabled(self.config, ch_data['namespace'], ch_data['instance']):
                     continue
 
                 updated_chnum = utils.wrap_chnum(
@@ -200,146 +278,154 @@ class EPG:
                     ch_ref += updated_chnum
                 else:
                     ch_ref += sid
-                c_out = EPG.sub_el(_et_root, 'channel', id=ch_ref)
+                self.xml.start(1, 'channel', id=ch_ref)
 
-                EPG.sub_el(c_out, 'display-name', _text='%s %s' %
-                                                        (updated_chnum, ch_data['display_name']))
-                EPG.sub_el(c_out, 'display-name', _text=ch_data['display_name'])
-                EPG.sub_el(c_out, 'display-name', _text=ch_data['json']['callsign'])
-                EPG.sub_el(c_out, 'display-name', _text='%s %s' %
-                                                        (updated_chnum, ch_data['json']['callsign']))
+                self.xml.element(2, 'display-name', _text='%s %s' %
+                                  (updated_chnum, ch_data['display_name']))
+                self.xml.element(2, 'display-name', _text=ch_data['display_name'])
+                self.xml.element(2, 'display-name', _text=ch_data['json']['callsign'])
+                self.xml.element(2, 'display-name', _text='%s %s' %
+                                  (updated_chnum, ch_data['json']['callsign']))
 
                 if self.config['epg']['epg_channel_icon'] and ch_data['thumbnail'] is not None:
-                    EPG.sub_el(c_out, 'icon', src=ch_data['thumbnail'])
+                    self.xml.element(2, 'icon', src=ch_data['thumbnail'])
+                self.xml.end(1, 'channel')
                 break
-        return _et_root
 
-    def gen_program_xml(self, _et_root, _prog_list, _channel_list, _ns, _inst):
-        for prog_data in _prog_list:
-            proginfo = prog_data['start'] + prog_data['channel']
-            if proginfo in self.prog_processed:
-                continue
-            skip = False
-            try:
-                for ch_data in _channel_list[prog_data['channel']]:
-                    if ch_data['namespace'] == _ns \
-                            and ch_data['instance'] == _inst:
-                        if not ch_data['enabled']:
-                            skip = True
-                            break
-                        config_section = utils.instance_config_section(ch_data['namespace'], ch_data['instance'])
-                        if not self.config[ch_data['namespace'].lower()]['enabled']:
-                            skip = True
-                            break
-                        if not self.config[config_section]['enabled']:
-                            skip = True
-                            break
-                        if not self.config[config_section]['epg-enabled']:
-                            skip = True
-                            break
-            except KeyError:
-                skip = True
-            if skip:
-                continue
-            self.prog_processed.append(proginfo)
-
-            if self.config['epg'].get('epg_add_plugin_to_channel_id'):
-                ch_ref = ch_data['namespace'] + '-'
-            else:
-                ch_ref = ''
-            if self.config['epg'].get('epg_use_channel_number'):
-                ch_data = _channel_list[prog_data['channel']][0]
-                updated_chnum = utils.wrap_chnum(
-                    ch_data['display_number'], ch_data['namespace'],
-                    ch_data['instance'], self.config)
-                ch_ref += updated_chnum
-            else:
-                ch_ref += prog_data['channel']
-            prog_out = EPG.sub_el(_et_root, 'programme',
-                                  start=prog_data['start'],
-                                  stop=prog_data['stop'],
-                                  channel=ch_ref)
-            if prog_data['title']:
-                EPG.sub_el(prog_out, 'title', lang='en', _text=prog_data['title'])
-            if prog_data['subtitle']:
-                EPG.sub_el(prog_out, 'sub-title', lang='en', _text=prog_data['subtitle'])
-            descr_add = ''
-            if self.config['epg']['description'] == 'extend':
-                if prog_data['formatted_date']:
-                    descr_add += '(' + prog_data['formatted_date'] + ') '
-                if prog_data['genres']:
-                    descr_add += ' / '.join(prog_data['genres']) + ' / '
-                if prog_data['se_common']:
-                    descr_add += prog_data['se_common']
-                elif prog_data['episode']:
-                    descr_add += 'E' + str(prog_data['episode'])
-                descr_add += '\n' + prog_data['desc']
-            elif self.config['epg']['description'] == 'brief':
-                descr_add = prog_data['short_desc']
-            elif self.config['epg']['description'] == 'normal':
-                descr_add = prog_data['desc']
-            else:
-                self.logger.warning('Config value [epg][description] is invalid: '
-                                    + self.config['epg']['description'])
-            EPG.sub_el(prog_out, 'desc', lang='en', _text=descr_add)
-
-            if prog_data['video_quality']:
-                video_out = EPG.sub_el(prog_out, 'video')
-                EPG.sub_el(video_out, 'quality', prog_data['video_quality'])
-
-            if prog_data['air_date']:
-                EPG.sub_el(prog_out, 'date',
-                           _text=prog_data['air_date'])
-
-            EPG.sub_el(prog_out, 'length', units='minutes', _text=str(prog_data['length']))
+    def gen_program_xml(self, _prog_data, _channel_list, _ns, _inst):
+        prog_data = _prog_data
+        # the programs of an instance are in channel and start time
+        # order, so a copy within an instance follows the program it repeats
+        proginfo = prog_data['start'] + prog_data['channel']
+        if proginfo == self.last_prog or proginfo in self.prog_processed:
+            return
+        skip = False
+        try:
+            for ch_data in _channel_list[prog_data['channel']]:
+                if ch_data['namespace'] == _ns \
+                        and ch_data['instance'] == _inst:
+                    if not ch_data['enabled']:
+                        skip = True
+                        break
+                    config_section = utils.instance_config_section(ch_data['namespace'], ch_data['instance'])
+                    if not self.config[ch_data['namespace'].lower()]['enabled']:
+                        skip = True
+                        break
+                    if not self.config[config_section]['enabled']:
+                        skip = True
+                        break
+                    if not self.config[config_section]['epg-enabled']:
+                        skip = True
+                        break
+        except KeyError:
+            skip = True
+        if skip:
+            return
+        self.last_prog = proginfo
+        if prog_data['channel'] in self.shared_channels:
+            self.prog_processed.add(proginfo)
 
+        if self.config['epg'].get('epg_add_plugin_to_channel_id'):
+            ch_ref = ch_data['namespace'] + '-'
+        else:
+            ch_ref = ''
+        if self.config['epg'].get('epg_use_channel_number'):
+            ch_data = _channel_list[prog_data['channel']][0]
+            updated_chnum = utils.wrap_chnum(
+                ch_data['display_number'], ch_data['namespace'],
+                ch_data['instance'], self.config)
+            ch_ref += updated_chnum
+        else:
+            ch_ref += prog_data['channel']
+        self.xml.start(1, 'programme',
+                       start=prog_data['start'],
+                       stop=prog_data['stop'],
+                       channel=ch_ref)
+        if prog_data['title']:
+            self.xml.element(2, 'title', lang='en', _text=prog_data['title'])
+        if prog_data['subtitle']:
+            self.xml.element(2, 'sub-title', lang='en', _text=prog_data['subtitle'])
+        descr_add = ''
+        if self.config['epg']['description'] == 'extend':
+            if prog_data['formatted_date']:
+                descr_add += '(' + prog_data['formatted_date'] + ') '
             if prog_data['genres']:
-                for f in prog_data['genres']:
-                    if self.config['epg']['genre'] == 'normal':
-                        pass
-                    elif self.config['epg']['genre'] == 'tvheadend':
-                        if f in epg_category.TVHEADEND.keys():
-                            f = epg_category.TVHEADEND[f]
-                    else:
-                        self.logger.warning('Config value [epg][genre] is invalid: '
-                                            + self.config['epg']['genre'])
-                    EPG.sub_el(prog_out, 'category', lang='en', _text=f.strip())
-
-            if prog_data['icon'] and self.config['epg']['epg_program_icon']:
-                EPG.sub_el(prog_out, 'icon', src=prog_data['icon'])
-
-            if prog_data['actors'] or prog_data['directors']:
-                r = ElementTree.SubElement(prog_out, 'credits')
-                if prog_data['directors']:
-                    for actor in prog_data['directors']:
-                        EPG.sub_el(r, 'director', _text=actor)
-                if prog_data['actors']:
-                    for actor in prog_data['actors']:
-                        EPG.sub_el(r, 'actor', _text=actor)
-
-            if prog_data['rating']:
-                r = ElementTree.SubElement(prog_out, 'rating')
-                EPG.sub_el(r, 'value', _text=prog_data['rating'])
-
+                descr_add += ' / '.join(prog_data['genres']) + ' / '
             if prog_data['se_common']:
-                EPG.sub_el(prog_out, 'episode-num', system='common',
-                           _text=prog_data['se_common'])
-                EPG.sub_el(prog_out, 'episode-num', system='SxxExx',
-                           _text=prog_data['se_common'])
-            if prog_data['se_progid']:
-                EPG.sub_el(prog_out, 'episode-num', system='dd_progid',
-                           _text=prog_data['se_progid'])
-            if prog_data['se_xmltv_ns']:
-                EPG.sub_el(prog_out, 'episode-num', system='xmltv_ns',
-                           _text=prog_data['se_xmltv_ns'])
-            if prog_data['is_new']:
-                EPG.sub_el(prog_out, 'new')
-            else:
-                EPG.sub_el(prog_out, 'previously-shown')
-            if prog_data['cc']:
-                EPG.sub_el(prog_out, 'subtitles', type='teletext')
-            if prog_data['premiere']:
-                EPG.sub_el(prog_out, 'premiere')
+                descr_add += prog_data['se_common']
+            elif prog_data['episode']:
+                descr_add += 'E' + str(prog_data['episode'])
+            descr_add += '\n' + prog_data['desc']
+        elif self.config['epg']['description'] == 'brief':
+            descr_add = prog_data['short_desc']
+        elif self.config['epg']['description'] == 'normal':
+            descr_add = prog_data['desc']
+        else:
+            self.logger.warning('Config value [epg][description] is invalid: '
+                                + self.config['epg']['description'])
+        self.xml.element(2, 'desc', lang='en', _text=descr_add)
+
+        if prog_data['video_quality']:
+            self.xml.start(2, 'video')
+            self.xml.element(3, 'quality', prog_data['video_quality'])
+            self.xml.end(2, 'video')
+
+        if prog_data['air_date']:
+            self.xml.element(2, 'date',
+                             _text=prog_data['air_date'])
+
+        self.xml.element(2, 'length', units='minutes', _text=str(prog_data['length']))
+
+        if prog_data['genres']:
+            for f in prog_data['genres']:
+                if self.config['epg']['genre'] == 'normal':
+                    pass
+                elif self.config['epg']['genre'] == 'tvheadend':
+                    if f in epg_category.TVHEADEND.keys():
+                        f = epg_category.TVHEADEND[f]
+                else:
+                    self.logger.warning('Config value [epg][genre] is invalid: '
+                                        + self.config['epg']['genre'])
+                self.xml.element(2, 'category', lang='en', _text=f.strip())
+
+        if prog_data['icon'] and self.config['epg']['epg_program_icon']:
+            self.xml.element(2, 'icon', src=prog_data['icon'])
+
+        if prog_data['actors'] or prog_data['directors']:
+            self.xml.start(2, 'credits')
+            if prog_data['directors']:
+                for actor in prog_data['directors']:
+                    self.xml.element(3, 'director', _text=actor)
+            if prog_data['actors']:
+                for actor in prog_data['actors']:
+                    self.xml.element(3, 'actor', _text=actor)
+            self.xml.end(2, 'credits')
+
+        if prog_data['rating']:
+            self.xml.start(2, 'rating')
+            self.xml.element(3, 'value', _text=prog_data['rating'])
+            self.xml.end(2, 'rating')
+
+        if prog_data['se_common']:
+            self.xml.element(2, 'episode-num', system='common',
+                             _text=prog_data['se_common'])
+            self.xml.element(2, 'episode-num', system='SxxExx',
+                             _text=prog_data['se_common'])
+        if prog_data['se_progid']:
+            self.xml.element(2, 'episode-num', system='dd_progid',
+                             _text=prog_data['se_progid'])
+        if prog_data['se_xmltv_ns']:
+            self.xml.element(2, 'episode-num', system='xmltv_ns',
+                             _text=prog_data['se_xmltv_ns'])
+        if prog_data['is_new']:
+            self.xml.element(2, 'new')
+        else:
+            self.xml.element(2, 'previously-shown')
+        if prog_data['cc']:
+            self.xml.element(2, 'subtitles', type='teletext')
+        if prog_data['premiere']:
+            self.xml.element(2, 'premiere')
+        self.xml.end(1, 'programme')
 
     def gen_header_xml(self):
         if self.namespace is None:
@@ -349,20 +435,8 @@ class EPG:
             website = self.plugins.plugins[self.namespace].plugin_settings['website']
             name = self.plugins.plugins[self.namespace].plugin_settings['name']
 
-        xml_out = ElementTree.Element('tv')
-        xml_out.set('source-info-url', website)
-        xml_out.set('source-info-name', name)
-        xml_out.set('generator-info-name', utils.CABERNET_ID)
-        xml_out.set('generator-info-url', utils.CABERNET_URL)
-        return xml_out
-
-    @staticmethod
-    def gen_minimal_header_xml():
-        return ElementTree.Element('tv')
-
-    @staticmethod
-    def sub_el(_parent, _name, _text=None, **kwargs):
-        el = ElementTree.SubElement(_parent, _name, **kwargs)
-        if _text:
-            el.text = _text
-        return el
+        self.xml.start_tv(**{
+            'source-info-url': website,
+            'source-info-name': name,
+            'generator-info-name': utils.CABERNET_ID,
+            'generator-info-url': utils.CABERNET_URL})
@@ -0,0 +1,117 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import zlib
+
+GZIP_LEVEL = 6
+MIN_GZIP_SIZE = 1024    # smaller bodies are sent uncompressed
+
+
+def accepts_gzip(_accept_encoding):
+    """
+    Returns True when the Accept-Encoding header allows gzip
+    """
+    if not _accept_encoding:
+        return False
+    for coding in _accept_encoding.split(','):
+        params = [x.strip() for x in coding.split(';')]
+        if params[0].lower() in ['gzip', 'x-gzip']:
+            return 'q=0' not in params and 'q=0.0' not in params
+    return False
+
+
+def is_gzip_path(_gzip_endpoints, _path):
+    """
+    _gzip_endpoints is the comma separated list from the config.  An
+    entry ending with / matches all paths starting with the entry.
+    """
+    if not _gzip_endpoints or not _path:
+        return False
+    for endpoint in _gzip_endpoints.split(','):
+        endpoint = endpoint.strip()
+        if not endpoint:
+            continue
+        if endpoint.endswith('/'):
+            if _path.startswith(endpoint):
+                return True
+        elif _path == endpoint:
+            return True
+    return False
+
+
+def etag_matches(_if_none_match, _etag):
+    """
+    Returns True when the If-None-Match header matches the ETag
+    """
+    for tag in _if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in ['*', _etag]:
+            return True
+    return False
+
+
+def gzip_bytes(_data):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(_data) + compressor.flush()
+
+
+class ResponseStream:
+    """
+    File like object for writing a response body whose length is not
+    known when the headers are sent.  The body is optionally gzip
+    compressed as it is written and is framed with chunked transfer
+    encoding when chunked is set.  close() must be called to end the body.
+    """
+
+    def __init__(self, _wfile, _gzip=False, _chunked=False):
+        self.wfile = _wfile
+        self.chunked = _chunked
+        self.compressor = None
+        if _gzip:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        self.bytes_written = 0
+
+    def write(self, _data):
+        if self.compressor is not None:
+            self.write_chunk(self.compressor.compress(_data))
+        else:
+            self.write_chunk(_data)
+        return len(_data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        if self.compressor is not None:
+            self.write_chunk(self.compressor.flush())
+            self.compressor = None
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def write_chunk(self, _data):
+        if not _data:
+            # an empty chunk ends the body
+            return
+        if self.chunked:
+            self.wfile.write(b''.join([b'%x\r\n' % len(_data), _data, b'\r\n']))
+        else:
+            self.wfile.write(_data)
+        self.bytes_written += len(_data)
@@ -0,0 +1,132 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.parse
+
+import lib.common.utils as utils
+from lib.common.decorators import getrequest
+from lib.db.db_channels import DBChannels
+from lib.db.db_config_defn import DBConfigDefn
+from lib.db.db_epg import DBepg
+from lib.web.pages.templates import web_templates
+
+PROGRAM_FIELDS = ['title', 'subtitle', 'short_desc', 'start', 'stop', 'icon',
+                  'genres', 'rating', 'season', 'episode']
+EMPTY_CACHE_TIME = 300  # seconds the listing is kept when no program ends
+
+
+@getrequest.route('/api/nownext.json')
+def nownext_json(_webserver):
+    """
+    Returns the program airing now and the next program for each channel.
+    The channel query parameter is a comma separated list of channel ids
+    or numbers.
+    """
+    namespace = _webserver.query_data['name']
+    if namespace is not None and not _webserver.plugins.plugins.get(namespace):
+        _webserver.do_mime_response(
+            501, 'text/html',
+            web_templates['htmlError'].format('501 - Invalid Namespace: {}'.format(namespace)))
+        return
+    channels = _webserver.query_data.get('channel')
+    if channels:
+        channels = [x.strip() for x in urllib.parse.unquote(channels).split(',')]
+    now_next = NowNext(_webserver.plugins.config_obj.data)
+    _webserver.do_dict_response({
+        'code': 200, 'headers': {'Content-type': 'application/json'},
+        'text': json.dumps(now_next.get(namespace, _webserver.query_data['instance'], channels))
+    })
+
+
+class NowNext:
+    """
+    The listing for a namespace/instance is kept until the first program
+    in it ends or the EPG, channels or config change, so most requests
+    are answered from memory.
+    """
+    listings = {}
+    listings_lock = threading.Lock()
+
+    def __init__(self, _config):
+        self.logger = logging.getLogger(__name__)
+        self.config = _config
+
+    def get(self, _namespace=None, _instance=None, _channels=None):
+        now = int(time.time())
+        key = (_namespace, _instance)
+        versions = (
+            DBChannels(self.config).get_generation(),
+            DBepg(self.config).get_generation(),
+            DBConfigDefn(self.config).get_config_version())
+        with NowNext.listings_lock:
+            listing = NowNext.listings.get(key)
+        if listing is None or listing['versions'] != versions \
+                or not listing['time'] <= now < listing['valid_until']:
+            listing = self.build_listing(_namespace, _instance, now)
+            listing['versions'] = versions
+            with NowNext.listings_lock:
+                NowNext.listings[key] = listing
+        channel_list = listing['channels']
+        if _channels:
+            channel_list = [x for x in channel_list
+                            if x['id'] in _channels or x['number'] in _channels]
+        return {'time': now, 'channels': channel_list}
+
+    def build_listing(self, _namespace, _instance, _time):
+        channel_rows = []
+        for ch_list in (DBChannels(self.config).get_channels(_namespace, _instance) or {}).values():
+            for ch_data in ch_list:
+                if ch_data['enabled'] \
+                        and utils.is_epg_enabled(self.config, ch_data['namespace'], ch_data['instance']):
+                    channel_rows.append(ch_data)
+        now_next = DBepg(self.config).get_now_next(
+            [(x['namespace'], x['instance'], x['uid']) for x in channel_rows], _time)
+
+        valid_until = _time + EMPTY_CACHE_TIME
+        channel_list = []
+        for ch_data in channel_rows:
+            now, after = now_next[(ch_data['namespace'], ch_data['instance'], ch_data['uid'])]
+            if now is not None:
+                valid_until = min(valid_until, now[1])
+            if after is not None:
+                valid_until = min(valid_until, after[0])
+            channel_list.append({
+                'id': ch_data['uid'],
+                'namespace': ch_data['namespace'],
+                'instance': ch_data['instance'],
+                'number': utils.wrap_chnum(
+                    ch_data['display_number'], ch_data['namespace'],
+                    ch_data['instance'], self.config),
+                'name': ch_data['display_name'],
+                'now': self.get_program(now),
+                'next': self.get_program(after)})
+        return {'time': _time, 'valid_until': valid_until, 'channels': channel_list}
+
+    @staticmethod
+    def get_program(_row):
+        if _row is None:
+            return None
+        prog = json.loads(_row[2])
+        program = {key: prog.get(key) for key in PROGRAM_FIELDS}
+        program['start_time'] = _row[0]
+        program['stop_time'] = _row[1]
+        return program
@@ -24,7 +24,6 @@ import time
 from threading import Thread
 from http.server import HTTPServer
 
-import lib.common.utils as utils
 from lib.common.decorators import getrequest
 from lib.common.decorators import postrequest
 from lib.common.decorators import filerequest
@@ -98,7 +97,6 @@ class WebAdminHttpHandler(WebHTTPHandler):
             valid_check = re.match(r'^(/([A-Za-z0-9._\-]+)/[A-Za-z0-9._\-/]+)[?%&A-Za-z0-9._\-/=]*$', self.path)
             self.content_path, self.query_data = self.get_query_data()
             self.plugins.config_obj.refresh_config_data()
-            utils.start_mem_trace(self.config)
             self.config = self.plugins.config_obj.data
             if filerequest.call_url(self, self.content_path):
                 pass
@@ -108,31 +106,22 @@ class WebAdminHttpHandler(WebHTTPHandler):
                 self.logger.notice('UNKNOWN HTTP Request {}'.format(self.content_path))
                 self.do_mime_response(501, 'text/html',
                                       web_templates['htmlError'].format('501 - Not Implemented'))
-            snapshot = utils.end_mem_trace(self.config)
-            utils.display_top(self.config, snapshot)
-
             return
         except MemoryError as ex:
             self.logger.error('UNKNOWN MEMORY EXCEPTION: {}'.format(ex))
             self.do_mime_response(501, 'text/html',
                                   web_templates['htmlError'].format('501 - {}'.format(ex)))
-            snapshot = utils.end_mem_trace(self.config)
-            utils.display_top(self.config, snapshot)
         except IOError as ex:
             if ex.errno in [errno.EPIPE, errno.ECONNABORTED, errno.ECONNRESET, errno.ECONNREFUSED]:
                 self.logger.info('Connection dropped by end device {}'.format(ex))
             else:
                 self.logger.exception('{}{}'.format(
                     'UNEXPECTED IOERROR EXCEPTION=', ex))
-            snapshot = utils.end_mem_trace(self.config)
-            utils.display_top(self.config, snapshot)
         except Exception as ex:
             self.logger.exception('{}{}'.format(
                 'UNEXPECTED EXCEPTION on GET=', ex))
             self.do_mime_response(501, 'text/html',
                                   web_templates['htmlError'].format('501 - Server Error'))
-            snapshot = utils.end_mem_trace(self.config)
-            utils.display_top(self.config, snapshot)
 
     def do_POST(self):
         try:
@@ -29,12 +29,15 @@ import urllib
 import urllib.parse
 from http.server import BaseHTTPRequestHandler
 
+import lib.clients.http_encoding as http_encoding
 import lib.common.utils as utils
 from lib.web.pages.templates import web_templates
 from lib.config.config_defn import ConfigDefn
 from lib.db.db_plugins import DBPlugins
 from lib.db.db_channels import DBChannels
 from lib.common.pickling import Pickling
+from lib.common.memory_stats import MemoryStats
+from lib.common.startup_timeline import StartupTimeline
 from lib.plugins.plugin_handler import PluginHandler
 
 
@@ -163,13 +166,57 @@ class WebHTTPHandler(BaseHTTPRequestHandler):
     def do_dict_response(self, rsp_dict):
         """
         { 'code': '[code]', 'headers': { '[name]': '[value]', ... }, 'text': b'...' }
+        When text is None, the caller writes the body
         """
+        headers = dict(rsp_dict['headers'])
+        data = None
+        if rsp_dict['text'] is not None:
+            data = rsp_dict['text'].encode('utf-8')
+            if len(data) >= http_encoding.MIN_GZIP_SIZE and self.is_gzip_response():
+                data = http_encoding.gzip_bytes(data)
+                headers['Content-Encoding'] = 'gzip'
+                headers['Vary'] = 'Accept-Encoding'
+            headers['Content-Length'] = str(len(data))
         self.send_response(rsp_dict['code'])
-        for header, value in rsp_dict['headers'].items():
+        for header, value in headers.items():
             self.send_header(header, value)
         self.end_headers()
-        if rsp_dict['text']:
-            self.do_write(rsp_dict['text'].encode('utf-8'))
+        if data:
+            self.do_write(data)
+
+    def do_stream_response(self, _code, _headers):
+        """
+        Sends the headers for a body whose length is not known and
+        returns the ResponseStream used to write the body.  HTTP/1.1
+        clients receive the body chunked, HTTP/1.0 clients read until
+        the connection is closed.
+        """
+        headers = dict(_headers)
+        use_gzip = self.is_gzip_response()
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            # the status line must be HTTP/1.1 for chunked encoding, the
+            # connection is still closed at the end of the response
+            self.protocol_version = 'HTTP/1.1'
+            headers['Transfer-Encoding'] = 'chunked'
+        headers['Connection'] = 'close'
+        self.send_response(_code)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        return http_encoding.ResponseStream(self.wfile, use_gzip, chunked)
+
+    def is_gzip_response(self):
+        """
+        True when the client accepts gzip and the endpoint is in the
+        [web][gzip_endpoints] list
+        """
+        return http_encoding.accepts_gzip(self.headers.get('Accept-Encoding')) \
+            and http_encoding.is_gzip_path(self.config['web'].get('gzip_endpoints'),
+                                           self.content_path)
 
     def do_write(self, _data):
         try:
@@ -218,6 +265,8 @@ class WebHTTPHandler(BaseHTTPRequestHandler):
         
     @classmethod
     def start_httpserver(cls, _plugins, _hdhr_queue, _terminate_queue, _port, _http_server_class, _sched_queue=None):
+        timeline = StartupTimeline.create(cls.__name__)
+        timeline.mark('Process started')
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         
@@ -233,16 +282,21 @@ class WebHTTPHandler(BaseHTTPRequestHandler):
                     raise
             
         server_socket.listen(int(_plugins.config_obj.data['web']['concurrent_listeners']))
+        timeline.mark('Socket bound')
         utils.logging_setup(_plugins.config_obj.data)
         logger = logging.getLogger(__name__)
-        cls.init_class_var_sub(_plugins, _hdhr_queue, _terminate_queue, _sched_queue)
+        with timeline.phase('Initialize handler'):
+            cls.init_class_var_sub(_plugins, _hdhr_queue, _terminate_queue, _sched_queue)
         if cls.total_instances == 0:
             _plugins.config_obj.data['web']['concurrent_listeners']
         logger.info(
             '{} Now listening for requests. Number of listeners={}'
                 .format(cls.__name__, cls.total_instances))
-        for i in range(cls.total_instances):
-            _http_server_class(server_socket, _plugins)
+        with timeline.phase('Start listeners'):
+            for i in range(cls.total_instances):
+                _http_server_class(server_socket, _plugins)
+        timeline.save(_plugins.config_obj.data)
+        MemoryStats.start(_plugins.config_obj.data, cls.__name__)
         try:
             while True:
                 time.sleep(3600)
@@ -20,6 +20,7 @@ import os
 import json
 import logging
 import pathlib
+import threading
 import time
 import urllib
 from threading import Thread
@@ -37,6 +38,8 @@ from lib.streams.ffmpeg_proxy import FFMpegProxy
 from lib.streams.streamlink_proxy import StreamlinkProxy
 from .web_handler import WebHTTPHandler
 
+LOGGER = logging.getLogger(__name__)
+
 
 @gettunerrequest.route('/tunerstatus')
 def tunerstatus(_webserver):
@@ -59,22 +62,60 @@ def logreset(_webserver):
 @gettunerrequest.route('RE:/auto/v.+')
 def autov(_webserver):
     channel = _webserver.content_path.replace('/auto/v', '')
-    station_list = TunerHttpHandler.channels_db.get_channels(
-        _webserver.query_data['name'], _webserver.query_data['instance'])
-
-    # check channel number with adjustments
-    for station in station_list.keys():
-        updated_chnum = utils.wrap_chnum(
-            str(station_list[station][0]['display_number']), station_list[station][0]['namespace'],
-            station_list[station][0]['instance'], _webserver.config)
-        if updated_chnum == channel:
-            _webserver.do_tuning(station, _webserver.query_data['name'],
-                                 _webserver.query_data['instance'])
-            return
+    station = ChannelNumbers.get_uid(
+        _webserver.config, TunerHttpHandler.channels_db,
+        _webserver.query_data['name'], _webserver.query_data['instance'], channel)
+    if station is not None:
+        _webserver.do_tuning(station, _webserver.query_data['name'],
+                             _webserver.query_data['instance'])
+        return
 
     _webserver.do_mime_response(503, 'text/html', web_templates['htmlError'].format('503 - Unknown channel'))
 
 
+class ChannelNumbers:
+    """
+    Map of the channel numbers used by /auto/v, which include the prefix
+    and suffix of the instance, to the channel uid for each namespace and
+    instance requested.  A map is rebuilt when the channels or the config
+    change, using the saved config since the numbers depend on the
+    instance prefix and suffix.
+    """
+    maps = {}
+    maps_lock = threading.Lock()
+
+    @classmethod
+    def get_uid(cls, _config, _channels_db, _namespace, _instance, _chnum):
+        key = (_namespace.lower() if _namespace else None,
+               _instance.lower() if _instance else None)
+        db_defn = DBConfigDefn(_config)
+        versions = (_channels_db.get_generation(), db_defn.get_config_version())
+        with cls.maps_lock:
+            number_map = cls.maps.get(key)
+        if number_map is None or number_map[0] != versions:
+            number_map = (versions, cls.build_map(
+                db_defn.get_config(), _channels_db, _namespace, _instance))
+            with cls.maps_lock:
+                cls.maps[key] = number_map
+        return number_map[1].get(_chnum)
+
+    @staticmethod
+    def build_map(_config, _channels_db, _namespace, _instance):
+        number_map = {}
+        for uid, ch_list in (_channels_db.get_channels(_namespace, _instance) or {}).items():
+            try:
+                chnum = utils.wrap_chnum(
+                    str(ch_list[0]['display_number']), ch_list[0]['namespace'],
+                    ch_list[0]['instance'], _config)
+            except KeyError:
+                LOGGER.debug('{}:{} not in the config, channel {} skipped for /auto/v'
+                             .format(ch_list[0]['namespace'], ch_list[0]['instance'], uid))
+                continue
+            # the first channel with the number is tuned
+            number_map.setdefault(chnum, uid)
+        return number_map
+
+
 class TunerHttpHandler(WebHTTPHandler):
 
     def __init__(self, *args):
@@ -150,8 +191,7 @@ class TunerHttpHandler(WebHTTPHandler):
     def do_tuning(self, sid, _namespace, _instance):
         # refresh the config data in case it changed in the web_admin process
         self.plugins.config_obj.refresh_config_data()
-        self.config = self.db_configdefn.get_config()
-        self.plugins.config_obj.data = self.config
+        self.config = self.plugins.config_obj.data
         # try:
         station_list = TunerHttpHandler.channels_db.get_channels(_namespace, _instance)
         try:
@@ -0,0 +1,287 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import datetime
+import email.utils
+import gzip
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import shutil
+import threading
+import time
+
+import lib.clients.epg2xml as epg2xml
+import lib.clients.http_encoding as http_encoding
+from lib.db.db_channels import DBChannels
+from lib.db.db_config_defn import DBConfigDefn
+from lib.db.db_epg import DBepg
+from lib.db.db_scheduler import DBScheduler
+
+ARTIFACT_FOLDER = 'xmltv'
+BUILD_INTERVAL = 15     # minutes between checks for EPG or channel changes
+GZIP_LEVEL = 6
+COPY_BLOCK_SIZE = 65536
+
+
+def scheduler_tasks(_config):
+    scheduler_db = DBScheduler(_config)
+    if scheduler_db.save_task(
+            'Applications',
+            'Build XMLTV',
+            'internal',
+            None,
+            'lib.clients.xmltv_artifact.build_xmltv',
+            20,
+            'thread',
+            'Renders xmltv.xml to a file when the EPG or channels change'
+    ):
+        scheduler_db.save_trigger(
+            'Applications',
+            'Build XMLTV',
+            'interval',
+            interval=BUILD_INTERVAL
+        )
+
+
+def build_xmltv(_plugins):
+    _plugins.config_obj.refresh_config_data()
+    XMLTVArtifact(_plugins).build()
+    return True
+
+
+def serve(_webserver):
+    """
+    Sends the prebuilt xmltv.xml when it matches the current EPG and
+    channels.  Returns False when the document must be generated by
+    the caller, in which case a build is started in the background.
+    """
+    namespace = _webserver.query_data['name']
+    instance = _webserver.query_data['instance']
+    if namespace is not None and not _webserver.plugins.plugins.get(namespace):
+        return False
+    artifact = XMLTVArtifact(_webserver.plugins, namespace, instance)
+    if not artifact.is_enabled():
+        return False
+    fingerprint = artifact.get_fingerprint()
+    use_gzip = _webserver.is_gzip_response()
+    path = artifact.get_path(fingerprint, use_gzip)
+    if not path.exists():
+        artifact.build_background()
+        return False
+    artifact.send(_webserver, path, fingerprint, use_gzip)
+    return True
+
+
+def parse_range(_range, _size):
+    """
+    Returns (start, end) for a single byte range, None when the whole
+    file is sent or an empty tuple when the range cannot be satisfied.
+    Multiple ranges are not supported and return the whole file.
+    """
+    m = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', _range or '')
+    if m is None or m.group(1) == m.group(2) == '':
+        return None
+    if m.group(1) == '':
+        length = int(m.group(2))
+        if length == 0:
+            return ()
+        return max(_size - length, 0), _size - 1
+    start = int(m.group(1))
+    end = _size - 1 if m.group(2) == '' else min(int(m.group(2)), _size - 1)
+    if start >= _size or start > end:
+        return ()
+    return start, end
+
+
+class XMLTVArtifact:
+    """
+    xmltv.xml rendered to a plain and a gzip file.  The files are named
+    with a fingerprint of the channel, EPG and config versions, so a
+    changed guide is a new file and is never served part way through
+    being replaced.
+    """
+    building = set()
+    building_lock = threading.Lock()
+
+    def __init__(self, _plugins, _namespace=None, _instance=None):
+        self.logger = logging.getLogger(__name__)
+        self.plugins = _plugins
+        self.config = _plugins.config_obj.data
+        self.namespace = _namespace
+        self.instance = _instance
+        self.folder = pathlib.Path(self.config['paths']['data_dir'], ARTIFACT_FOLDER)
+        name = 'xmltv'
+        if _namespace is not None:
+            name += '-' + _namespace
+            if _instance is not None:
+                name += '-' + _instance
+        self.name = re.sub(r'[^A-Za-z0-9_\-]', '_', name)
+
+    def is_enabled(self):
+        return self.config['epg'].get('epg_xmltv_cache')
+
+    def get_fingerprint(self):
+        """
+        Changes whenever the content of xmltv.xml would change,
+        including the start day of the guide
+        """
+        versions = [
+            DBChannels(self.config).get_generation(),
+            DBepg(self.config).get_generation(),
+            DBConfigDefn(self.config).get_config_version(),
+            str(datetime.datetime.utcnow().date()),
+            self.namespace, self.instance]
+        return hashlib.sha1(str(versions).encode()).hexdigest()[:16]
+
+    def get_path(self, _fingerprint, _gzip=False):
+        filename = '{}.{}.xml'.format(self.name, _fingerprint)
+        if _gzip:
+            filename += '.gz'
+        return self.folder.joinpath(filename)
+
+    def build_background(self):
+        t_build = threading.Thread(target=self.build, args=())
+        t_build.daemon = True
+        t_build.start()
+
+    def build(self):
+        """
+        Renders the files when they do not match the current fingerprint
+        and the cache is enabled.  Returns True when new files were created.
+        """
+        if not self.is_enabled():
+            return False
+        with XMLTVArtifact.building_lock:
+            if self.name in XMLTVArtifact.building:
+                return False
+            XMLTVArtifact.building.add(self.name)
+        try:
+            return self.build_files()
+        except (OSError, MemoryError) as ex:
+            self.logger.warning('Unable to build {}.xml, {}'.format(self.name, ex))
+            return False
+        finally:
+            with XMLTVArtifact.building_lock:
+                XMLTVArtifact.building.discard(self.name)
+
+    def build_files(self):
+        fingerprint = self.get_fingerprint()
+        path = self.get_path(fingerprint)
+        gz_path = self.get_path(fingerprint, True)
+        if path.exists() and gz_path.exists():
+            return False
+        start = time.time()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+        tmp_gz_path = gz_path.with_name('{}.{}.tmp'.format(gz_path.name, os.getpid()))
+        try:
+            with open(tmp_path, 'wb') as f_out:
+                size = epg2xml.EPG(self.plugins, self.namespace, self.instance) \
+                    .write_xml(f_out)
+            with open(tmp_path, 'rb') as f_in, \
+                    gzip.open(tmp_gz_path, 'wb', compresslevel=GZIP_LEVEL) as f_out:
+                shutil.copyfileobj(f_in, f_out, COPY_BLOCK_SIZE)
+            if self.get_fingerprint() != fingerprint:
+                self.logger.debug('EPG or channels changed while building {}.xml, discarding'
+                                  .format(self.name))
+                return False
+            os.replace(tmp_gz_path, gz_path)
+            os.replace(tmp_path, path)
+        finally:
+            for tmp in [tmp_path, tmp_gz_path]:
+                if tmp.exists():
+                    tmp.unlink()
+        self.remove_old(fingerprint)
+        self.logger.info('Built {} {:,} bytes, gzip {:,} bytes in {:.1f} seconds'
+                         .format(path.name, size, gz_path.stat().st_size, time.time() - start))
+        return True
+
+    def remove_old(self, _fingerprint):
+        for f in self.folder.glob(self.name + '.*'):
+            if f.suffix in ['.xml', '.gz'] and _fingerprint not in f.name:
+                try:
+                    f.unlink()
+                except OSError as ex:
+                    # file still being sent on some platforms
+                    self.logger.debug('Unable to remove {}, {}'.format(f.name, ex))
+
+    def send(self, _webserver, _path, _fingerprint, _gzip):
+        stat = _path.stat()
+        etag = '"{}{}"'.format(_fingerprint, '-gz' if _gzip else '')
+        headers = {
+            'ETag': etag,
+            'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True),
+            'Vary': 'Accept-Encoding'}
+        if self.is_not_modified(_webserver.headers, etag, stat.st_mtime):
+            _webserver.do_dict_response({'code': 304, 'headers': headers, 'text': None})
+            return
+
+        size = stat.st_size
+        byte_range = None
+        if_range = _webserver.headers.get('If-Range')
+        if if_range is None or if_range.strip() == etag:
+            byte_range = parse_range(_webserver.headers.get('Range'), size)
+        headers['Content-type'] = 'application/xml'
+        headers['Accept-Ranges'] = 'bytes'
+        if _gzip:
+            headers['Content-Encoding'] = 'gzip'
+        if byte_range == ():
+            headers['Content-Range'] = 'bytes */{}'.format(size)
+            headers['Content-Length'] = '0'
+            _webserver.do_dict_response({'code': 416, 'headers': headers, 'text': None})
+            return
+        if byte_range is None:
+            code = 200
+            start, end = 0, size - 1
+        else:
+            code = 206
+            start, end = byte_range
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        headers['Content-Length'] = str(end - start + 1)
+        try:
+            _webserver.do_dict_response({'code': code, 'headers': headers, 'text': None})
+            with open(_path, 'rb') as f_in:
+                f_in.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = f_in.read(min(COPY_BLOCK_SIZE, remaining))
+                    if not data:
+                        break
+                    _webserver.wfile.write(data)
+                    remaining -= len(data)
+            _webserver.wfile.flush()
+        except ConnectionError as ex:
+            # Normal process.  Client request end of stream
+            self.logger.info('Connection dropped by client {}'.format(ex))
+
+    @staticmethod
+    def is_not_modified(_headers, _etag, _mtime):
+        if_none_match = _headers.get('If-None-Match')
+        if if_none_match is not None:
+            return http_encoding.etag_matches(if_none_match, _etag)
+        if_modified_since = _headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(_mtime) <= since.timestamp()
+        return False
@@ -0,0 +1,98 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+from xml.sax.saxutils import escape
+
+FLUSH_SIZE = 65536      # characters buffered before writing to the stream
+ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'}
+
+
+class XMLTVWriter:
+    """
+    Writes xmltv elements as escaped text directly to a stream, so only
+    the element being written is held in memory.  Elements are written
+    at a depth below the <tv> element.  When pretty is set, each element
+    is on its own line indented with tabs, otherwise each top level
+    element is on its own line.
+    """
+
+    def __init__(self, _wfile, _pretty=False):
+        self.wfile = _wfile
+        self.pretty = _pretty
+        self.buffer = []
+        self.size = 0
+        self.bytes_written = 0
+
+    def start_tv(self, **_attrs):
+        self.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.write(''.join(['<tv', self.attrs(_attrs), '>\n']))
+
+    def end_tv(self):
+        self.write('</tv>\n')
+        self.flush()
+
+    def start(self, _depth, _name, **_attrs):
+        self.write(''.join([self.indent(_depth), '<', _name, self.attrs(_attrs), '>',
+                            self.newline(_depth, False)]))
+
+    def end(self, _depth, _name):
+        self.write(''.join([self.indent(_depth), '</', _name, '>',
+                            self.newline(_depth, True)]))
+
+    def element(self, _depth, _name, _text=None, **_attrs):
+        """
+        Writes an element with no children.  Empty text is written as
+        an empty element like ElementTree.
+        """
+        if _text:
+            self.write(''.join([self.indent(_depth), '<', _name, self.attrs(_attrs), '>',
+                                escape(str(_text)), '</', _name, '>',
+                                self.newline(_depth, True)]))
+        else:
+            self.write(''.join([self.indent(_depth), '<', _name, self.attrs(_attrs), ' />',
+                                self.newline(_depth, True)]))
+
+    def indent(self, _depth):
+        if self.pretty:
+            return '\t' * _depth
+        return ''
+
+    def newline(self, _depth, _is_end):
+        if self.pretty or (_is_end and _depth == 1):
+            return '\n'
+        return ''
+
+    @staticmethod
+    def attrs(_attrs):
+        return ''.join([' {}="{}"'.format(key, escape(str(value), ATTR_ENTITIES))
+                        for key, value in _attrs.items()])
+
+    def write(self, _text):
+        self.buffer.append(_text)
+        self.size += len(_text)
+        if self.size >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            data = ''.join(self.buffer).encode()
+            self.buffer = []
+            self.size = 0
+            self.wfile.write(data)
+            self.bytes_written += len(data)
+        self.wfile.flush()
@@ -219,7 +219,9 @@ class Backup:
         Based on function, will create class instance and call
         the function with no parameters. *args are
         passed into the class constructor while **kwargs are
-        passed into the instance function
+        passed into the instance function.
+        Returns the value from the backup function, which is the
+        number of bytes backed up, or False if no backup is registered
         """
         if _name in Backup.backup2func:
             fn = Backup.backup2func[_name]
@@ -229,8 +231,7 @@ class Backup:
             cls = vars(sys.modules[module])[cls_name]
             inst = cls(*args)
             inst_fn = getattr(inst, fn_name)
-            inst_fn(**kwargs)
-            return True
+            return inst_fn(**kwargs)
         else:
             return False
 
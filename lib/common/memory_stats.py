@@ -0,0 +1,289 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import gc
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from lib.db.db_temp import DBTemp
+
+STATS_NAMESPACE = 'cabernet'
+STATS_VALUE = 'memory_stats'
+TRACE_VALUE = 'memory_trace'
+TRACE_REQUEST_VALUE = 'memory_trace_request'
+SAMPLE_INTERVAL = 15    # seconds between samples
+TRACE_FRAMES = 5
+TRACE_TOP_LIMIT = 15
+
+
+def get_rss():
+    """
+    Returns the current resident set size in bytes or None when
+    the OS does not provide it
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return get_peak_rss()
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size in bytes or None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
+class MemoryStats:
+    """
+    Low overhead memory accounting for a process.  A daemon thread
+    samples the process memory and the buffers queued by each stream
+    and stores them in the temp database.  The thread also runs
+    tracemalloc over a time window when one is requested from the
+    diagnostics page.
+    Assumed to be a singleton per process.
+    """
+    stats = None
+
+    def __init__(self, _config, _process_name):
+        self.logger = logging.getLogger(__name__)
+        self.config = _config
+        self.process_name = _process_name
+        self.pid = os.getpid()
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        self.thread = None
+        self.is_running = True
+
+    @classmethod
+    def start(cls, _config, _process_name):
+        """
+        Starts the sampling thread for this process
+        """
+        cls.stats = MemoryStats(_config, _process_name)
+        cls.stats.thread = threading.Thread(target=cls.stats.run, args=())
+        cls.stats.thread.daemon = True
+        cls.stats.thread.start()
+        return cls.stats
+
+    @classmethod
+    def get(cls):
+        """
+        Returns the stats object for this process or None when
+        sampling has not been started in this process
+        """
+        if cls.stats is None or cls.stats.pid != os.getpid():
+            return None
+        return cls.stats
+
+    @classmethod
+    def stop(cls):
+        """
+        Removes the stats for this process when it exits
+        """
+        stats = cls.get()
+        if stats is None:
+            return
+        stats.is_running = False
+        DBTemp(stats.config).del_value(STATS_NAMESPACE, stats.process_name, STATS_VALUE)
+        cls.stats = None
+
+    @classmethod
+    def register_stream(cls, _stream_id, _stats_func):
+        """
+        _stats_func returns a dict with queued_items, queued_bytes
+        and bytes_served for the stream
+        """
+        stats = cls.get()
+        if stats is None:
+            return
+        with stats.streams_lock:
+            stats.streams[str(_stream_id)] = {
+                'func': _stats_func,
+                'start': time.time()}
+
+    @classmethod
+    def unregister_stream(cls, _stream_id):
+        stats = cls.get()
+        if stats is None:
+            return
+        with stats.streams_lock:
+            stats.streams.pop(str(_stream_id), None)
+
+    def run(self):
+        while self.is_running:
+            try:
+                self.save_sample()
+                self.check_trace_request()
+            except Exception as ex:
+                self.logger.warning('Memory stats sample failed: {}'.format(ex))
+            time.sleep(SAMPLE_INTERVAL)
+
+    def sample(self):
+        stream_list = []
+        with self.streams_lock:
+            streams = list(self.streams.items())
+        for stream_id, stream in streams:
+            try:
+                stream_stats = stream['func']()
+            except Exception as ex:
+                self.logger.debug('Unable to get stream stats {}: {}'.format(stream_id, ex))
+                continue
+            stream_stats['id'] = stream_id
+            stream_stats['start'] = stream['start']
+            stream_list.append(stream_stats)
+
+        traced = None
+        if tracemalloc.is_tracing():
+            traced = tracemalloc.get_traced_memory()[0]
+        return {
+            'process': self.process_name,
+            'pid': self.pid,
+            'time': time.time(),
+            'rss': get_rss(),
+            'peak_rss': get_peak_rss(),
+            'heap_blocks': sys.getallocatedblocks(),
+            'gc_counts': gc.get_count(),
+            'threads': threading.active_count(),
+            'traced': traced,
+            'queued_bytes': sum([x.get('queued_bytes') or 0 for x in stream_list]),
+            'streams': stream_list}
+
+    def save_sample(self):
+        sample = self.sample()
+        if self.config['main']['memory_usage']:
+            self.logger.debug('pid:{} rss:{} heap_blocks:{} streams:{} queued_bytes:{}'
+                              .format(self.pid, sample['rss'], sample['heap_blocks'],
+                                      len(sample['streams']), sample['queued_bytes']))
+        DBTemp(self.config).save_json(
+            STATS_NAMESPACE, self.process_name, STATS_VALUE, sample)
+
+    def check_trace_request(self):
+        db_temp = DBTemp(self.config)
+        request = db_temp.get_record(
+            STATS_NAMESPACE, self.process_name, TRACE_REQUEST_VALUE)
+        if not request:
+            return
+        db_temp.del_value(STATS_NAMESPACE, self.process_name, TRACE_REQUEST_VALUE)
+        seconds = int(json.loads(request[0]['json']).get('seconds', 60))
+        # trace in its own thread so the sampling continues during the window
+        t = threading.Thread(target=self.trace, args=(seconds,))
+        t.daemon = True
+        t.start()
+
+    def trace(self, _seconds):
+        """
+        Runs tracemalloc for _seconds and saves the top growth in
+        allocations between the start and end of the window
+        """
+        if tracemalloc.is_tracing():
+            self.logger.info('tracemalloc already running, trace request ignored')
+            return
+        self.logger.info('{} starting {} second memory trace'
+                         .format(self.process_name, _seconds))
+        DBTemp(self.config).save_json(
+            STATS_NAMESPACE, self.process_name, TRACE_VALUE, {
+                'process': self.process_name,
+                'pid': self.pid,
+                'start': time.time(),
+                'seconds': _seconds,
+                'status': 'Running',
+                'top': []})
+        tracemalloc.start(TRACE_FRAMES)
+        try:
+            start_time = time.time()
+            snapshot_start = tracemalloc.take_snapshot()
+            time.sleep(_seconds)
+            snapshot_end = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        filters = (
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        )
+        snapshot_start = snapshot_start.filter_traces(filters)
+        snapshot_end = snapshot_end.filter_traces(filters)
+        top_stats = snapshot_end.compare_to(snapshot_start, 'lineno')
+        top_list = []
+        for stat in top_stats[:TRACE_TOP_LIMIT]:
+            frame = stat.traceback[0]
+            top_list.append({
+                'file': os.sep.join(frame.filename.split(os.sep)[-3:]),
+                'line': frame.lineno,
+                'size': stat.size,
+                'size_diff': stat.size_diff,
+                'count': stat.count,
+                'count_diff': stat.count_diff})
+        DBTemp(self.config).save_json(
+            STATS_NAMESPACE, self.process_name, TRACE_VALUE, {
+                'process': self.process_name,
+                'pid': self.pid,
+                'start': start_time,
+                'seconds': _seconds,
+                'status': 'Complete',
+                'peak': peak,
+                'size_diff': sum([x.size_diff for x in top_stats]),
+                'top': top_list})
+        self.logger.info('{} memory trace complete'.format(self.process_name))
+
+
+def request_trace(_config, _process_name, _seconds):
+    """
+    Asks the sampling thread of a process to run a memory trace.
+    The trace starts on the next sample.
+    """
+    DBTemp(_config).save_json(
+        STATS_NAMESPACE, _process_name, TRACE_REQUEST_VALUE, {
+            'seconds': _seconds})
+
+
+def get_memory_stats(_config):
+    """
+    Returns the latest sample of each process that is still running
+    """
+    rows = DBTemp(_config).get_records_by_value(STATS_NAMESPACE, STATS_VALUE)
+    expired = time.time() - SAMPLE_INTERVAL * 4
+    stats = [row['json'] for row in rows if row['json']['time'] > expired]
+    stats.sort(key=lambda x: x['process'])
+    return stats
+
+
+def get_memory_traces(_config):
+    rows = DBTemp(_config).get_records_by_value(STATS_NAMESPACE, TRACE_VALUE)
+    traces = [row['json'] for row in rows]
+    traces.sort(key=lambda x: x['start'], reverse=True)
+    return traces
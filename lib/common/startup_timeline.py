@@ -0,0 +1,139 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import logging
+import os
+import time
+
+from lib.db.db_temp import DBTemp
+
+TIMELINE_NAMESPACE = 'cabernet'
+TIMELINE_VALUE = 'startup_timeline'
+
+
+class Phase:
+    """
+    Context manager used to time a phase of the startup
+    """
+
+    def __init__(self, _timeline, _name, _category):
+        self.timeline = _timeline
+        self.name = _name
+        self.category = _category
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timeline.add(self.name, self.category, self.start, time.time())
+        return False
+
+
+class StartupTimeline:
+    """
+    Records the time spent in each startup phase for this process.
+    Each process (main, webadmin, tuner, ...) has one timeline which is
+    saved to the temp database so the admin web site can display
+    all of them together.
+    Assumed to be a singleton per process.
+    """
+    timeline = None
+
+    def __init__(self, _process_name):
+        self.logger = logging.getLogger(__name__)
+        self.process_name = _process_name
+        self.pid = os.getpid()
+        self.start_time = time.time()
+        self.phases = []
+
+    @classmethod
+    def create(cls, _process_name):
+        """
+        Starts a new timeline for this process
+        """
+        cls.timeline = StartupTimeline(_process_name)
+        return cls.timeline
+
+    @classmethod
+    def get(cls):
+        """
+        Returns the timeline for this process.  A new timeline is
+        created when the pid has changed, which happens in a child process.
+        """
+        if cls.timeline is None or cls.timeline.pid != os.getpid():
+            cls.timeline = StartupTimeline('pid_{}'.format(os.getpid()))
+        return cls.timeline
+
+    def phase(self, _name, _category='phase'):
+        """
+        usage: with timeline.phase('Loading plugins'):
+        """
+        return Phase(self, _name, _category)
+
+    def add(self, _name, _category, _start, _end):
+        self.phases.append({
+            'name': _name,
+            'category': _category,
+            'start': _start,
+            'duration': round(_end - _start, 4)})
+
+    def mark(self, _name, _category='event'):
+        """
+        Adds a zero length event, like when the server starts answering
+        """
+        now = time.time()
+        self.add(_name, _category, now, now)
+
+    def save(self, _config):
+        """
+        Stores the timeline in the temp database and logs the total time
+        """
+        total = round(time.time() - self.start_time, 3)
+        self.logger.info('{} startup completed in {} seconds'
+                         .format(self.process_name, total))
+        try:
+            DBTemp(_config).save_json(
+                TIMELINE_NAMESPACE, self.process_name, TIMELINE_VALUE, {
+                    'process': self.process_name,
+                    'pid': self.pid,
+                    'start': self.start_time,
+                    'total': total,
+                    'phases': self.phases})
+        except Exception as ex:
+            self.logger.warning('Unable to save startup timeline for {}: {}'
+                                .format(self.process_name, ex))
+
+
+def get_timelines(_config):
+    """
+    Returns the list of saved timelines ordered by process start time
+    """
+    rows = DBTemp(_config).get_records_by_value(TIMELINE_NAMESPACE, TIMELINE_VALUE)
+    timelines = [row['json'] for row in rows]
+    timelines.sort(key=lambda x: x['start'])
+
+    # drop any timelines left over from before the last restart
+    main_start = None
+    for timeline in timelines:
+        if timeline['process'] == 'main':
+            main_start = timeline['start']
+    if main_start is not None:
+        timelines = [x for x in timelines if x['start'] >= main_start]
+    return timelines
@@ -19,7 +19,6 @@ substantial portions of the Software.
 
 import datetime
 import glob
-import linecache
 import logging
 import logging.config
 import mimetypes
@@ -33,7 +32,6 @@ import socket
 import struct
 import sys
 import time
-import tracemalloc
 
 import lib.common.exceptions as exceptions
 
@@ -210,6 +208,27 @@ def get_ip():
     return ip
 
 
+def wait_for_webservers(_config, _timeout=60):
+    """
+    Waits until the web admin and tuner ports accept connections.
+    Returns False if the timeout is reached
+    """
+    host = _config['web']['bind_ip']
+    if host == '0.0.0.0':
+        host = '127.0.0.1'
+    ports = [_config['web']['web_admin_port'], _config['web']['plex_accessible_port']]
+    end_time = time.time() + _timeout
+    while ports:
+        try:
+            with socket.create_connection((host, int(ports[0])), timeout=1):
+                del ports[0]
+        except OSError:
+            if time.time() > end_time:
+                return False
+            time.sleep(0.2)
+    return True
+
+
 def wrap_chnum(_chnum, _namespace, _instance, _config):
     """
     Adds prefix and suffix to chnum.  If prefix is a integer, then
@@ -240,6 +259,21 @@ def instance_config_section(_namespace, _instance):
     return _namespace.lower() + '_' + _instance
 
 
+def is_epg_enabled(_config, _namespace, _instance):
+    """
+    Returns True when the plugin, the instance and the EPG of the
+    instance are enabled
+    """
+    config_section = instance_config_section(_namespace, _instance)
+    if not _config.get(_namespace.lower()) \
+            or not _config[_namespace.lower()]['enabled'] \
+            or not _config.get(config_section) \
+            or not _config[config_section]['enabled'] \
+            or not _config[config_section].get('epg-enabled'):
+        return False
+    return True
+
+
 def process_image_url(_config, _thumbnail_url):
     global logger
     if _thumbnail_url is not None and _thumbnail_url.startswith('file://'):
@@ -284,48 +318,6 @@ def cleanup_web_temp(_config):
         if os.path.isfile(f):
             os.remove(f)
 
-# MEMORY USAGE
-
-def start_mem_trace(_config):
-    if _config['main']['memory_usage']:
-        logger.warning('starting tracemalloc {}'.format(tracemalloc.is_tracing()))
-        tracemalloc.start()
-
-def end_mem_trace(_config):
-    if _config['main']['memory_usage'] and tracemalloc.is_tracing():
-        snapshot = tracemalloc.take_snapshot()
-        tracemalloc.stop()
-        return snapshot
-    else:
-        return None
-
-def display_top(_config, snapshot, key_type='lineno', limit=3):
-    if _config['main']['memory_usage'] and snapshot is not None:
-        snapshot = snapshot.filter_traces((
-            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
-            tracemalloc.Filter(False, "<unknown>"),
-        ))
-        top_stats = snapshot.statistics(key_type)
-
-        logging.debug('pid:{} Top {} lines'.format(os.getpid(), limit))
-        for index, stat in enumerate(top_stats[:limit], 1):
-            frame = stat.traceback[0]
-            # replace "/path/to/module/file.py" with "module/file.py"
-            filename = os.sep.join(frame.filename.split(os.sep)[-2:])
-            logging.debug("#%s: %s:%s: %.1f KiB"
-                  % (index, filename, frame.lineno, stat.size / 1024))
-            line = linecache.getline(frame.filename, frame.lineno).strip()
-            if line:
-                logging.debug('    %s' % line)
-
-        other = top_stats[limit:]
-        if other:
-            size = sum(stat.size for stat in other)
-            logging.debug("%s other: %.1f KiB" % (len(other), size / 1024))
-        total = sum(stat.size for stat in top_stats)
-        logging.debug("Total allocated size: %.1f KiB" % (total / 1024))
-
-
 # BYTE METHODS
 
 def set_u8(integer):
@@ -16,17 +16,27 @@ The above copyright notice and this permission notice shall be included in all c
 substantial portions of the Software.
 """
 
+import contextlib
 import datetime
+import gzip
+import json
 import logging
 import re
+import urllib.error
+import urllib.request
+import zipfile
 from xml.etree import ElementTree
 
 
 import lib.common.utils as utils
 import lib.common.exceptions as exceptions
 from lib.common.tmp_mgmt import TMPMgmt
+from lib.db.db_epg import channel_fingerprint
 
 TMP_FOLDER = 'xmltv'
+MAX_BUFFERED = 5000     # programs held in the channel buckets before all are written
+BATCH_SIZE = 1000       # programs written to the database in one transaction
+URL_TIMEOUT = 30        # seconds to wait for the provider to send data
 
 class XMLTV:
     """
@@ -36,7 +46,11 @@ class XMLTV:
     just an epg.
     """
 
-    def __init__(self, _config, _url, _file_type):
+    def __init__(self, _config, _url, _file_type, _stream=False):
+        """
+        When _stream is set, nothing is downloaded and the file is read
+        by ingest() as it is downloaded
+        """
         global TMP_FOLDER
         self.logger = logging.getLogger(__name__)
         self.url = _url
@@ -47,6 +61,12 @@ class XMLTV:
         self.tmp_mgmt = TMPMgmt(self.config)
         self.has_future_dates = False
         self.start_date = None
+        self.context = None
+        self.root_elem = None
+        if _stream:
+            self.file_compressed = None
+            self.file = None
+            return
         self.file_compressed = self.tmp_mgmt.download_file(self.url, TMP_FOLDER, None, self.file_type)
         if self.file_compressed is None:
             self.file = None
@@ -54,8 +74,6 @@ class XMLTV:
                 .format(self.url))
         else:
             self.file = self.extract_file(self.file_compressed, self.file_type) 
-        self.context = None
-        self.root_elem = None
 
     def __iter__(self):
         self.context = ElementTree.iterparse(self.file, events=('start', 'end',))
@@ -74,6 +92,75 @@ class XMLTV:
                 prog = self.get_program(elem)
         return prog
 
+    def ingest(self, _db, _namespace, _instance, _days=None):
+        """
+        Saves the programs to the DBepg _db in one pass over the file
+        while it is downloaded and decompressed.  Programs are collected
+        in buckets by channel and day (UTC), a channel's buckets are
+        written when the file moves on to the next channel, or all
+        buckets when too many programs are held.  _days is a list of
+        datetime.date to save, programs on other days are skipped.
+        Returns the number of programs on the days saved.
+        """
+        buckets = ProgramBuckets(_db, _namespace, _instance, _days)
+        self.start_date = None
+        try:
+            with contextlib.ExitStack() as stack:
+                self.ingest_stream(self.open_stream(stack), buckets)
+        except Exception:
+            buckets.discard()
+            raise
+        finally:
+            if self.file_compressed is not None:
+                self.file_compressed.unlink(missing_ok=True)
+        buckets.finish()
+        return buckets.programs
+
+    def ingest_stream(self, _stream, _buckets):
+        try:
+            self.context = ElementTree.iterparse(_stream, events=('start', 'end',))
+            self.iterator = iter(self.context)
+            event, self.root_elem = next(self.iterator, (None, None))
+            while True:
+                elem = self.get_next_prog_elem()
+                if elem is None:
+                    break
+                prog = self.get_program(elem)
+                day = utils.convert_to_utc(self.str_to_datetime(prog['start'])).date()
+                _buckets.add(day, prog)
+        except (OSError, EOFError, ElementTree.ParseError, zipfile.BadZipFile) as ex:
+            raise exceptions.CabernetException(
+                'Unable to read XMLTV File {} {}'.format(self.url, str(ex)))
+        finally:
+            self.context = None
+            self.root_elem = None
+
+    def open_stream(self, _stack):
+        """
+        Returns the decompressed file being downloaded, the response and
+        the file are closed by the ExitStack _stack.  A zip file is
+        downloaded first, since its directory is at the end of the file,
+        and its first member is read from the download.
+        """
+        try:
+            if self.file_type == '.zip':
+                self.file_compressed = self.tmp_mgmt.download_file(
+                    self.url, TMP_FOLDER, None, self.file_type)
+                if self.file_compressed is None:
+                    raise exceptions.CabernetException(
+                        'Unable to obtain XMLTV File {}'.format(self.url))
+                z = _stack.enter_context(zipfile.ZipFile(self.file_compressed, 'r'))
+                return _stack.enter_context(z.open(z.namelist()[0]))
+            h = {'User-agent': utils.DEFAULT_USER_AGENT}
+            resp = _stack.enter_context(urllib.request.urlopen(
+                urllib.request.Request(self.url, headers=h), timeout=URL_TIMEOUT))
+            if self.file_type == '.gz':
+                return _stack.enter_context(gzip.GzipFile(fileobj=resp, mode='rb'))
+            return resp
+        except (urllib.error.URLError, OSError, zipfile.BadZipFile, IndexError) as ex:
+            raise exceptions.CabernetException(
+                'Unable to obtain XMLTV File {} {}'.format(self.url, str(ex)))
+
     def cleanup_tmp_folder(self):
         global TMP_FOLDER
         self.tmp_mgmt.cleanup_tmp(TMP_FOLDER)
@@ -340,3 +427,102 @@ class XMLTV:
         return True
         # missing from epg2xml
 
+
+class ProgramBuckets:
+    """
+    Holds the programs of an xmltv file being ingested by channel and
+    day and stages them with DBepg.save_channel_programs.  A channel
+    and day whose programs match the saved fingerprint is not staged.
+    The saved programs are only replaced by finish, so a file that
+    fails part way leaves the saved guide as it was.
+    """
+
+    def __init__(self, _db, _namespace, _instance, _days=None):
+        self.db = _db
+        self.namespace = _namespace
+        self.instance = _instance
+        self.days = None if _days is None else set(_days)
+        self.buckets = {}
+        self.buffered = 0
+        self.last_channel = None
+        self.day_state = {}
+        self.pending = []
+        self.pending_size = 0
+        self.programs = 0
+
+    def add(self, _day, _prog):
+        if self.days is not None and _day not in self.days:
+            return
+        channel = _prog['channel']
+        if channel != self.last_channel:
+            # xmltv files normally list all the programs of a channel together
+            self.flush_channel(self.last_channel)
+            self.last_channel = channel
+        self.buckets.setdefault((_day, channel), []).append(_prog)
+        self.buffered += 1
+        self.programs += 1
+        if self.buffered >= MAX_BUFFERED:
+            for key in list(self.buckets.keys()):
+                self.flush_bucket(key)
+
+    def flush_channel(self, _channel):
+        for key in [x for x in self.buckets.keys() if x[1] == _channel]:
+            self.flush_bucket(key)
+
+    def flush_bucket(self, _key):
+        day, channel = _key
+        prog_list = [(prog, json.dumps(prog)) for prog in self.buckets.pop(_key)]
+        self.buffered -= len(prog_list)
+        state = self.get_day_state(day)
+        if channel in state['channels']:
+            # more programs after the channel was staged
+            if channel in state['fingerprints']:
+                state['fingerprints'][channel] = ''
+            else:
+                state['appended'].add(channel)
+        else:
+            state['channels'].add(channel)
+            fingerprint = channel_fingerprint([x[1] for x in prog_list])
+            if state['saved'].get(channel) == fingerprint:
+                return
+            state['fingerprints'][channel] = fingerprint
+        self.pending.append((day, channel, prog_list))
+        self.pending_size += len(prog_list)
+        if self.pending_size >= BATCH_SIZE:
+            self.write_pending()
+
+    def get_day_state(self, _day):
+        state = self.day_state.get(_day)
+        if state is None:
+            state = {
+                'saved': self.db.start_channel_day(self.namespace, self.instance, _day),
+                'channels': set(), 'fingerprints': {}, 'appended': set()}
+            self.day_state[_day] = state
+        return state
+
+    def write_pending(self):
+        if self.pending:
+            self.db.save_channel_programs(self.namespace, self.instance, self.pending)
+        self.pending = []
+        self.pending_size = 0
+
+    def finish(self):
+        """
+        Writes the remaining buckets and ends each day, a day in the
+        list of days without programs is saved as empty
+        """
+        for key in list(self.buckets.keys()):
+            self.flush_bucket(key)
+        self.write_pending()
+        for day in sorted(self.days or []):
+            self.get_day_state(day)
+        for day, state in sorted(self.day_state.items()):
+            self.db.finish_channel_day(self.namespace, self.instance, day, state['channels'],
+                                       state['fingerprints'], state['appended'])
+
+    def discard(self):
+        """
+        Removes the staged programs when the file cannot be read
+        """
+        for day in self.day_state.keys():
+            self.db.discard_channel_day(self.namespace, self.instance, day)
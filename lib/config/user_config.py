@@ -345,9 +345,11 @@ class BackupConfig:
             backup_file = pathlib.Path(backup_folder, CONFIG_FILENAME)
             shutil.copyfile(self.config['paths']['config_file'],
                             backup_file)
+            return os.path.getsize(backup_file)
         except PermissionError as e:
             self.logger.warning(e)
             self.logger.warning('Unable to make backups')
+            return None
 
     @Restore(CONFIG_BKUP_NAME)
     def restore(self, backup_folder):
@@ -22,7 +22,9 @@ import logging
 import os
 import pathlib
 import shutil
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import lib.common.utils as utils
 from lib.db.db_scheduler import DBScheduler
@@ -33,6 +35,7 @@ from lib.db.db_config_defn import DBConfigDefn
 BACKUP_FOLDER_NAME = 'CabernetBackup'
 CODE_DIRS_TO_IGNORE = ['__pycache__', 'data', '.git', 'ffmpeg', 'streamlink', '.github', 'build', 'misc']
 CODE_FILES_TO_IGNORE = ['config.ini', 'is_container', 'uninst.exe']
+BACKUP_WORKERS = 3
 
 
 def scheduler_tasks(config):
@@ -87,11 +90,35 @@ class Backups:
             folderlist = sorted(glob.glob(os.path.join(backups_location, BACKUP_FOLDER_NAME + '*')))
         new_backup_folder = BACKUP_FOLDER_NAME +'_'+ utils.VERSION + datetime.datetime.now().strftime('_%Y%m%d_%H%M')
         new_backup_path = pathlib.Path(backups_location, new_backup_folder)
-
-        for key in Backup.backup2func.keys():
-            Backup.call_backup(key, self.config, backup_folder=new_backup_path)
+        os.makedirs(new_backup_path, exist_ok=True)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as executor:
+            results = list(executor.map(
+                lambda key: self.backup_one(key, new_backup_path),
+                Backup.backup2func.keys()))
+        total_size = sum([x[2] or 0 for x in results])
+        for key, elapsed, size in results:
+            self.logger.info('Backup {} {} in {:.2f} seconds'.format(
+                key, 'failed' if size is None else '{:,} bytes'.format(size), elapsed))
+        self.logger.info('Backup {} completed {:,} bytes in {:.2f} seconds'.format(
+            new_backup_folder, total_size, time.time() - start))
         return new_backup_folder
 
+    def backup_one(self, _key, _backup_path):
+        """
+        Returns (key, seconds, bytes written) for one registered backup.
+        The databases are copied a few pages at a time, so several
+        backups can run at once without holding up the service.
+        """
+        start = time.time()
+        try:
+            size = Backup.call_backup(_key, self.config, backup_folder=_backup_path)
+        except Exception as ex:
+            self.logger.warning('Backup {} failed, {}'.format(_key, ex))
+            size = None
+        return _key, time.time() - start, size
+
     def restore_data(self, _folder, _key):
         """
         key is what the Back and Restore decorators use to lookup the function call_backup
@@ -16,6 +16,7 @@ The above copyright notice and this permission notice shall be included in all c
 substantial portions of the Software.
 """
 
+import gzip
 import logging
 import os
 import pathlib
@@ -25,9 +26,11 @@ import sqlite3
 import threading
 import time
 
+from lib.db.db_writer import DBWriter
 
 DB_EXT = '.db'
 BACKUP_EXT = '.sql'
+GZIP_EXT = '.gz'
 
 # trailers used in sqlcmds.py
 SQL_CREATE_TABLES = 'ct'
@@ -36,26 +39,55 @@ SQL_ADD_ROW = '_add'
 SQL_UPDATE = '_update'
 SQL_GET = '_get'
 SQL_DELETE = '_del'
+SQL_ADD_COLUMNS = 'ac'
 FILE_LINK_ZIP = '_filelinks'
 
+# connection settings.  WAL allows readers to continue while a write is
+# in progress and busy_timeout has sqlite wait for a lock instead of
+# failing with "database is locked"
+BUSY_TIMEOUT = 10000    # milliseconds
+CACHED_STATEMENTS = 256
+FETCH_SIZE = 500    # rows read at a time by get_dict_iter
+
+# backups copy BACKUP_PAGES at a time and pause between steps
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005    # seconds
+GZIP_LEVEL = 6
+COPY_BLOCK_SIZE = 1024 * 1024
+SQL_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA busy_timeout={}'.format(BUSY_TIMEOUT),
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
 class DB:
     conn = {}
+    conn_pid = None
+    conn_lock = threading.Lock()
+    pragmas = SQL_PRAGMAS
+    tables_checked = set()
 
     def __init__(self, _config, _db_name, _sqlcmds):
         self.logger = logging.getLogger(__name__ + str(threading.get_ident()))
         self.config = _config
         self.db_name = _db_name
         self.sqlcmds = _sqlcmds
-        self.cur = None
-        self.offset = -1
-        self.where = None
-        self.sqlcmd = None
 
         self.db_fullpath = pathlib.Path(self.config['paths']['db_dir']) \
             .joinpath(_db_name + DB_EXT)
         if not os.path.exists(self.db_fullpath):
             self.logger.debug('Creating new database: {} {}'.format(_db_name, self.db_fullpath))
             self.create_tables()
+        elif str(self.db_fullpath) not in DB.tables_checked:
+            # once per process, adds any columns, tables, indexes or triggers
+            # added since the database was created
+            self.add_columns()
+            self.create_tables()
+        DB.tables_checked.add(str(self.db_fullpath))
         self.check_connection()
         DB.conn[self.db_name][threading.get_ident()].commit()
 
@@ -76,9 +108,38 @@ class DB:
         sec = _sec + r / 100
         time.sleep(sec)
 
+    def use_writer(self):
+        """
+        True when writes go through the single writer thread
+        """
+        return self.config['datamgmt'].get('db-single_writer')
+
+    def write(self, _cmd_list):
+        """
+        Queues the writes with the single writer for this database.
+        _cmd_list is a list of (sqlcmd, values, many).  Returns the
+        WriteRequest, call wait() on it for the acknowledgement.
+        """
+        return DBWriter.get(self).submit(_cmd_list)
+
+    def write_wait(self, _cmd_list, _request_type):
+        """
+        Writes using the single writer and waits for the commit.
+        Returns the WriteRequest or None when the write failed
+        """
+        try:
+            return self.write(_cmd_list).wait()
+        except sqlite3.OperationalError as e:
+            self.logger.warning('{} {} request failed, {}'
+                                .format(self.db_name, _request_type, e))
+            return None
+
     def add(self, _table, _values):
         cur = None
         sqlcmd = self.sqlcmds[''.join([_table, SQL_ADD_ROW])]
+        if self.use_writer():
+            request = self.write_wait([(sqlcmd, _values, False)], 'Add')
+            return None if request is None else request.lastrowid
         i = 5
         while i > 0:
             i -= 1
@@ -97,9 +158,15 @@ class DB:
                 self.rnd_sleep(0.3)
         return None
 
-    def delete(self, _table, _values):
+    def delete(self, _table, _values, sql=None):
         cur = None
-        sqlcmd = self.sqlcmds[''.join([_table, SQL_DELETE])]
+        if sql is None:
+            sqlcmd = self.sqlcmds[''.join([_table, SQL_DELETE])]
+        else:
+            sqlcmd = sql
+        if self.use_writer():
+            request = self.write_wait([(sqlcmd, _values, False)], 'Delete')
+            return 0 if request is None else request.rowcount
         i = 5
         while i > 0:
             i -= 1
@@ -118,9 +185,15 @@ class DB:
                 self.rnd_sleep(0.3)
         return 0
 
-    def update(self, _table, _values=None):
+    def update(self, _table, _values=None, sql=None):
         cur = None
-        sqlcmd = self.sqlcmds[''.join([_table, SQL_UPDATE])]
+        if sql is None:
+            sqlcmd = self.sqlcmds[''.join([_table, SQL_UPDATE])]
+        else:
+            sqlcmd = sql
+        if self.use_writer():
+            request = self.write_wait([(sqlcmd, _values, False)], 'Update')
+            return None if request is None else request.lastrowid
         i = 5
         while i > 0:
             i -= 1
@@ -139,12 +212,51 @@ class DB:
                 self.rnd_sleep(0.3)
         return None
 
+    def bulk(self, _cmd_list):
+        """
+        Runs each sqlcmd with executemany in a single transaction.
+        _cmd_list is a list of (sqlcmd key, list of value tuples)
+        Returns the number of rows changed or None if the transaction failed
+        """
+        if self.use_writer():
+            request = self.write_wait([(self.sqlcmds[sqlcmd_key], values_list, True)
+                                       for sqlcmd_key, values_list in _cmd_list
+                                       if values_list], 'Bulk')
+            return None if request is None else request.rowcount
+        cur = None
+        i = 5
+        while i > 0:
+            i -= 1
+            try:
+                self.check_connection()
+                conn = DB.conn[self.db_name][threading.get_ident()]
+                num_changed = 0
+                for sqlcmd_key, values_list in _cmd_list:
+                    if not values_list:
+                        continue
+                    cur = conn.executemany(self.sqlcmds[sqlcmd_key], values_list)
+                    num_changed += cur.rowcount
+                    cur.close()
+                conn.commit()
+                return num_changed
+            except sqlite3.OperationalError as e:
+                self.logger.warning('{} Bulk request ignored, retrying {}, {}'
+                                    .format(self.db_name, i, e))
+                DB.conn[self.db_name][threading.get_ident()].rollback()
+                if cur is not None:
+                    cur.close()
+                self.rnd_sleep(0.3)
+        return None
+
     def commit(self):
         DB.conn[self.db_name][threading.get_ident()].commit()
 
-    def get(self, _table, _where=None):
+    def get(self, _table, _where=None, sql=None):
         cur = None
-        sqlcmd = self.sqlcmds[''.join([_table, SQL_GET])]
+        if sql is None:
+            sqlcmd = self.sqlcmds[''.join([_table, SQL_GET])]
+        else:
+            sqlcmd = sql
         i = 5
         while i > 0:
             i -= 1
@@ -188,24 +300,44 @@ class DB:
                 self.rnd_sleep(0.3)
         return None
 
-    def get_init(self, _table, _where=None):
+    def get_dict_iter(self, _table, _where=None, sql=None, size=FETCH_SIZE):
         """
-            Requires "LIMIT ? OFFSET ?" at the end of the sql statement
+        Generator returning each row as a dict without reading the full
+        result into memory.  The rows are fetched in blocks of size from
+        a cursor on the connection of the thread, other queries may run
+        on the connection while the generator is open.
         """
-        self.sqlcmd = self.sqlcmds[''.join([_table, SQL_GET])]
-        self.where = list(_where)
-        self.offset = 0
-
-    def get_dict_next(self):
-        w_list = self.where.copy()
-        w_list.extend((1, self.offset))
-        self.cur = self.sql_exec(self.sqlcmd, tuple(w_list))
-        records = self.cur.fetchall()
-        self.offset += 1
-        if len(records) == 0:
-            return None
-        row = records[0]
-        return dict(zip([c[0] for c in self.cur.description], row))
+        cur = None
+        if sql is None:
+            sqlcmd = self.sqlcmds[''.join([_table, SQL_GET])]
+        else:
+            sqlcmd = sql
+        i = 5
+        while i > 0:
+            i -= 1
+            try:
+                cur = self.sql_exec(sqlcmd, _where)
+                break
+            except sqlite3.OperationalError as e:
+                self.logger.warning('{} GET request ignored retrying {}, {}'
+                                    .format(self.db_name, i, e))
+                DB.conn[self.db_name][threading.get_ident()].rollback()
+                if cur is not None:
+                    cur.close()
+                    cur = None
+                self.rnd_sleep(0.3)
+        if cur is None:
+            return
+        try:
+            columns = [c[0] for c in cur.description]
+            while True:
+                records = cur.fetchmany(size)
+                if not records:
+                    break
+                for row in records:
+                    yield dict(zip(columns, row))
+        finally:
+            cur.close()
 
     def save_file(self, _keys, _blob):
         """
@@ -282,6 +414,48 @@ class DB:
         self.drop_tables()
         self.create_tables()
 
+    def add_columns(self):
+        """
+        Adds columns missing from existing tables.  sqlcmds 'ac' is a
+        list of (table, column, column definition)
+        """
+        if SQL_ADD_COLUMNS not in self.sqlcmds:
+            return
+        for table, column, column_defn in self.sqlcmds.get(SQL_ADD_COLUMNS, []):
+            cur = self.sql_exec('SELECT name FROM pragma_table_info(?)', (table,))
+            columns = [x[0] for x in cur.fetchall()]
+            cur.close()
+            if columns and column not in columns:
+                self.logger.info('Adding column {} to {} table in {} database'
+                                 .format(column, table, self.db_name))
+                self.sql_exec('ALTER TABLE {} ADD COLUMN {} {}'
+                              .format(table, column, column_defn))
+        DB.conn[self.db_name][threading.get_ident()].commit()
+
+    def build_where(self, _equals, _conditions=None):
+        """
+        Returns the WHERE clause and the list of values to bind.
+        _equals is a list of (column, value).  A value of None or '%'
+        matches everything, so the column is left out, otherwise
+        equality is used so sqlite is able to use the indexes.  The
+        comparison ignores case like the LIKE statements it replaces.
+        _conditions is a list of (sql, value) added as is
+        """
+        clauses = []
+        values = []
+        for column, value in _equals:
+            if value is None or value == '%':
+                continue
+            clauses.append('{}=? COLLATE NOCASE'.format(column))
+            values.append(value)
+        if _conditions:
+            for condition, value in _conditions:
+                clauses.append(condition)
+                values.append(value)
+        if not clauses:
+            return '', values
+        return ' WHERE ' + ' AND '.join(clauses), values
+
     def create_tables(self):
         for table in self.sqlcmds[''.join([SQL_CREATE_TABLES])]:
             cur = self.sql_exec(table)
@@ -292,30 +466,64 @@ class DB:
             cur = self.sql_exec(table)
         DB.conn[self.db_name][threading.get_ident()].commit()
 
-    def export_sql(self, backup_folder):
+    def export_db(self, backup_folder):
+        """
+        Copies the database with the sqlite online backup API and gzips
+        the copy.  The copy is made a few pages at a time with a pause
+        between steps so other users of the database are not slowed
+        down, while a read transaction keeps the copy consistent.
+        WAL allows writes to continue during the backup.
+        Returns the number of bytes written to the backup folder
+        """
         self.logger.debug('Running backup for {} database'.format(self.db_name))
+        backup_tmp = pathlib.Path(backup_folder, self.db_name + DB_EXT + '.tmp')
+        src_conn = None
+        dest_conn = None
+        size = 0
         try:
-            if not os.path.isdir(backup_folder):
-                os.mkdir(backup_folder)
-            self.check_connection()
+            os.makedirs(backup_folder, exist_ok=True)
 
             # Check for linked file folder and zip up if present
             db_linkfilepath = pathlib.Path(self.config['paths']['db_dir']) \
                 .joinpath(self.db_name)
-            if db_linkfilepath.exists():
+            if db_linkfilepath.exists() and any(db_linkfilepath.iterdir()):
                 self.logger.debug('Linked file folder exists, backing up folder for db {}'.format(self.db_name))
                 backup_filelink = pathlib.Path(backup_folder, self.db_name + FILE_LINK_ZIP)
-                shutil.make_archive(backup_filelink, 'zip', db_linkfilepath)
-
-            backup_file = pathlib.Path(backup_folder, self.db_name + BACKUP_EXT)
-            with open(backup_file, 'w', encoding='utf-8') as export_f:
-                for line in DB.conn[self.db_name][threading.get_ident()].iterdump():
-                    export_f.write('%s\n' % line)
-        except PermissionError as e:
+                size += os.path.getsize(shutil.make_archive(backup_filelink, 'zip', db_linkfilepath))
+
+            src_conn = self.open_connection()
+            src_conn.execute('BEGIN')
+            src_conn.execute('SELECT count(*) FROM sqlite_master').fetchall()
+            dest_conn = sqlite3.connect(backup_tmp)
+            src_conn.backup(dest_conn, pages=BACKUP_PAGES,
+                            progress=lambda status, remaining, total: time.sleep(BACKUP_PAUSE))
+            dest_conn.close()
+            dest_conn = None
+            src_conn.rollback()
+
+            backup_file = pathlib.Path(backup_folder, self.db_name + DB_EXT + GZIP_EXT)
+            with open(backup_tmp, 'rb') as db_f, \
+                    gzip.open(backup_file, 'wb', compresslevel=GZIP_LEVEL) as gz_f:
+                shutil.copyfileobj(db_f, gz_f, COPY_BLOCK_SIZE)
+            size += os.path.getsize(backup_file)
+        except (PermissionError, sqlite3.Error) as e:
             self.logger.warning(e)
             self.logger.warning('Unable to make backups')
-
-    def import_sql(self, backup_folder):
+            size = None
+        finally:
+            if dest_conn is not None:
+                dest_conn.close()
+            if src_conn is not None:
+                src_conn.close()
+            if backup_tmp.exists():
+                os.remove(backup_tmp)
+        return size
+
+    def import_db(self, backup_folder):
+        """
+        Restores the database from the gzip copy made by export_db
+        or from the sql dump made by earlier versions
+        """
         self.logger.debug('Running restore for {} database'.format(self.db_name))
         if not os.path.isdir(backup_folder):
             msg = 'Backup folder does not exist: {}'.format(backup_folder)
@@ -330,40 +538,138 @@ class DB:
             self.logger.debug('Linked file folder exists, restoring folder for db {}'.format(self.db_name))
             shutil.unpack_archive(backup_filelink, db_linkfilepath)
 
+        backup_gzip = pathlib.Path(backup_folder, self.db_name + DB_EXT + GZIP_EXT)
         backup_file = pathlib.Path(backup_folder, self.db_name + BACKUP_EXT)
-        if not os.path.isfile(backup_file):
+        if not backup_gzip.exists() and not os.path.isfile(backup_file):
             msg = 'Backup file does not exist, skipping: {}'.format(backup_file)
             self.logger.info(msg)
             return msg
-        self.check_connection()
-        self.drop_tables()
-        with open(backup_file, 'r') as import_f:
-            cmd = ''
-            for line in import_f:
-                cmd += line
-                if ';' in line[-3:]:
-                    DB.conn[self.db_name][threading.get_ident()].execute(cmd)
-                    cmd = ''
+
+        # the restore is built in a separate file, then copied over the
+        # database in a single transaction
+        restore_tmp = pathlib.Path(str(self.db_fullpath) + '.restore')
+        try:
+            if restore_tmp.exists():
+                os.remove(restore_tmp)
+            start = time.time()
+            if backup_gzip.exists():
+                with gzip.open(backup_gzip, 'rb') as gz_f, \
+                        open(restore_tmp, 'wb') as db_f:
+                    shutil.copyfileobj(gz_f, db_f, COPY_BLOCK_SIZE)
+            else:
+                self.load_sql_dump(backup_file, restore_tmp)
+            self.replace_db(restore_tmp)
+            self.logger.info('{} database restored in {:.2f} seconds'
+                             .format(self.db_name, time.time() - start))
+        except (OSError, sqlite3.Error) as e:
+            msg = 'Unable to restore {} database, {}'.format(self.db_name, e)
+            self.logger.warning(msg)
+            return msg
+        finally:
+            if restore_tmp.exists():
+                os.remove(restore_tmp)
         return None
 
+    def load_sql_dump(self, _backup_file, _db_file):
+        """
+        Replays a sql dump into a new database file in a single
+        transaction with journaling off.  The file is not in use, so
+        nothing is lost if the load fails part way.
+        """
+        conn = sqlite3.connect(_db_file, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('BEGIN')
+            with open(_backup_file, 'r', encoding='utf-8') as import_f:
+                cmd = ''
+                for line in import_f:
+                    cmd += line
+                    if sqlite3.complete_statement(cmd):
+                        # the dump has its own transaction statements
+                        if cmd.strip().upper() not in ['BEGIN TRANSACTION;', 'COMMIT;']:
+                            conn.execute(cmd)
+                        cmd = ''
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def replace_db(self, _db_file):
+        """
+        Copies the database file over this database with the online
+        backup API in one step, so other connections see either the
+        old or the restored database.  Tables, columns and indexes
+        added since the backup was made are then created.
+        """
+        src_conn = sqlite3.connect(_db_file)
+        try:
+            self.check_connection()
+            src_conn.backup(DB.conn[self.db_name][threading.get_ident()])
+        finally:
+            src_conn.close()
+        self.add_columns()
+        self.create_tables()
+
     def close(self):
         thread_id = threading.get_ident()
         DB.conn[self.db_name][thread_id].close()
         del DB.conn[self.db_name][thread_id]
         self.logger.debug('{} database closed for thread:{}'.format(self.db_name, thread_id))
 
-    def check_connection(self):
-        if self.db_name not in DB.conn:
-            DB.conn[self.db_name] = {}
-        db_conn_dbname = DB.conn[self.db_name]
-
-        if threading.get_ident() not in db_conn_dbname:
-            db_conn_dbname[threading.get_ident()] = sqlite3.connect(
-                self.db_fullpath, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        else:
+    def open_connection(self):
+        """
+        Connections may be handed to another thread once the thread
+        that opened it has ended, so same thread checking is disabled.
+        """
+        conn = sqlite3.connect(
+            self.db_fullpath, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            timeout=BUSY_TIMEOUT / 1000, cached_statements=CACHED_STATEMENTS,
+            check_same_thread=False)
+        for pragma in DB.pragmas:
             try:
-                db_conn_dbname[threading.get_ident()].total_changes
-            except sqlite3.ProgrammingError:
-                self.logger.debug('Reopening {} database for thread:{}'.format(self.db_name, threading.get_ident()))
-                db_conn_dbname[threading.get_ident()] = sqlite3.connect(
-                    self.db_fullpath, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+                conn.execute(pragma)
+            except sqlite3.OperationalError as e:
+                self.logger.warning('{} unable to set {}, {}'.format(self.db_name, pragma, e))
+        return conn
+
+    def reuse_connection(self, _db_conn_dbname):
+        """
+        Short lived threads, like the web handler threads, leave their
+        connection behind.  Returns a connection from a thread that
+        has ended or None.  Requires conn_lock.
+        """
+        alive = set([t.ident for t in threading.enumerate()])
+        for thread_id in list(_db_conn_dbname.keys()):
+            if thread_id not in alive:
+                conn = _db_conn_dbname.pop(thread_id)
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    return conn
+                except sqlite3.ProgrammingError:
+                    # connection was closed
+                    pass
+        return None
+
+    def check_connection(self):
+        thread_id = threading.get_ident()
+        with DB.conn_lock:
+            if DB.conn_pid != os.getpid():
+                # connections cannot be shared with a parent process
+                DB.conn = {}
+                DB.conn_pid = os.getpid()
+            if self.db_name not in DB.conn:
+                DB.conn[self.db_name] = {}
+            db_conn_dbname = DB.conn[self.db_name]
+
+            if thread_id not in db_conn_dbname:
+                conn = self.reuse_connection(db_conn_dbname)
+                if conn is None:
+                    conn = self.open_connection()
+                db_conn_dbname[thread_id] = conn
+            else:
+                try:
+                    db_conn_dbname[thread_id].total_changes
+                except sqlite3.ProgrammingError:
+                    self.logger.debug('Reopening {} database for thread:{}'.format(self.db_name, thread_id))
+                    db_conn_dbname[thread_id] = self.open_connection()
@@ -19,7 +19,6 @@ substantial portions of the Software.
 import ast
 import json
 import datetime
-import sqlite3
 
 from lib.db.db import DB
 from lib.common.decorators import Backup
@@ -29,6 +28,7 @@ DB_CHANNELS_TABLE = 'channels'
 DB_STATUS_TABLE = 'status'
 DB_ZONE_TABLE = 'zones'
 DB_CATEGORIES_TABLE = 'categories'
+DB_GENERATION_TABLE = 'generation'
 DB_CONFIG_NAME = 'db_files-channels_db'
 
 sqlcmds = {
@@ -48,10 +48,49 @@ sqlcmds = {
             thumbnail_size VARCHAR(255),
             atsc      VARCHAR(1500),
             json TEXT NOT NULL,
+            number_sort REAL,
+            display_number_sort REAL,
             UNIQUE(namespace, instance, uid)
             )
         """,
         """
+        CREATE INDEX IF NOT EXISTS channels_ns_number_idx ON channels (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, number_sort)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS channels_number_idx ON channels (
+            number_sort, namespace, instance)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS channels_display_number_idx ON channels (
+            display_number_sort, number_sort, namespace, instance)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS channels_uid_idx ON channels (uid)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_insert_sort AFTER INSERT ON channels
+        BEGIN
+            UPDATE channels SET number_sort = CAST(NEW.number AS REAL),
+                display_number_sort = CAST(NEW.display_number AS REAL)
+                WHERE rowid = NEW.rowid;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_update_sort
+            AFTER UPDATE OF number, display_number ON channels
+        BEGIN
+            UPDATE channels SET number_sort = CAST(NEW.number AS REAL),
+                display_number_sort = CAST(NEW.display_number AS REAL)
+                WHERE rowid = NEW.rowid;
+        END
+        """,
+        """
+        UPDATE channels SET number_sort = CAST(number AS REAL),
+            display_number_sort = CAST(display_number AS REAL)
+            WHERE number_sort IS NULL OR display_number_sort IS NULL
+        """,
+        """
         CREATE TABLE IF NOT EXISTS status (
             namespace VARCHAR(255) NOT NULL,
             instance  VARCHAR(255),
@@ -75,8 +114,38 @@ sqlcmds = {
             name      VARCHAR(255) NOT NULL,
             UNIQUE(namespace, instance, uid)
             )
+        """,
         """
-
+        CREATE TABLE IF NOT EXISTS generation (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            channels INTEGER NOT NULL
+            )
+        """,
+        """
+        INSERT OR IGNORE INTO generation (id, channels) VALUES (0, 0)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_insert_gen AFTER INSERT ON channels
+        BEGIN
+            UPDATE generation SET channels = channels + 1 WHERE id = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_update_gen AFTER UPDATE ON channels
+        BEGIN
+            UPDATE generation SET channels = channels + 1 WHERE id = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_delete_gen AFTER DELETE ON channels
+        BEGIN
+            UPDATE generation SET channels = channels + 1 WHERE id = 0;
+        END
+        """
+    ],
+    'ac': [
+        ('channels', 'number_sort', 'REAL'),
+        ('channels', 'display_number_sort', 'REAL'),
     ],
     'dt': [
         """
@@ -100,6 +169,15 @@ sqlcmds = {
             group_tag, thumbnail, thumbnail_size, updated, json
             ) VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? )
         """,
+    'channels_upsert':
+        """
+        INSERT INTO channels (
+            namespace, instance, enabled, uid, number, display_number, display_name,
+            group_tag, thumbnail, thumbnail_size, updated, json
+            ) VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? )
+            ON CONFLICT(namespace, instance, uid) DO UPDATE SET
+            number=excluded.number, updated=excluded.updated, json=excluded.json
+        """,
     'channels_update':
         """
         UPDATE channels SET 
@@ -112,15 +190,11 @@ sqlcmds = {
             enabled=?, display_number=?, display_name=?, group_tag=?, thumbnail=?, thumbnail_size=?
             WHERE namespace=? AND instance=? AND uid=?
         """,
-    'channels_updated_update':
-        """
-        UPDATE channels SET updated = False WHERE namespace=? AND instance=?
-        """,
     'channels_atsc_update':
         """
         UPDATE channels SET 
             atsc=?
-            WHERE namespace=? AND instance=? AND uid=?
+            WHERE namespace=? AND instance=? AND uid=? AND atsc IS NOT ?
         """,
     'channels_json_update':
         """
@@ -136,18 +210,24 @@ sqlcmds = {
         """,
     'channels_del':
         """
-        DELETE FROM channels WHERE updated LIKE ?
-        AND namespace LIKE ? AND instance LIKE ?
+        DELETE FROM channels{where}
         """,
     'channels_get':
         """
-        SELECT * FROM channels WHERE namespace LIKE ?
-        AND instance LIKE ? ORDER BY CAST(number as FLOAT), namespace, instance
+        SELECT * FROM channels{where}
+        ORDER BY number_sort, namespace, instance
+        """,
+    'channels_uid_del':
+        """
+        DELETE FROM channels WHERE namespace=? AND instance=? AND uid=?
+        """,
+    'channels_changes_get':
+        """
+        SELECT uid, number, json FROM channels WHERE namespace=? AND instance=?
         """,
     'channels_one_get':
         """
-        SELECT * FROM channels WHERE uid=? AND namespace LIKE ?
-        AND instance LIKE ?
+        SELECT * FROM channels{where}
         """,
     'channels_name_get':
         """
@@ -171,8 +251,7 @@ sqlcmds = {
         """,
     'status_del':
         """
-        DELETE FROM status WHERE
-            namespace LIKE ? AND instance LIKE ?
+        DELETE FROM status{where}
         """,
     'zones_add':
         """
@@ -180,6 +259,14 @@ sqlcmds = {
             namespace, instance, uid, name
             ) VALUES ( ?, ?, ?, ? )
         """,
+    'generation_get':
+        """
+        SELECT channels FROM generation WHERE id = 0
+        """,
+    'generation_update':
+        """
+        UPDATE generation SET channels = ? WHERE id = 0
+        """,
     'zones_get':
         """
         SELECT uid, name FROM zones WHERE
@@ -190,51 +277,68 @@ sqlcmds = {
 
 
 class DBChannels(DB):
+    cache = None
 
     def __init__(self, _config):
         super().__init__(_config, _config['datamgmt'][DB_CONFIG_NAME], sqlcmds)
 
     def save_channel_list(self, _namespace, _instance, _ch_dict, save_edit_groups=True):
         """
-        Assume the list is complete and will remove any old channels not updated
+        Assume the list is complete and will remove any old channels not updated.
+        Only channels that are new or have changed are written and all
+        changes are saved in one transaction.
+        Returns a dict with the number of channels added, updated, unchanged and removed
         """
         if _instance is None or _namespace is None:
             self.logger.warning(
                 'Saving Channel List: Namespace or Instance is None {}:{}'
                 .format(_namespace, _instance))
-        self.update(DB_CHANNELS_TABLE + '_updated', (_namespace, _instance,))
+        existing = {}
+        rows = self.get_dict(DB_CHANNELS_TABLE + '_changes', (_namespace, _instance,))
+        if rows:
+            for row in rows:
+                existing[row['uid']] = row
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+        upsert_list = []
+        uids = set()
         for ch in _ch_dict:
+            uids.add(ch['id'])
+            ch_json = json.dumps(ch)
+            row = existing.get(ch['id'])
+            if row is None:
+                counts['added'] += 1
+            elif row['number'] == str(ch['number']) and row['json'] == ch_json:
+                counts['unchanged'] += 1
+                continue
+            else:
+                counts['updated'] += 1
             if save_edit_groups:
                 edit_groups = ch['groups_other']
             else:
                 edit_groups = None
-            try:
-                self.add(DB_CHANNELS_TABLE, (
-                    _namespace,
-                    _instance,
-                    True,
-                    ch['id'],
-                    ch['number'],
-                    ch['number'],
-                    ch['name'],
-                    edit_groups,
-                    ch['thumbnail'],
-                    str(ch['thumbnail_size']),
-                    True,
-                    json.dumps(ch)))
-            except sqlite3.IntegrityError as ex:
-                self.update(DB_CHANNELS_TABLE, (
-                    ch['number'],
-                    True,
-                    json.dumps(ch),
-                    _namespace,
-                    _instance,
-                    ch['id']
-                ))
-
-            self.add(DB_STATUS_TABLE, (
-                _namespace, _instance, datetime.datetime.now()))
-        self.delete(DB_CHANNELS_TABLE, (False, _namespace, _instance,))
+            upsert_list.append((
+                _namespace,
+                _instance,
+                True,
+                ch['id'],
+                ch['number'],
+                ch['number'],
+                ch['name'],
+                edit_groups,
+                ch['thumbnail'],
+                str(ch['thumbnail_size']),
+                True,
+                ch_json))
+        del_list = [(_namespace, _instance, uid)
+                    for uid in existing.keys() if uid not in uids]
+        counts['removed'] = len(del_list)
+        self.bulk([
+            (DB_CHANNELS_TABLE + '_upsert', upsert_list),
+            (DB_CHANNELS_TABLE + '_uid_del', del_list),
+            (DB_STATUS_TABLE + '_add', [(
+                _namespace, _instance, datetime.datetime.now())]),
+        ])
+        return counts
 
     def update_channel(self, _ch):
         """
@@ -253,18 +357,14 @@ class DBChannels(DB):
         ))
 
     def del_channels(self, _namespace, _instance):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        return self.delete(DB_CHANNELS_TABLE, ('%', _namespace, _instance,))
+        where, values = self.build_where([('namespace', _namespace), ('instance', _instance)])
+        return self.delete(None, values,
+                           sql=self.sqlcmds[DB_CHANNELS_TABLE + '_del'].format(where=where))
 
     def del_status(self, _namespace=None, _instance=None):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        return self.delete(DB_STATUS_TABLE, (_namespace, _instance,))
+        where, values = self.build_where([('namespace', _namespace), ('instance', _instance)])
+        return self.delete(None, values,
+                           sql=self.sqlcmds[DB_STATUS_TABLE + '_del'].format(where=where))
 
     def get_status(self, _namespace, _instance):
         result = self.get(DB_STATUS_TABLE, (_namespace, _instance))
@@ -277,29 +377,72 @@ class DBChannels(DB):
         else:
             return None
 
-    def get_channels(self, _namespace, _instance):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
+    def get_generation(self):
+        """
+        Returns the counter bumped by the database triggers on every
+        change to the channels table
+        """
+        result = self.get(DB_GENERATION_TABLE)
+        if result:
+            return result[0][0]
+        return None
 
-        rows_dict = {}
-        rows = self.get_dict(DB_CHANNELS_TABLE, (_namespace, _instance,))
+    def get_channel_cache(self):
+        """
+        Returns the cached list of all channel rows with the json fields
+        parsed.  The cache is per process and is rebuilt when the
+        generation counter changes, which includes changes made
+        by other processes.
+        """
+        generation = self.get_generation()
+        cache = DBChannels.cache
+        if cache is not None and generation is not None \
+                and cache['generation'] == generation \
+                and cache['db'] == self.db_fullpath:
+            return cache
+        rows = self.get_dict(None, sql=self.sqlcmds[DB_CHANNELS_TABLE + '_get'].format(where=''))
         if rows is None:
             return None
+        by_uid = {}
         for row in rows:
-            ch = json.loads(row['json'])
-            row['json'] = ch
+            row['json'] = json.loads(row['json'])
             row['thumbnail_size'] = ast.literal_eval(row['thumbnail_size'])
             if row['atsc'] is not None:
                 row['atsc'] = ast.literal_eval(row['atsc'])
+            key = (row['namespace'].lower(), row['instance'].lower(), row['uid'])
+            by_uid[key] = row
+        cache = {
+            'generation': generation,
+            'db': self.db_fullpath,
+            'rows': rows,
+            'uid': by_uid}
+        DBChannels.cache = cache
+        return cache
+
+    def get_channels(self, _namespace, _instance):
+        """
+        Returns a dict of uid containing a list of channel rows, since
+        the same uid may be used by more than one instance.
+        Rows are shallow copies of the cached rows, so top level
+        fields may be changed by the caller.
+        """
+        cache = self.get_channel_cache()
+        if cache is None:
+            return None
+        namespace = _namespace.lower() if _namespace and _namespace != '%' else None
+        instance = _instance.lower() if _instance and _instance != '%' else None
+
+        rows_dict = {}
+        for row in cache['rows']:
+            if namespace is not None and row['namespace'].lower() != namespace:
+                continue
+            if instance is not None and row['instance'].lower() != instance:
+                continue
             # handles the uid multiple times across instances
-            if row['uid'] in rows_dict.keys():
-                rows_dict[row['uid']].append(row)
+            if row['uid'] in rows_dict:
+                rows_dict[row['uid']].append(row.copy())
             else:
-                rows_dict[row['uid']] = []
-                rows_dict[row['uid']].append(row)
-
+                rows_dict[row['uid']] = [row.copy()]
         return rows_dict
 
     def get_channel_names(self):
@@ -309,12 +452,22 @@ class DBChannels(DB):
         return self.get_dict(DB_CHANNELS_TABLE + '_instance')
 
     def get_channel(self, _uid, _namespace, _instance):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
+        if _namespace and _namespace != '%' and _instance and _instance != '%':
+            cache = self.get_channel_cache()
+            if cache is None:
+                return None
+            row = cache['uid'].get((_namespace.lower(), _instance.lower(), _uid))
+            if row is None:
+                return None
+            row = row.copy()
+            # thumbnail_size is returned as stored
+            row['thumbnail_size'] = str(row['thumbnail_size'])
+            return row
 
-        rows = self.get_dict(DB_CHANNELS_TABLE + '_one', (_uid, _namespace, _instance,))
+        where, values = self.build_where(
+            [('namespace', _namespace), ('instance', _instance)], [('uid=?', _uid)])
+        rows = self.get_dict(None, values,
+                             sql=self.sqlcmds[DB_CHANNELS_TABLE + '_one_get'].format(where=where))
         for row in rows:
             ch = json.loads(row['json'])
             row['json'] = ch
@@ -328,12 +481,18 @@ class DBChannels(DB):
         Updates the atsc field for one channel
         """
         atsc_str = str(_ch['atsc'])
-        self.update(DB_CHANNELS_TABLE + '_atsc', (
+        values = (
             atsc_str,
             _ch['namespace'],
             _ch['instance'],
-            _ch['uid']
-        ))
+            _ch['uid'],
+            atsc_str
+        )
+        if self.use_writer():
+            # called while tuning, so the write is queued without waiting
+            self.write([(self.sqlcmds[DB_CHANNELS_TABLE + '_atsc_update'], values, False)])
+        else:
+            self.update(DB_CHANNELS_TABLE + '_atsc', values)
 
     def update_channel_json(self, _ch, _namespace, _instance):
         """
@@ -365,18 +524,13 @@ class DBChannels(DB):
         Using dynamic SQl to create a SELECT statement and send to the DB
         keys are [name_of_column, direction_asc=True]
         """
-        where = ' WHERE namespace LIKE ? AND instance LIKE ? '
+        where, values = self.build_where([('namespace', _namespace), ('instance', _instance)])
         orderby_front = ' ORDER BY '
-        orderby_end = ' CAST(number as FLOAT), namespace, instance '
+        orderby_end = ' number_sort, namespace, instance '
         orderby1 = self.get_channels_orderby(_first_sort_key[0], _first_sort_key[1])
         orderby2 = self.get_channels_orderby(_second_sort_key[0], _second_sort_key[1])
         sqlcmd = ''.join(['SELECT * FROM channels ', where, orderby_front, orderby1, orderby2, orderby_end])
-
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        rows = self.get_dict(None, (_namespace, _instance,), sql=sqlcmd)
+        rows = self.get_dict(None, values, sql=sqlcmd)
         for row in rows:
             ch = json.loads(row['json'])
             row['json'] = ch
@@ -385,7 +539,8 @@ class DBChannels(DB):
 
     def get_channels_orderby(self, _column, _ascending):
         str_types = ['namespace', 'instance', 'enabled', 'display_name', 'group_tag', 'thumbnail']
-        float_types = ['uid', 'display_number']
+        sort_types = {'display_number': 'display_number_sort'}
+        float_types = ['uid']
         json_types = ['HD', 'callsign']
         if _ascending:
             dir_ = 'ASC'
@@ -395,6 +550,8 @@ class DBChannels(DB):
             return ''
         elif _column in str_types:
             return ''.join([_column, ' ', dir_, ', '])
+        elif _column in sort_types:
+            return ''.join([sort_types[_column], ' ', dir_, ', '])
         elif _column in float_types:
             return ''.join(['CAST(', _column, ' as FLOAT) ', dir_, ', '])
         elif _column in json_types:
@@ -408,12 +565,15 @@ class DBChannels(DB):
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        msg = self.import_sql(backup_folder)
+        generation = self.get_generation() or 0
+        msg = self.import_db(backup_folder)
         if msg is None:
+            # the restored counter may match a cached generation
+            self.update(DB_GENERATION_TABLE, (generation + (self.get_generation() or 0) + 1,))
             return 'Channels Database Restored'
         else:
             return msg
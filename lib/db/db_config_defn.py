@@ -27,6 +27,7 @@ DB_AREA_TABLE = 'area'
 DB_SECTION_TABLE = 'section'
 DB_INSTANCE_TABLE = 'instance'
 DB_CONFIG_TABLE = 'config'
+DB_CONFIG_VERSION_TABLE = 'config_version'
 DB_CONFIG_NAME = 'db_files-defn_db'
 
 sqlcmds = {
@@ -71,6 +72,27 @@ sqlcmds = {
             FOREIGN KEY(area) REFERENCES area(name),
             UNIQUE(area, name)
             )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS config_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+            )
+        """,
+        """
+        INSERT OR IGNORE INTO config_version (id, version) VALUES (0, 0)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS config_insert_version AFTER INSERT ON config
+        BEGIN
+            UPDATE config_version SET version = version + 1 WHERE id = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS config_update_version AFTER UPDATE ON config
+        BEGIN
+            UPDATE config_version SET version = version + 1 WHERE id = 0;
+        END
         """
     ],
 
@@ -143,12 +165,26 @@ sqlcmds = {
     'config_get':
         """
         SELECT settings from config
+        """,
+    'config_version_get':
+        """
+        SELECT version FROM config_version WHERE id = 0
+        """,
+    'config_version_update':
+        """
+        UPDATE config_version SET version = ? WHERE id = 0
+        """,
+    'config_settings_get':
+        """
+        SELECT settings, (SELECT version FROM config_version WHERE id = 0)
+        FROM config
         """
 
 }
 
 
 class DBConfigDefn(DB):
+    cache = None
 
     def __init__(self, _config):
         super().__init__(_config, _config['datamgmt'][DB_CONFIG_NAME], sqlcmds)
@@ -238,17 +274,48 @@ class DBConfigDefn(DB):
             json.dumps(_config),
         ))
     
+    def get_config_version(self):
+        """
+        Returns the counter bumped by the database triggers on every
+        change to the config table
+        """
+        result = self.get(DB_CONFIG_VERSION_TABLE)
+        if result:
+            return result[0][0]
+        return None
+
     def get_config(self):
-        return json.loads(self.get_dict(DB_CONFIG_TABLE)[0]['settings'])
+        """
+        Returns the merged config.  The parsed config is kept per process
+        and only reloaded when the version changes, which includes
+        changes saved by other processes.  The sections are copies, so
+        settings may be changed by the caller without changing the cache.
+        """
+        version = self.get_config_version()
+        cache = DBConfigDefn.cache
+        if cache is None or version is None \
+                or cache['version'] != version \
+                or cache['db'] != self.db_fullpath:
+            result = self.get('config_settings')
+            cache = {
+                'version': result[0][1],
+                'db': self.db_fullpath,
+                'config': json.loads(result[0][0])}
+            DBConfigDefn.cache = cache
+        return {key: dict(value) if isinstance(value, dict) else value
+                for key, value in cache['config'].items()}
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        msg = self.import_sql(backup_folder)
+        version = self.get_config_version() or 0
+        msg = self.import_db(backup_folder)
         if msg is None:
+            # the restored counter may match a cached version
+            self.update(DB_CONFIG_VERSION_TABLE, (version + (self.get_config_version() or 0) + 1,))
             return 'Config Database Restored'
         else:
             return msg
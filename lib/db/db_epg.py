@@ -18,13 +18,20 @@ substantial portions of the Software.
 
 import json
 import datetime
+import hashlib
+import threading
 
 from lib.db.db import DB
 from lib.common.decorators import Backup
 from lib.common.decorators import Restore
 
 DB_EPG_TABLE = 'epg'
+DB_EPG_PROGRAM_TABLE = 'epg_program'
+DB_EPG_CHANNEL_TABLE = 'epg_channel'
+DB_EPG_STAGE_TABLE = 'epg_program_stage'
+DB_GENERATION_TABLE = 'generation'
 DB_CONFIG_NAME = 'db_files-epg_db'
+MAX_PROGRAM_LENGTH = 86400  # seconds a program may start before a time window
 
 sqlcmds = {
     'ct': [
@@ -37,11 +44,112 @@ sqlcmds = {
             file      VARCHAR(255) NOT NULL,
             UNIQUE(namespace, instance, day)
             )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_ns_day_idx ON epg (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, day)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_day_idx ON epg (day)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS epg_program (
+            namespace VARCHAR(255) NOT NULL,
+            instance  VARCHAR(255) NOT NULL,
+            day       DATE NOT NULL,
+            channel   VARCHAR(255) NOT NULL,
+            start_time INTEGER,
+            stop_time INTEGER,
+            json      TEXT NOT NULL
+            )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_program_channel_idx ON epg_program (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, channel, start_time)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_program_ns_day_idx ON epg_program (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, day)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_program_day_idx ON epg_program (day)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS epg_program_stage (
+            namespace VARCHAR(255) NOT NULL,
+            instance  VARCHAR(255) NOT NULL,
+            day       DATE NOT NULL,
+            channel   VARCHAR(255) NOT NULL,
+            start_time INTEGER,
+            stop_time INTEGER,
+            json      TEXT NOT NULL
+            )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_program_stage_idx ON epg_program_stage (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, day)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_program_stage_day_idx ON epg_program_stage (day)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS epg_channel (
+            namespace VARCHAR(255) NOT NULL,
+            instance  VARCHAR(255) NOT NULL,
+            day       DATE NOT NULL,
+            channel   VARCHAR(255) NOT NULL,
+            fingerprint VARCHAR(40) NOT NULL
+            )
+        """,
+        """
+        DELETE FROM epg_channel WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM epg_channel GROUP BY
+                namespace COLLATE NOCASE, instance COLLATE NOCASE, day, channel)
+        """,
+        """
+        DROP INDEX IF EXISTS epg_channel_idx
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS epg_channel_key_idx ON epg_channel (
+            namespace COLLATE NOCASE, instance COLLATE NOCASE, day, channel)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS epg_channel_day_idx ON epg_channel (day)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS generation (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            epg INTEGER NOT NULL
+            )
+        """,
+        """
+        INSERT OR IGNORE INTO generation (id, epg) VALUES (0, 0)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS epg_insert_gen AFTER INSERT ON epg
+        BEGIN
+            UPDATE generation SET epg = epg + 1 WHERE id = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS epg_delete_gen AFTER DELETE ON epg
+        BEGIN
+            UPDATE generation SET epg = epg + 1 WHERE id = 0;
+        END
         """
     ],
     'dt': [
         """
         DROP TABLE IF EXISTS epg
+        """,
+        """
+        DROP TABLE IF EXISTS epg_program
+        """,
+        """
+        DROP TABLE IF EXISTS epg_channel
+        """,
+        """
+        DROP TABLE IF EXISTS epg_program_stage
         """
     ],
 
@@ -57,42 +165,50 @@ sqlcmds = {
             ) VALUES ( ?, ?, ?, ?, ? )
         """,
 
+    'epg_file_get':
+        """
+        SELECT namespace, instance, day, last_update, file FROM epg WHERE file != ''
+        """,
+    'epg_file_update':
+        """
+        UPDATE epg SET file='' WHERE namespace=? AND instance=? AND day=?
+        """,
+
     'epg_by_day_del':
         """
-        DELETE FROM epg WHERE namespace LIKE ? AND instance LIKE ? AND day < DATE('now',?)
+        DELETE FROM epg{where}
         """,
     'epg_by_day_get':
         """
-        SELECT file FROM epg WHERE namespace LIKE ? AND instance LIKE ? AND day < DATE('now',?)
+        SELECT file FROM epg{where}
         """,
 
     'epg_instance_del':
         """
-        DELETE FROM epg WHERE namespace=? AND instance LIKE ?
+        DELETE FROM epg{where}
         """,
 
     'epg_instance_get':
         """
-        SELECT file FROM epg WHERE namespace=? AND instance LIKE ?
+        SELECT file FROM epg{where}
         """,
 
     'epg_last_update_get':
         """
-        SELECT datetime(last_update, 'localtime') FROM epg WHERE
-            namespace=? AND instance LIKE ? and day=?
+        SELECT datetime(last_update, 'localtime') FROM epg{where}
         """,
 
     'epg_last_update_update':
         """
         UPDATE epg SET 
-            last_update=? WHERE namespace LIKE ? AND instance LIKE ?
+            last_update=?{where}
         """,
 
-    'epg_get':
+    'epg_day_update':
         """
-        SELECT * FROM epg WHERE
-            namespace LIKE ? AND instance LIKE ? ORDER BY day LIMIT ? OFFSET ?
+        UPDATE epg SET last_update=? WHERE namespace=? AND instance=? AND day=?
         """,
+
     'epg_one_get':
         """
         SELECT * FROM epg WHERE
@@ -105,69 +221,400 @@ sqlcmds = {
     'epg_instances_get':
         """
         SELECT DISTINCT namespace, instance FROM epg
+        """,
+
+    'generation_get':
+        """
+        SELECT epg FROM generation WHERE id = 0
+        """,
+    'generation_update':
+        """
+        UPDATE generation SET epg = ? WHERE id = 0
+        """,
+
+    'epg_program_add':
+        """
+        INSERT INTO epg_program (
+            namespace, instance, day, channel, start_time, stop_time, json
+            ) VALUES ( ?, ?, ?, ?, ?, ?, ? )
+        """,
+    'epg_program_day_del':
+        """
+        DELETE FROM epg_program WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+        """,
+    'epg_program_channel_del':
+        """
+        DELETE FROM epg_program WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND +day=? AND channel=?
+        """,
+    'epg_program_del':
         """
+        DELETE FROM epg_program{where}
+        """,
+    'epg_program_get':
+        """
+        SELECT namespace, instance, day, json FROM epg_program{where}
+        ORDER BY namespace COLLATE NOCASE, instance COLLATE NOCASE, channel, start_time
+        """,
+    'epg_program_channel_get':
+        """
+        SELECT json FROM epg_program WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE
+            AND channel=? AND start_time < ? AND stop_time > ?
+        ORDER BY start_time
+        """,
+    'epg_program_window_get':
+        """
+        SELECT namespace, instance, day, start_time, json FROM epg_program WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE
+            AND channel=? AND start_time >= ? AND start_time < ? AND stop_time > ?
+        ORDER BY start_time
+        """,
+    'epg_program_now_next_get':
+        """
+        SELECT * FROM (
+            SELECT start_time, stop_time, json FROM epg_program WHERE
+                namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE
+                AND channel=? AND start_time <= ?
+            ORDER BY start_time DESC LIMIT 1)
+        UNION ALL
+        SELECT * FROM (
+            SELECT start_time, stop_time, json FROM epg_program WHERE
+                namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE
+                AND channel=? AND start_time > ?
+            ORDER BY start_time LIMIT 1)
+        """,
+    'epg_program_one_get':
+        """
+        SELECT json FROM epg_program WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+        ORDER BY channel, start_time
+        """,
+
+    'epg_program_stage_add':
+        """
+        INSERT INTO epg_program_stage (
+            namespace, instance, day, channel, start_time, stop_time, json
+            ) VALUES ( ?, ?, ?, ?, ?, ?, ? )
+        """,
+    'epg_program_stage_move':
+        """
+        INSERT INTO epg_program (
+            namespace, instance, day, channel, start_time, stop_time, json
+            ) SELECT namespace, instance, day, channel, start_time, stop_time, json
+            FROM epg_program_stage WHERE
+                namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+            ORDER BY rowid
+        """,
+    'epg_program_stage_day_del':
+        """
+        DELETE FROM epg_program_stage WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+        """,
+    'epg_program_stage_del':
+        """
+        DELETE FROM epg_program_stage{where}
+        """,
+
+    'epg_channel_add':
+        """
+        INSERT OR REPLACE INTO epg_channel (
+            namespace, instance, day, channel, fingerprint
+            ) VALUES ( ?, ?, ?, ?, ? )
+        """,
+    'epg_channel_get':
+        """
+        SELECT channel, fingerprint FROM epg_channel WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+        """,
+    'epg_channel_day_del':
+        """
+        DELETE FROM epg_channel WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=?
+        """,
+    'epg_channel_one_del':
+        """
+        DELETE FROM epg_channel WHERE
+            namespace=? COLLATE NOCASE AND instance=? COLLATE NOCASE AND day=? AND channel=?
+        """,
+    'epg_channel_del':
+        """
+        DELETE FROM epg_channel{where}
+        """,
 }
 
 
+def xmltv_to_epoch(_xmltv_time):
+    """
+    Converts a xmltv time, like 20230101153000 +0000, to seconds
+    since the epoch.  Returns None when the time cannot be parsed
+    """
+    if not _xmltv_time:
+        return None
+    try:
+        return int(datetime.datetime.strptime(_xmltv_time, '%Y%m%d%H%M%S %z').timestamp())
+    except ValueError:
+        pass
+    try:
+        return int(datetime.datetime.strptime(_xmltv_time[:14], '%Y%m%d%H%M%S')
+                   .replace(tzinfo=datetime.timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def channel_fingerprint(_json_list):
+    """
+    Returns the fingerprint of the programs of a channel and day, the
+    order of the programs does not matter
+    """
+    return hashlib.sha1('\n'.join(sorted(_json_list)).encode()).hexdigest()
+
+
 class DBepg(DB):
+    """
+    The epg table tracks when each day was refreshed for a
+    namespace/instance.  The programs for each day are stored one row
+    per program in epg_program, indexed by channel and start time.
+    epg_channel has a fingerprint of the programs of each channel and
+    day, so a refresh only rewrites the channels that changed.  A day
+    saved a channel at a time is staged in epg_program_stage and
+    replaces the saved programs when the day is finished.
+    Earlier versions stored each day as a json file, these are
+    moved into epg_program the first time the database is opened.
+    """
+    files_migrated = set()
 
     def __init__(self, _config):
         super().__init__(_config, _config['datamgmt'][DB_CONFIG_NAME], sqlcmds)
+        self.changes = None
+        self.changes_lock = threading.Lock()
+        self.reset_changes()
+        if str(self.db_fullpath) not in DBepg.files_migrated:
+            DBepg.files_migrated.add(str(self.db_fullpath))
+            self.migrate_files()
 
     def get_col_names(self):
         return self.get(DB_EPG_TABLE + '_column_names')
-    
-    def save_program_list(self, _namespace, _instance, _day, _prog_list):
-        filepath = self.save_file((DB_EPG_TABLE, _namespace, _instance, _day), json.dumps(_prog_list))
-        if filepath:
-            self.add(DB_EPG_TABLE, (
-                _namespace,
-                _instance,
-                _day,
-                datetime.datetime.utcnow(),
-                str(filepath),))
+
+    def reset_changes(self):
+        """
+        Clears the counts of what save_program_list changed
+        """
+        self.changes = {'days': 0, 'days_changed': 0, 'channels': 0,
+                        'channels_changed': 0, 'channels_removed': 0, 'programs_written': 0}
+
+    def add_changes(self, **_counts):
+        """
+        Days may be saved from several threads at the same time
+        """
+        with self.changes_lock:
+            for key, count in _counts.items():
+                self.changes[key] += count
+
+    def save_program_list(self, _namespace, _instance, _day, _prog_list, _last_update=None):
+        """
+        Saves the programs for the day in a single transaction.  Only the
+        channels whose programs changed since the last save are rewritten,
+        when nothing changed only the last update time is saved.
+        """
+        if _last_update is None:
+            _last_update = datetime.datetime.utcnow()
+        channel_progs = {}
+        for prog in _prog_list:
+            channel_progs.setdefault(prog['channel'], []).append((prog, json.dumps(prog)))
+        fingerprints = {
+            channel: channel_fingerprint([x[1] for x in progs])
+            for channel, progs in channel_progs.items()}
+        saved = self.get_channel_fingerprints(_namespace, _instance, _day)
+        changed = [channel for channel, fingerprint in fingerprints.items()
+                   if saved.get(channel) != fingerprint]
+        removed = [channel for channel in saved if channel not in fingerprints]
+
+        self.add_changes(days=1, channels=len(fingerprints))
+        if saved and not changed and not removed:
+            # no trigger on update, the epg generation is unchanged
+            return self.bulk([(DB_EPG_TABLE + '_day_update',
+                               [(_last_update, _namespace, _instance, _day)])])
+
+        if saved:
+            del_rows = [(_namespace, _instance, _day, channel) for channel in changed + removed]
+            cmd_list = [
+                (DB_EPG_PROGRAM_TABLE + '_channel_del', del_rows),
+                (DB_EPG_CHANNEL_TABLE + '_one_del', del_rows)]
+        else:
+            # first save of the day or saved before fingerprints were kept
+            cmd_list = [
+                (DB_EPG_PROGRAM_TABLE + '_day_del', [(_namespace, _instance, _day)]),
+                (DB_EPG_CHANNEL_TABLE + '_day_del', [(_namespace, _instance, _day)])]
+        prog_rows = [(
+            _namespace, _instance, _day, channel,
+            xmltv_to_epoch(prog.get('start')), xmltv_to_epoch(prog.get('stop')), prog_json)
+            for channel in changed for prog, prog_json in channel_progs[channel]]
+        cmd_list.extend([
+            (DB_EPG_PROGRAM_TABLE + '_add', prog_rows),
+            (DB_EPG_CHANNEL_TABLE + '_add', [
+                (_namespace, _instance, _day, channel, fingerprints[channel])
+                for channel in changed]),
+            (DB_EPG_TABLE + '_add', [(_namespace, _instance, _day, _last_update, '')])])
+        self.add_changes(days_changed=1, channels_changed=len(changed),
+                         channels_removed=len(removed), programs_written=len(prog_rows))
+        return self.bulk(cmd_list)
+
+    def get_channel_fingerprints(self, _namespace, _instance, _day):
+        return {row['channel']: row['fingerprint'] for row in
+                self.get_dict(DB_EPG_CHANNEL_TABLE, (_namespace, _instance, _day)) or []}
+
+    def start_channel_day(self, _namespace, _instance, _day):
+        """
+        Starts saving a day a channel at a time and returns the saved
+        fingerprints of the day.  Programs left staged by a save that
+        did not finish are removed.
+        """
+        self.bulk([(DB_EPG_STAGE_TABLE + '_day_del', [(_namespace, _instance, _day)])])
+        return self.get_channel_fingerprints(_namespace, _instance, _day)
+
+    def save_channel_programs(self, _namespace, _instance, _channel_list):
+        """
+        Stages the programs of single channels of a day in one transaction.
+        _channel_list is a list of (day, channel, prog_list).  The saved
+        programs are unchanged until finish_channel_day.
+        """
+        prog_rows = []
+        for day, channel, prog_list in _channel_list:
+            prog_rows.extend([(
+                _namespace, _instance, day, channel,
+                xmltv_to_epoch(prog.get('start')), xmltv_to_epoch(prog.get('stop')), prog_json)
+                for prog, prog_json in prog_list])
+        self.add_changes(programs_written=len(prog_rows))
+        return self.bulk([(DB_EPG_STAGE_TABLE + '_add', prog_rows)])
+
+    def discard_channel_day(self, _namespace, _instance, _day):
+        """
+        Removes the staged programs of a day that is not finished
+        """
+        return self.bulk([(DB_EPG_STAGE_TABLE + '_day_del', [(_namespace, _instance, _day)])])
+
+    def finish_channel_day(self, _namespace, _instance, _day, _channels, _fingerprints,
+                           _appended, _last_update=None):
+        """
+        Ends a day saved a channel at a time and replaces the saved
+        programs with the staged ones in a single transaction.  The
+        channels in the _fingerprints dict are replaced and saved with
+        their fingerprint, the channels in _appended keep their saved
+        programs and have the staged ones added.  The saved channels not
+        in _channels are removed.  A day saved before fingerprints were
+        kept is replaced as a whole.  When nothing changed only the last
+        update time is saved, so the epg generation is unchanged.
+        """
+        if _last_update is None:
+            _last_update = datetime.datetime.utcnow()
+        saved = self.get_channel_fingerprints(_namespace, _instance, _day)
+        removed = [channel for channel in saved if channel not in _channels]
+        self.add_changes(days=1, channels=len(_channels), channels_removed=len(removed))
+        if not _fingerprints and not _appended and not removed \
+                and self.get_dict(DB_EPG_TABLE + '_one', (_namespace, _instance, _day)):
+            return self.bulk([(DB_EPG_TABLE + '_day_update',
+                               [(_last_update, _namespace, _instance, _day)])])
+        day_row = [(_namespace, _instance, _day)]
+        if saved:
+            del_rows = [(_namespace, _instance, _day, channel)
+                        for channel in list(_fingerprints.keys()) + removed]
+            cmd_list = [
+                (DB_EPG_PROGRAM_TABLE + '_channel_del', del_rows),
+                (DB_EPG_CHANNEL_TABLE + '_one_del', [x for x in del_rows if x[3] in removed])]
+        else:
+            # first save of the day or saved before fingerprints were kept
+            cmd_list = [
+                (DB_EPG_PROGRAM_TABLE + '_day_del', day_row),
+                (DB_EPG_CHANNEL_TABLE + '_day_del', day_row)]
+        # a channel added to is rewritten on the next save
+        fingerprint_rows = [(_namespace, _instance, _day, channel, fingerprint)
+                            for channel, fingerprint in _fingerprints.items()]
+        fingerprint_rows.extend([(_namespace, _instance, _day, channel, '')
+                                 for channel in _appended])
+        cmd_list.extend([
+            (DB_EPG_STAGE_TABLE + '_move', day_row),
+            (DB_EPG_STAGE_TABLE + '_day_del', day_row),
+            (DB_EPG_CHANNEL_TABLE + '_add', fingerprint_rows),
+            (DB_EPG_TABLE + '_add', [(_namespace, _instance, _day, _last_update, '')])])
+        self.add_changes(days_changed=1, channels_changed=len(_fingerprints))
+        return self.bulk(cmd_list)
+
+    def migrate_files(self):
+        """
+        Moves the programs from the per day json files into epg_program
+        """
+        rows = self.get_dict(DB_EPG_TABLE + '_file')
+        if not rows:
+            return
+        self.logger.info('Moving {} EPG days from files into the {} database'
+                         .format(len(rows), self.db_name))
+        for row in rows:
+            blob = self.get_file(row['file'])
+            if blob:
+                try:
+                    prog_list = json.loads(blob)
+                except ValueError as ex:
+                    self.logger.warning('Unable to read EPG file {}, {}'.format(row['file'], ex))
+                    prog_list = []
+                self.save_program_list(row['namespace'], row['instance'], row['day'],
+                                       prog_list, row['last_update'])
+                self.delete_file(row['file'])
+            else:
+                self.update(DB_EPG_TABLE + '_file',
+                            (row['namespace'], row['instance'], row['day']))
+
+    def delete_files(self, _files):
+        for f in _files:
+            if f[0]:
+                self.delete_file(f[0])
 
     def del_old_programs(self, _namespace, _instance, _days='-2 day'):
         """
         Removes all records for this namespace/instance that are over 2 day old
         """
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        files = self.get(DB_EPG_TABLE + '_by_day', (_namespace, _instance, _days,))
-        files = [x[0] for x in files]
-        for f in files:
-            self.delete_file(f)
-        self.delete(DB_EPG_TABLE + '_by_day', (_namespace, _instance, _days,))
+        where, values = self.build_where(
+            [('namespace', _namespace), ('instance', _instance)],
+            [("day < DATE('now',?)", _days)])
+        self.delete_files(self.get(
+            None, values, sql=self.sqlcmds[DB_EPG_TABLE + '_by_day_get'].format(where=where)))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_PROGRAM_TABLE + '_del'].format(where=where))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_CHANNEL_TABLE + '_del'].format(where=where))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_STAGE_TABLE + '_del'].format(where=where))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_TABLE + '_by_day_del'].format(where=where))
 
     def del_instance(self, _namespace, _instance):
         """
         Removes all records for this namespace/instance
         """
-        if not _instance:
-            _instance = '%'
-        files = self.get(DB_EPG_TABLE + '_instance', (_namespace, _instance,))
-        files = [x[0] for x in files]
-        for f in files:
-            self.delete_file(f)
-        return self.delete(DB_EPG_TABLE + '_instance', (_namespace, _instance,))
+        where, values = self.build_where(
+            [('instance', _instance)], [('namespace=? COLLATE NOCASE', _namespace)])
+        self.delete_files(self.get(
+            None, values, sql=self.sqlcmds[DB_EPG_TABLE + '_instance_get'].format(where=where)))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_PROGRAM_TABLE + '_del'].format(where=where))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_CHANNEL_TABLE + '_del'].format(where=where))
+        self.delete(None, values,
+                    sql=self.sqlcmds[DB_EPG_STAGE_TABLE + '_del'].format(where=where))
+        return self.delete(None, values,
+                           sql=self.sqlcmds[DB_EPG_TABLE + '_instance_del'].format(where=where))
 
     def set_last_update(self, _namespace=None, _instance=None, _day=None):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        self.update(DB_EPG_TABLE + '_last_update', (
-            _day,
-            _namespace,
-            _instance,
-        ))
+        where, values = self.build_where([('namespace', _namespace), ('instance', _instance)])
+        self.update(None, [_day] + values,
+                    sql=self.sqlcmds[DB_EPG_TABLE + '_last_update_update'].format(where=where))
 
     def get_last_update(self, _namespace, _instance, _day):
-        if not _instance:
-            _instance = '%'
-        result = self.get(DB_EPG_TABLE + '_last_update', (_namespace, _instance, _day,))
+        where, values = self.build_where(
+            [('instance', _instance)], [('namespace=?', _namespace), ('day=?', _day)])
+        result = self.get(None, values,
+                          sql=self.sqlcmds[DB_EPG_TABLE + '_last_update_get'].format(where=where))
         if result is None or len(result) == 0:
             return None
         else:
@@ -177,6 +624,16 @@ class DBepg(DB):
             else:
                 return None
 
+    def get_generation(self):
+        """
+        Returns the counter bumped by the database triggers each time
+        the programs of a day are saved or deleted
+        """
+        result = self.get(DB_GENERATION_TABLE)
+        if result:
+            return result[0][0]
+        return None
+
     def get_epg_names(self):
         return self.get_dict(DB_EPG_TABLE + '_name')
 
@@ -186,44 +643,100 @@ class DBepg(DB):
     def get_epg_one(self, _namespace, _instance, _day):
         row = self.get_dict(DB_EPG_TABLE + '_one', (_namespace, _instance, _day))
         if len(row):
-            blob = self.get_file_by_key((_namespace, _instance, _day,))
-            if blob:
-                row[0]['json'] = json.loads(blob)
-                return row
+            progs = self.get(DB_EPG_PROGRAM_TABLE + '_one', (_namespace, _instance, _day))
+            row[0]['json'] = [json.loads(x[0]) for x in progs]
+            return row
         return []
 
-    def init_get_query(self, _namespace, _instance):
-        if not _namespace:
-            _namespace = '%'
-        if not _instance:
-            _instance = '%'
-        self.get_init(DB_EPG_TABLE, (_namespace, _instance,))
-
-    def get_next_row(self):
-        row = self.get_dict_next()
-        namespace = None
-        instance = None
-        day = None
-        if row:
-            namespace = row['namespace']
-            instance = row['instance']
-            day = row['day']
-            file = row['file']
-            blob = self.get_file(file)
-            if blob:
-                json_data = json.loads(blob)
-            else:
-                json_data = []
-            row = json_data
-        return row, namespace, instance, day
-
-    def close_query(self):
-        self.cur.close()
+    def get_channel_programs(self, _namespace, _instance, _channel, _start_time, _stop_time):
+        """
+        Returns the programs for a channel that are airing between the two
+        times, which are seconds since the epoch.  Programs listed on two
+        days are only returned once.
+        """
+        rows = self.get(DB_EPG_PROGRAM_TABLE + '_channel',
+                        (_namespace, _instance, _channel, _stop_time, _start_time))
+        programs = []
+        starts = set()
+        for row in rows:
+            prog = json.loads(row[0])
+            if prog['start'] not in starts:
+                starts.add(prog['start'])
+                programs.append(prog)
+        return programs
+
+    def get_now_next(self, _channels, _time):
+        """
+        Returns a dict of (namespace, instance, channel) containing
+        (now, next) for each channel in _channels, the programs airing at
+        and after _time, seconds since the epoch, or None.  Each lookup
+        is two seeks on the channel and start time index.
+        """
+        sqlcmd = self.sqlcmds[DB_EPG_PROGRAM_TABLE + '_now_next_get']
+        now_next = {}
+        for namespace, instance, channel in _channels:
+            cur = self.sql_exec(sqlcmd, (namespace, instance, channel, _time,
+                                         namespace, instance, channel, _time))
+            now = None
+            after = None
+            for start_time, stop_time, prog_json in cur.fetchall():
+                if start_time > _time:
+                    after = (start_time, stop_time, prog_json)
+                elif stop_time is not None and stop_time > _time:
+                    now = (start_time, stop_time, prog_json)
+            cur.close()
+            now_next[(namespace, instance, channel)] = (now, after)
+        return now_next
+
+    def get_channel_window(self, _channels, _start_time, _stop_time):
+        """
+        Generator returning the programs airing between the two times,
+        seconds since the epoch, for each (namespace, instance, channel)
+        in _channels.  Programs are in the same form as get_programs,
+        in channel order and then start time order.  Each channel is a
+        range read on the channel and start time index.  A program that
+        spans midnight is saved under both days and is returned once.
+        """
+        sqlcmd = self.sqlcmds[DB_EPG_PROGRAM_TABLE + '_window_get']
+        for namespace, instance, channel in _channels:
+            rows = self.get(None, (namespace, instance, channel,
+                                   _start_time - MAX_PROGRAM_LENGTH, _stop_time, _start_time),
+                            sql=sqlcmd)
+            last_start = None
+            for row in rows or []:
+                # rows are in start time order, so the copies are together
+                if row[3] == last_start:
+                    continue
+                last_start = row[3]
+                yield json.loads(row[4]), row[0], row[1], row[2]
+
+    def get_programs(self, _namespace, _instance, _start_day=None):
+        """
+        Generator returning each program in namespace, instance,
+        channel and start time order.  Each program is a tuple of
+        (program dict, namespace, instance, day).  A full guide is
+        never held in memory.
+        """
+        conditions = None
+        if _start_day is not None:
+            # unary + keeps sqlite on the channel index, so no sort is needed
+            conditions = [('+day >= ?', _start_day)]
+        where, values = self.build_where(
+            [('namespace', _namespace), ('instance', _instance)], conditions)
+        for row in self.get_dict_iter(
+                None, values, sql=self.sqlcmds[DB_EPG_PROGRAM_TABLE + '_get'].format(where=where)):
+            yield json.loads(row['json']), row['namespace'], row['instance'], row['day']
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        return self.import_sql(backup_folder)
+        generation = self.get_generation() or 0
+        msg = self.import_db(backup_folder)
+        if msg is None:
+            self.migrate_files()
+            # the restored counter may match the generation of a prior xmltv
+            self.update(DB_GENERATION_TABLE, (generation + (self.get_generation() or 0) + 1,))
+        return msg
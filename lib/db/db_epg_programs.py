@@ -103,8 +103,8 @@ class DBEpgPrograms(DB):
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        return self.import_sql(backup_folder)
+        return self.import_db(backup_folder)
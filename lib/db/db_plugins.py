@@ -261,11 +261,11 @@ class DBPlugins(DB):
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        msg = self.import_sql(backup_folder)
+        msg = self.import_db(backup_folder)
         if msg is None:
             return 'Plugin Manifest Database Restored'
         else:
@@ -45,6 +45,7 @@ sqlcmds = {
                 CHECK( threadtype IN ('inline', 'thread', 'process') ) NOT NULL,
             active    BOOLEAN DEFAULT 0,
             description TEXT,
+            progress  VARCHAR(255),
             UNIQUE(area, title)
             )
         """,
@@ -67,6 +68,9 @@ sqlcmds = {
             )
         """
     ],
+    'ac': [
+        ('task', 'progress', 'VARCHAR(255)'),
+    ],
     'dt': [
         """
         DROP TABLE IF EXISTS trigger
@@ -85,15 +89,20 @@ sqlcmds = {
         """,
     'task_active_update':
         """
-        UPDATE task SET active=?
+        UPDATE task SET active=?, progress=NULL
         WHERE area LIKE ? AND title LIKE ?
         """,
     'task_finish_update':
         """
-        UPDATE task SET active=0,
+        UPDATE task SET active=0, progress=NULL,
         lastran=?, duration=?
         WHERE area=? AND title=?
         """,
+    'task_progress_update':
+        """
+        UPDATE task SET progress=?
+        WHERE namespace=? AND funccall=? AND active=1
+        """,
     'task_get':
         """
         SELECT *
@@ -298,6 +307,16 @@ class DBScheduler(DB):
             _title,
         ))
 
+    def set_progress(self, _namespace, _funccall, _progress):
+        """
+        Sets the progress shown for the running tasks calling _funccall
+        """
+        self.update(DB_TASK_TABLE + '_progress', (
+            _progress,
+            _namespace,
+            _funccall,
+        ))
+
     def reset_activity(self, _activity=False, _area=None, _title=None):
         if not _area:
             _area = '%'
@@ -374,11 +393,11 @@ class DBScheduler(DB):
 
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        msg = self.import_sql(backup_folder)
+        msg = self.import_db(backup_folder)
         if msg is None:
             msg = 'Scheduler Database Restored'
         self.reset_activity()
@@ -60,10 +60,19 @@ sqlcmds = {
         """
         DELETE FROM temp WHERE namespace=? AND instance LIKE ?
         """,
+    'temp_by_value_del':
+        """
+        DELETE FROM temp WHERE namespace=? AND instance=? AND value=?
+        """,
     'temp_get':
         """
         SELECT * FROM temp WHERE
             namespace=? AND instance=? AND value=?
+        """,
+    'temp_by_value_get':
+        """
+        SELECT * FROM temp WHERE
+            namespace=? AND value=?
         """
 }
 
@@ -102,13 +111,30 @@ class DBTemp(DB):
             _instance = '%'
         return self.delete(DB_TEMP_TABLE, (_namespace, _instance,))
 
+    def del_value(self, _namespace, _instance, _value):
+        """
+        Removes the value item for this namespace/instance
+        """
+        return self.delete(DB_TEMP_TABLE + '_by_value', (_namespace, _instance, _value,))
+
     def get_record(self, _namespace, _instance, _value):
         return self.get_dict(DB_TEMP_TABLE, (_namespace, _instance, _value))
 
+    def get_records_by_value(self, _namespace, _value):
+        """
+        Returns the records for all instances with the json decoded
+        """
+        rows = self.get_dict(DB_TEMP_TABLE + '_by_value', (_namespace, _value))
+        if rows is None:
+            return []
+        for row in rows:
+            row['json'] = json.loads(row['json'])
+        return rows
+
     @Backup(DB_CONFIG_NAME)
     def backup(self, backup_folder):
-        self.export_sql(backup_folder)
+        return self.export_db(backup_folder)
 
     @Restore(DB_CONFIG_NAME)
     def restore(self, backup_folder):
-        return self.import_sql(backup_folder)
+        return self.import_db(backup_folder)
@@ -0,0 +1,206 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+BATCH_SIZE = 200        # max requests in one transaction
+STOP_TIMEOUT = 5        # seconds to wait for the queue to drain at exit
+
+
+def is_lock_error(_ex):
+    msg = str(_ex)
+    return 'locked' in msg or 'busy' in msg
+
+
+class WriteRequest:
+    """
+    One or more sql commands that are written in the same transaction.
+    cmd_list is a list of (sqlcmd, values, many) where many uses
+    executemany with a list of values.
+    """
+
+    def __init__(self, _cmd_list):
+        self.cmd_list = _cmd_list
+        self.lastrowid = None
+        self.rowcount = 0
+        self.exception = None
+        self.event = threading.Event()
+
+    def done(self, _exception=None):
+        self.exception = _exception
+        self.event.set()
+
+    def wait(self, _timeout=None):
+        """
+        Waits for the write to be committed and returns the request.
+        Raises the sqlite exception when the write failed.
+        """
+        if not self.event.wait(_timeout):
+            raise sqlite3.OperationalError('write not acknowledged within {} seconds'
+                                           .format(_timeout))
+        if self.exception is not None:
+            raise self.exception
+        return self
+
+
+class DBWriter:
+    """
+    Single writer for a database file within a process.  Requests are
+    queued from any thread and a writer thread groups them into short
+    transactions, so the threads do not compete for the write lock.
+    Each request runs in a savepoint, a failing request is rolled
+    back without affecting the other requests in the transaction.
+    """
+    writers = {}
+    writers_lock = threading.Lock()
+
+    def __init__(self, _db):
+        self.logger = logging.getLogger(__name__)
+        self.db_name = _db.db_name
+        self.conn = _db.open_connection()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, args=())
+        self.thread.daemon = True
+        self.thread.start()
+
+    @classmethod
+    def get(cls, _db):
+        """
+        Returns the writer for the database file of _db, starting it if needed
+        """
+        key = (os.getpid(), str(_db.db_fullpath))
+        with cls.writers_lock:
+            writer = cls.writers.get(key)
+            if writer is None:
+                writer = DBWriter(_db)
+                cls.writers[key] = writer
+            return writer
+
+    @classmethod
+    def stop_all(cls):
+        """
+        Writes any queued requests and stops the writer threads
+        """
+        with cls.writers_lock:
+            writers = [w for k, w in cls.writers.items() if k[0] == os.getpid()]
+            cls.writers = {}
+        for writer in writers:
+            writer.queue.put(None)
+        for writer in writers:
+            writer.thread.join(STOP_TIMEOUT)
+
+    def submit(self, _cmd_list):
+        """
+        Queues the commands and returns the WriteRequest used to wait
+        for the acknowledgement
+        """
+        request = WriteRequest(_cmd_list)
+        self.queue.put(request)
+        return request
+
+    def run(self):
+        is_running = True
+        while is_running:
+            request = self.queue.get()
+            if request is None:
+                break
+            # requests queued while the last batch was written are
+            # committed together
+            batch = [request]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    request = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    is_running = False
+                    break
+                batch.append(request)
+            try:
+                self.write_batch(batch)
+            except Exception as ex:
+                self.logger.error('{} Write batch failed, {}'.format(self.db_name, ex))
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                for request in batch:
+                    if not request.event.is_set():
+                        request.done(ex)
+        self.conn.close()
+
+    def write_batch(self, _batch):
+        i = 5
+        while i > 0:
+            i -= 1
+            try:
+                results = self.execute_batch(_batch)
+                self.conn.commit()
+                for request, ex in zip(_batch, results):
+                    request.done(ex)
+                return
+            except sqlite3.OperationalError as e:
+                self.logger.warning('{} Write batch of {} ignored, retrying {}, {}'
+                                    .format(self.db_name, len(_batch), i, e))
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                if i == 0:
+                    for request in _batch:
+                        request.done(e)
+                    return
+                time.sleep(0.3 + random.randrange(0, 50) / 100)
+
+    def execute_batch(self, _batch):
+        """
+        Runs each request in a savepoint and returns the list of
+        exceptions, None for the requests that succeeded
+        """
+        results = []
+        self.conn.execute('BEGIN IMMEDIATE')
+        for request in _batch:
+            self.conn.execute('SAVEPOINT request')
+            try:
+                request.rowcount = 0
+                for sqlcmd, values, many in request.cmd_list:
+                    if many:
+                        cur = self.conn.executemany(sqlcmd, values)
+                    elif values:
+                        cur = self.conn.execute(sqlcmd, values)
+                    else:
+                        cur = self.conn.execute(sqlcmd)
+                    request.rowcount += max(cur.rowcount, 0)
+                    request.lastrowid = cur.lastrowid
+                    cur.close()
+                self.conn.execute('RELEASE request')
+                results.append(None)
+            except sqlite3.Error as e:
+                if isinstance(e, sqlite3.OperationalError) and is_lock_error(e):
+                    # retry the whole batch
+                    raise
+                self.conn.execute('ROLLBACK TO request')
+                self.conn.execute('RELEASE request')
+                results.append(e)
+        return results
+
+
+atexit.register(DBWriter.stop_all)
@@ -24,6 +24,7 @@ import platform
 import sys
 import time
 from multiprocessing import Queue, Process
+from threading import Thread
 
 
 try:
@@ -50,12 +51,15 @@ import lib.clients.web_admin as web_admin
 import lib.common.utils as utils
 import lib.plugins.plugin_handler as plugin_handler
 import lib.clients.ssdp.ssdp_server as ssdp_server
+import lib.clients.xmltv_artifact as xmltv_artifact
 import lib.db.datamgmt.backups as backups
 import lib.updater.updater as updater
 import lib.config.user_config as user_config
 from lib.db.db_scheduler import DBScheduler
 from lib.common.utils import clean_exit
 from lib.common.pickling import Pickling
+from lib.common.memory_stats import MemoryStats
+from lib.common.startup_timeline import StartupTimeline
 from lib.schedule.scheduler import Scheduler
 from lib.common.decorators import getrequest
 from lib.web.pages.templates import web_templates
@@ -114,10 +118,12 @@ def main(script_dir):
     config_obj = None
     scheduler = None
     terminate_queue = None
+    timeline = StartupTimeline.create('main')
     try:
         RESTART_REQUESTED = False
 
-        config_obj = user_config.get_config(script_dir, opersystem, args)
+        with timeline.phase('Load configuration'):
+            config_obj = user_config.get_config(script_dir, opersystem, args)
         config = config_obj.data
         LOGGER = logging.getLogger(__name__)
 
@@ -133,33 +139,49 @@ def main(script_dir):
         # use this until 0.9.3 due to maintenance mode not being enabled in 0.9.1
         if config['main']['maintenance_mode']:
             LOGGER.info('In maintenance mode, applying patches')
-            patcher.patch_upgrade(config_obj, utils.VERSION)
+            with timeline.phase('Apply patches'):
+                patcher.patch_upgrade(config_obj, utils.VERSION)
             time.sleep(0.01)
         config_obj.write('main', 'maintenance_mode', False)
 
-        utils.cleanup_web_temp(config)
-        plugins = init_plugins(config_obj)
+        with timeline.phase('Cleanup web temp'):
+            utils.cleanup_web_temp(config)
+        with timeline.phase('Load plugins'):
+            plugins = init_plugins(config_obj)
         config_obj.defn_json = None
-        init_versions(plugins)
+        with timeline.phase('Version tasks'):
+            init_versions(plugins)
         if opersystem in ['Windows']:
             pickle_it = Pickling(config)
             pickle_it.to_pickle(plugins)
 
-        backups.scheduler_tasks(config)
+        with timeline.phase('Backup tasks'):
+            backups.scheduler_tasks(config)
+        with timeline.phase('XMLTV tasks'):
+            xmltv_artifact.scheduler_tasks(config)
         terminate_queue = Queue()
         hdhr_queue = Queue()
         sched_queue = Queue()
-        webadmin = init_webadmin(config, plugins, hdhr_queue, terminate_queue, sched_queue)
-        tuner = init_tuner(config, plugins, hdhr_queue, terminate_queue)
-        scheduler = init_scheduler(config, plugins, sched_queue)
+        with timeline.phase('Start webadmin process'):
+            webadmin = init_webadmin(config, plugins, hdhr_queue, terminate_queue, sched_queue)
+        with timeline.phase('Start tuner process'):
+            tuner = init_tuner(config, plugins, hdhr_queue, terminate_queue)
+        with timeline.phase('Start scheduler'):
+            scheduler = init_scheduler(config, plugins, sched_queue)
         time.sleep(0.1)
-        ssdp_serverx = init_ssdp(config)
-        hdhr_serverx = init_hdhr(config, hdhr_queue)
+        with timeline.phase('Start SSDP and HDHR'):
+            ssdp_serverx = init_ssdp(config)
+            hdhr_serverx = init_hdhr(config, hdhr_queue)
 
         if opersystem in ['Windows']:
             time.sleep(2)
             pickle_it.delete_pickle(plugins.__class__.__name__)
         LOGGER.notice('Cabernet is now online.')
+        timeline.mark('Online')
+        timeline.save(config)
+        MemoryStats.start(config, 'main')
+        if config['main']['fast_start']:
+            init_deferred_startup(config, plugins)
 
         RESTART_REQUESTED = False
         while not RESTART_REQUESTED:            
@@ -197,6 +219,25 @@ def init_plugins(_config_obj):
     return plugins
 
 
+def init_deferred_startup(_config, _plugins):
+    """
+    Used with fast start.  Runs the startup work that was skipped
+    once the web servers are answering requests.
+    """
+    def _deferred_thread():
+        timeline = StartupTimeline.get()
+        if not utils.wait_for_webservers(_config):
+            LOGGER.warning('Web servers not answering, running deferred startup tasks anyway')
+        timeline.mark('Web servers answering', 'deferred')
+        with timeline.phase('Load cabernet repo', 'deferred'):
+            _plugins.load_deferred_repo()
+        timeline.save(_config)
+
+    t = Thread(target=_deferred_thread, args=())
+    t.daemon = True
+    t.start()
+
+
 def init_versions(_plugins):
     updater_obj = updater.Updater(_plugins)
     updater_obj.scheduler_tasks()
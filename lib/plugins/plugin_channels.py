@@ -29,6 +29,7 @@ import lib.m3u8 as m3u8
 import lib.common.utils as utils
 import lib.image_size.get_image_size as get_image_size
 from lib.db.db_channels import DBChannels
+from lib.plugins.provider_limiter import ProviderLimiter
 from lib.common.decorators import handle_url_except
 from lib.common.decorators import handle_json_except
 
@@ -86,6 +87,7 @@ class PluginChannels:
         header = {
             'Content-Type': 'application/json',
             'User-agent': utils.DEFAULT_USER_AGENT}
+        ProviderLimiter.get(self.config_obj.data, self.plugin_obj.name).wait_request()
         resp = self.plugin_obj.http_session.get(_uri, headers=header, timeout=(2, 4))
         x = resp.json()
         resp.raise_for_status()
@@ -98,6 +100,7 @@ class PluginChannels:
                 'User-agent': utils.DEFAULT_USER_AGENT}
         else:
             header = _header
+        ProviderLimiter.get(self.config_obj.data, self.plugin_obj.name).wait_request()
         if _data:
             resp = self.plugin_obj.http_session.post(_uri, headers=header, data=_data, timeout=(2, 4))
         else:
@@ -130,6 +133,7 @@ class PluginChannels:
                     self.config_obj.data[self.config_section]['channel-update_timeout']:
                 update_needed = True
         if update_needed or force:
+            start_time = time.time()
             i = 0
             ch_dict = self.get_channels()
             while ch_dict is None and i < 2:
@@ -141,15 +145,20 @@ class PluginChannels:
                     'Unable to retrieve channel data from {}:{}, aborting refresh'
                     .format(self.plugin_obj.name, self.instance_key))
                 return False
+            save_time = time.time()
             if 'channel-import_groups' in self.config_obj.data[self.config_section]:
-                self.db.save_channel_list(
+                counts = self.db.save_channel_list(
                     self.plugin_obj.name, self.instance_key, ch_dict,
                     self.config_obj.data[self.config_section]['channel-import_groups'])
             else:
-                self.db.save_channel_list(self.plugin_obj.name, self.instance_key, ch_dict)
-            self.logger.debug(
-                '{}:{} Channel update complete'
-                .format(self.plugin_obj.name, self.instance_key))
+                counts = self.db.save_channel_list(self.plugin_obj.name, self.instance_key, ch_dict)
+            end_time = time.time()
+            self.logger.info(
+                '{}:{} Channel update complete in {:.2f}s (fetch {:.2f}s, save {:.2f}s) '
+                'added:{} updated:{} unchanged:{} removed:{}'
+                .format(self.plugin_obj.name, self.instance_key,
+                        end_time - start_time, save_time - start_time, end_time - save_time,
+                        counts['added'], counts['updated'], counts['unchanged'], counts['removed']))
         else:
             self.logger.debug(
                 'Channel data still new for {} {}, not refreshing'
@@ -16,6 +16,7 @@ The above copyright notice and this permission notice shall be included in all c
 substantial portions of the Software.
 """
 
+import concurrent.futures
 import datetime
 import json
 import logging
@@ -23,6 +24,7 @@ import threading
 
 import lib.common.utils as utils
 from lib.db.db_epg import DBepg
+from lib.plugins.provider_limiter import ProviderLimiter
 from lib.common.decorators import handle_url_except
 from lib.common.decorators import handle_json_except
 
@@ -65,6 +67,7 @@ class PluginEPG:
             header = {'User-agent': utils.DEFAULT_USER_AGENT}
         else:
             header = _header
+        ProviderLimiter.get(self.config_obj.data, self.plugin_obj.name).wait_request()
         resp = self.plugin_obj.http_session.get(_uri, headers=header, timeout=(2, 4))
         x = resp.json()
         resp.raise_for_status()
@@ -81,13 +84,45 @@ class PluginEPG:
         forced_dates, aging_dates = self.dates_to_pull()
         self.db.del_old_programs(self.plugin_obj.name, self.instance_key)
 
-        for epg_day in forced_dates:
-            self.refresh_programs(epg_day, False)
-        for epg_day in aging_dates:
-            self.refresh_programs(epg_day, True)
-        self.logger.info('{}:{} EPG update completed'.format(self.plugin_obj.name, self.instance_key))
+        self.db.reset_changes()
+        self.refresh_days([(x, False) for x in forced_dates]
+                          + [(x, True) for x in aging_dates])
+        changes = self.db.changes
+        self.logger.info('{}:{} EPG update completed, {} of {} days changed, '
+                         '{} of {} channel days changed, {} removed, {} programs written'
+                         .format(self.plugin_obj.name, self.instance_key,
+                                 changes['days_changed'], changes['days'],
+                                 changes['channels_changed'], changes['channels'],
+                                 changes['channels_removed'], changes['programs_written']))
         return True
 
+    def refresh_days(self, _days):
+        """
+        Refreshes the (day, use_cache) list.  When the plugin is
+        parallel_safe, the days run at the same time up to the worker
+        limit of the provider, which is shared with the other instances
+        of the plugin.
+        """
+        limiter = ProviderLimiter.get(self.config_obj.data, self.plugin_obj.name)
+        workers = limiter.workers if self.plugin_obj.parallel_safe else 1
+
+        def refresh_day(_epg_day, _use_cache):
+            with limiter:
+                self.refresh_programs(_epg_day, _use_cache)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='epg_' + self.instance_key) as executor:
+                futures = [executor.submit(refresh_day, day, use_cache)
+                           for day, use_cache in _days]
+                for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    future.result()
+                    limiter.set_progress('refresh_epg', self.instance_key,
+                                         '{} of {} days'.format(i, len(futures)))
+        finally:
+            limiter.set_progress('refresh_epg', self.instance_key, None)
+
     def refresh_programs(self, _epg_day, use_cache=True):
         """
         dummy method to be overridden
@@ -27,6 +27,7 @@ import pathlib
 import lib.common.exceptions as exceptions
 import lib.common.utils as utils
 
+from lib.common.startup_timeline import StartupTimeline
 from .plugin import Plugin
 from .repo_handler import RepoHandler
 from lib.db.db_plugins import DBPlugins
@@ -49,7 +50,10 @@ class PluginHandler:
         self.check_external_plugin_folder()
         self.repos = RepoHandler(self.config_obj)
 
-        self.repos.load_cabernet_repo()
+        if self.config_obj.data['main'].get('fast_start'):
+            self.logger.debug('Fast start enabled, deferring loading of the cabernet repo')
+        else:
+            self.repos.load_cabernet_repo()
         self.collect_plugins(self.config_obj.data['paths']['internal_plugins_pkg'], False)
         self.collect_plugins(self.config_obj.data['paths']['external_plugins_pkg'], True)
         self.cleanup_config_missing_plugins()
@@ -57,6 +61,13 @@ class PluginHandler:
             del PluginHandler.cls_plugins
         PluginHandler.cls_plugins = self.plugins
 
+    def load_deferred_repo(self):
+        """
+        Used with fast start to load the cabernet repo after the
+        web servers are running
+        """
+        self.repos.load_cabernet_repo()
+
     def terminate(self, _plugin_name):
         """
         calls terminate to the plugin requested
@@ -138,7 +149,8 @@ class PluginHandler:
             importlib.resources.read_text(_plugins_pkg, _folder)
         except (IsADirectoryError, PermissionError):
             try:
-                plugin = Plugin(self.config_obj, self.plugin_defn, _plugins_pkg, _folder, _is_external)
+                with StartupTimeline.get().phase('Load ' + _folder, 'plugin'):
+                    plugin = Plugin(self.config_obj, self.plugin_defn, _plugins_pkg, _folder, _is_external)
                 self.plugins[plugin.name] = plugin
             except (exceptions.CabernetException, AttributeError):
                 pass
@@ -178,7 +190,8 @@ class PluginHandler:
                 plugin.enabled = False
             else:
                 try:
-                    plugin.plugin_obj = plugin.init_func(plugin, self.plugins)
+                    with StartupTimeline.get().phase('Initialize ' + plugin.name, 'plugin'):
+                        plugin.plugin_obj = plugin.init_func(plugin, self.plugins)
                 except exceptions.CabernetException:
                     self.logger.debug('Setting plugin {} to disabled'.format(plugin.name))
                     self.config_obj.data[plugin.name.lower()]['enabled'] = False
@@ -21,6 +21,7 @@ import threading
 
 import lib.common.utils as utils
 from lib.db.db_scheduler import DBScheduler
+from lib.plugins.provider_limiter import ProviderLimiter
 
 
 class PluginInstanceObj:
@@ -149,7 +150,14 @@ class PluginInstanceObj:
         self.config_obj.refresh_config_data()
         if self.channels is not None and \
                 self.config_obj.data[self.config_section]['enabled']:
-            return self.channels.refresh_channels()
+            # the plugin bounds the instances refreshed at once, the
+            # limiter is left free for the jobs of the refresh
+            limiter = ProviderLimiter.get(self.config_obj.data, self.plugin_obj.name)
+            limiter.set_progress('refresh_channels', self.instance_key, 'refreshing')
+            try:
+                return self.channels.refresh_channels()
+            finally:
+                limiter.set_progress('refresh_channels', self.instance_key, None)
         else:
             self.logger.notice(
                 '{}:{} Plugin instance disabled, not refreshing Channels'
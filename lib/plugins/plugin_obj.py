@@ -18,6 +18,7 @@ substantial portions of the Software.
 
 import base64
 import binascii
+import concurrent.futures
 import datetime
 import logging
 import requests
@@ -28,6 +29,7 @@ import urllib.request
 
 import lib.common.exceptions as exceptions
 from lib.db.db_scheduler import DBScheduler
+from lib.plugins.provider_limiter import ProviderLimiter
 
 
 class PluginObj:
@@ -46,6 +48,9 @@ class PluginObj:
             '+/'
         ]).encode()
         self.instances = {}
+        # set to True by plugins whose instances and EPG days can be
+        # refreshed at the same time
+        self.parallel_safe = False
         self.scheduler_db = DBScheduler(self.config_obj.data)
         self.scheduler_tasks()
         self.enabled = True
@@ -223,16 +228,29 @@ class PluginObj:
                     .format(self.plugin.name, _what_to_refresh))
                 return False
             if _instance is None:
-                for key, instance in self.instances.items():
-                    if _what_to_refresh == 'EPG':
-                        return instance.refresh_epg()
-                    elif _what_to_refresh == 'Channels':
-                        return instance.refresh_channels()
+                instances = list(self.instances.values())
             else:
-                if _what_to_refresh == 'EPG':
-                    return self.instances[_instance].refresh_epg()
-                elif _what_to_refresh == 'Channels':
-                    return self.instances[_instance].refresh_channels()
+                instances = [self.instances[_instance]]
+            if _what_to_refresh == 'EPG':
+                funccalls = [x.refresh_epg for x in instances]
+                # the provider limiter bounds the days, all instances start at once
+                workers = len(funccalls)
+            elif _what_to_refresh == 'Channels':
+                funccalls = [x.refresh_channels for x in instances]
+                workers = ProviderLimiter.get(self.config_obj.data, self.name).workers
+            else:
+                funccalls = []
+            if not funccalls:
+                return False
+            workers = min(workers, len(funccalls))
+            if workers == 1 or not self.parallel_safe:
+                return any([x() for x in funccalls])
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='refresh_' + self.plugin.name) as executor:
+                futures = [executor.submit(x) for x in funccalls]
+                results = [x.result() for x in futures]
+            return any(results)
         except exceptions.CabernetException:
             self.logger.debug('Setting plugin {} to disabled'.format(self.plugin.name))
             self.enabled = False
@@ -0,0 +1,106 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import threading
+import time
+
+from lib.db.db_scheduler import DBScheduler
+
+
+class ProviderLimiter:
+    """
+    Shared by all instances of a plugin within the process.  Limits
+    the number of refresh jobs, like an EPG day or a channel list,
+    running at the same time and spaces out the requests sent to the
+    provider.  Also keeps the progress of the refresh shown in the
+    status of the running scheduler task.  Only the jobs started by a
+    refresh enter the limiter, never the refresh itself, so a job never
+    waits on a worker held by its caller.
+    """
+    limiters = {}
+    limiters_lock = threading.Lock()
+
+    def __init__(self, _config, _namespace):
+        self.config = _config
+        self.namespace = _namespace
+        self.workers, self.request_delay = ProviderLimiter.get_settings(_config)
+        self.semaphore = threading.BoundedSemaphore(self.workers)
+        self.request_lock = threading.Lock()
+        self.next_request = 0.0
+        self.progress = {}
+        self.progress_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, _config, _namespace):
+        """
+        Returns the limiter for the provider, a new limiter is created
+        when the settings change
+        """
+        with cls.limiters_lock:
+            limiter = cls.limiters.get(_namespace)
+            if limiter is None \
+                    or (limiter.workers, limiter.request_delay) != cls.get_settings(_config):
+                limiter = ProviderLimiter(_config, _namespace)
+                cls.limiters[_namespace] = limiter
+            return limiter
+
+    @staticmethod
+    def get_settings(_config):
+        """
+        Returns the number of workers and the delay between requests in seconds
+        """
+        workers = max(_config['epg'].get('epg_refresh_workers') or 1, 1)
+        request_delay = max(_config['epg'].get('epg_refresh_request_delay') or 0, 0) / 1000
+        return workers, request_delay
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        self.semaphore.release()
+
+    def wait_request(self):
+        """
+        Blocks until the minimum delay since the last request to the
+        provider has passed
+        """
+        if not self.request_delay:
+            return
+        with self.request_lock:
+            now = time.monotonic()
+            wait_time = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.request_delay
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def set_progress(self, _funccall, _instance, _status):
+        """
+        Updates the status of the instance and saves the status of all
+        the instances in the running task.  A status of None removes the
+        instance from the list.
+        """
+        with self.progress_lock:
+            status_dict = self.progress.setdefault(_funccall, {})
+            if _status is None:
+                status_dict.pop(_instance, None)
+            else:
+                status_dict[_instance] = _status
+            progress = ', '.join(['{} {}'.format(inst, status)
+                                  for inst, status in sorted(status_dict.items())])
+        DBScheduler(self.config).set_progress(self.namespace, _funccall, progress or None)
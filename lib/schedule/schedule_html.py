@@ -19,6 +19,7 @@ substantial portions of the Software.
 import datetime
 import logging
 import time
+from html import escape
 
 from lib.common.decorators import getrequest
 from lib.common.decorators import postrequest
@@ -172,8 +173,12 @@ class ScheduleHTML:
                             '<div>Plugin: ', task_dict['namespace']
                             ])
             if task_dict['active']:
+                progress = ''
+                if task_dict.get('progress'):
+                    progress = ', ' + escape(task_dict['progress'])
                 html = ''.join([html,
-                                ' -- Currently Running</div><div class="progress-line"></div>'
+                                ' -- Currently Running', progress,
+                                '</div><div class="progress-line"></div>'
                                 ])
                 play_name = ''
                 play_icon = ''
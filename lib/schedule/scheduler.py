@@ -24,6 +24,7 @@ from threading import Thread
 
 import lib.schedule.schedule
 import lib.common.exceptions as exceptions
+import lib.common.utils as utils
 from lib.common.decorators import getrequest
 from lib.db.db_scheduler import DBScheduler
 from lib.web.pages.templates import web_templates
@@ -89,6 +90,9 @@ class Scheduler(Thread):
         - Loops getting queue events and runs any pending triggers
         """
         self.setup_triggers()
+        if self.config_obj.data['main']['fast_start']:
+            # let the web servers come up before running the startup tasks
+            utils.wait_for_webservers(self.config_obj.data)
         triggers = self.scheduler_db.get_triggers_by_type('startup')
         for trigger in triggers:
             self.exec_trigger(trigger)
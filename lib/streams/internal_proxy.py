@@ -33,6 +33,7 @@ import lib.m3u8 as m3u8
 import lib.streams.m3u8_queue as m3u8_queue
 from lib.common.decorators import handle_url_except
 from lib.common.decorators import handle_json_except
+from lib.common.memory_stats import MemoryStats
 from lib.streams.video import Video
 from lib.streams.atsc import ATSCMsg
 from lib.db.db_config_defn import DBConfigDefn
@@ -74,6 +75,8 @@ class InternalProxy(Stream):
         self.filter_counter = 0
         self.is_starting = True
         self.cue = False
+        self.bytes_served = 0
+        self.last_segment_size = 0
 
     def terminate(self, *args):
         try:
@@ -95,6 +98,7 @@ class InternalProxy(Stream):
         time.sleep(0.5)
         self.t_m3u8 = None
         self.clear_queues()
+        MemoryStats.unregister_stream(id(self))
 
     def stream(self, _channel_dict, _wfile, _terminate_queue):
         """
@@ -102,6 +106,7 @@ class InternalProxy(Stream):
         """
         self.config = self.db_configdefn.get_config()
         self.channel_dict = _channel_dict
+        MemoryStats.register_stream(id(self), self.get_stats)
         if not self.start_m3u8_queue_process():
             self.terminate()
             return
@@ -134,6 +139,23 @@ class InternalProxy(Stream):
         if not self.terminate_queue.empty():
             raise exceptions.CabernetException("Termination Requested")
 
+    def get_stats(self):
+        """
+        The segments waiting in the out queue are estimated using
+        the size of the last segment received
+        """
+        try:
+            queued_items = self.out_queue.qsize()
+        except NotImplementedError:
+            # not available on MacOS
+            queued_items = None
+        return {
+            'channel': self.channel_dict['uid'],
+            'type': 'InternalProxy',
+            'queued_items': queued_items,
+            'queued_bytes': (queued_items or 0) * self.last_segment_size,
+            'bytes_served': self.bytes_served}
+
     def clear_queues(self):
         self.in_queue.close()
         self.out_queue.close()
@@ -217,6 +239,7 @@ class InternalProxy(Stream):
             else:
                 self.video.data = out_queue_item['stream']
                 if self.video.data is not None:
+                    self.last_segment_size = len(self.video.data)
                     self.idle_counter = 0
                     self.last_atsc_msg = 0
                     self.last_reset_time = datetime.datetime.now()
@@ -230,6 +253,7 @@ class InternalProxy(Stream):
                     if self.check_ts_counter(uri_decoded):
                         start_ttw = time.time()
                         self.write_buffer(self.video.data)
+                        self.bytes_served += len(self.video.data)
                         delta_ttw = time.time() - start_ttw
                         self.logger.info(
                             'Serving {} {} ({})s ({}B) ttw:{:.2f}s'
@@ -36,6 +36,7 @@ import lib.common.utils as utils
 import lib.m3u8 as m3u8
 from lib.common.decorators import handle_url_except
 from lib.common.decorators import handle_json_except
+from lib.common.memory_stats import MemoryStats
 from lib.streams.atsc import ATSCMsg
 from lib.streams.video import Video
 from .pts_validation import PTSValidation
@@ -84,6 +85,7 @@ class M3U8Queue(Thread):
 
         self.pts_resync = PTSResync(_config, self.config_section, _channel_dict['uid'])
         self.key_list = {}
+        self.bytes_sent = 0
         self.start()
 
     @handle_url_except()
@@ -253,9 +255,27 @@ class M3U8Queue(Thread):
                            'stream': self.video.data,
                            'atsc': atsc_default_msg
                            })
+            self.bytes_sent += len(self.video.data)
             PLAY_LIST[uri_dt]['played'] = True
             time.sleep(0.1)
 
+    def get_stats(self):
+        """
+        The stream queue only holds the segment uris, the segment data
+        is downloaded when processed
+        """
+        try:
+            queued_items = STREAM_QUEUE.qsize()
+        except NotImplementedError:
+            queued_items = None
+        return {
+            'channel': self.channel_dict['uid'],
+            'type': 'M3U8Queue',
+            'queued_items': queued_items,
+            'queued_bytes': None,
+            'playlist': len(PLAY_LIST),
+            'bytes_served': self.bytes_sent}
+
     def is_pts_valid(self):
         if self.pts_validation is None:
             return True
@@ -606,7 +626,9 @@ def start(_config, _plugins, _m3u8_queue, _data_queue, _channel_dict, extra=None
         IN_QUEUE = _m3u8_queue
         STREAM_QUEUE = Queue(maxsize=MAX_STREAM_QUEUE_SIZE)
         OUT_QUEUE = _data_queue
+        MemoryStats.start(_config, 'M3U8Queue {}'.format(os.getpid()))
         p_m3u8 = M3U8Process(_config, _plugins, _channel_dict)
+        MemoryStats.register_stream(_channel_dict['uid'], p_m3u8.m3u8_q.get_stats)
         while not TERMINATE_REQUESTED:
             try:
                 q_item = IN_QUEUE.get()
@@ -641,3 +663,5 @@ def start(_config, _plugins, _m3u8_queue, _data_queue, _channel_dict, extra=None
     except KeyboardInterrupt:
         TERMINATE_REQUESTED = True
         sys.exit()
+    finally:
+        MemoryStats.stop()
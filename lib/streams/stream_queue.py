@@ -18,7 +18,9 @@ substantial portions of the Software.
 
 import logging
 import time
-from threading import Thread
+from threading import Lock, Thread
+
+from lib.common.memory_stats import MemoryStats
 
 
 class StreamQueue:
@@ -36,6 +38,10 @@ class StreamQueue:
         self.proc = _proc
         self.stream_id = _stream_id
         self.is_terminated = False
+        self.queued_bytes = 0
+        self.bytes_read = 0
+        # the reader thread adds to queued_bytes and read() subtracts
+        self.stats_lock = Lock()
 
         def _populate_queue():
             """
@@ -46,7 +52,9 @@ class StreamQueue:
                     self.sout.flush()
                     video_data = self.sout.read(self.bytes_per_read)
                     if video_data:
-                        self.queue.append(video_data)
+                        with self.stats_lock:
+                            self.queue.append(video_data)
+                            self.queued_bytes += len(video_data)
                     else:
                         self.logger.debug('Stream ended for this process, exiting queue thread')
                         self.is_terminated = True
@@ -55,6 +63,8 @@ class StreamQueue:
                     # occurs on termination with buffer must not be NULL
                     self.is_terminated = True
                     break
+            MemoryStats.unregister_stream(id(self))
+        MemoryStats.register_stream(id(self), self.get_stats)
         self._t = Thread(target=_populate_queue, args=())
         self._t.daemon = True
         self._t.start()  # start collecting blocks from the stream
@@ -70,10 +80,26 @@ class StreamQueue:
                 is_queue_changing = False
         
         if len(self.queue) > 0:
-            clone_queue = self.queue.copy()
-            del self.queue[:len(clone_queue)]
-            return b''.join(clone_queue)
+            with self.stats_lock:
+                clone_queue = self.queue.copy()
+                del self.queue[:len(clone_queue)]
+                self.queued_bytes -= sum([len(x) for x in clone_queue])
+            data = b''.join(clone_queue)
+            self.bytes_read += len(data)
+            return data
         return None
         
     def terminate(self):
         self.is_terminated = True
+        MemoryStats.unregister_stream(id(self))
+
+    def get_stats(self):
+        with self.stats_lock:
+            queued_items = len(self.queue)
+            queued_bytes = self.queued_bytes
+        return {
+            'channel': self.stream_id,
+            'type': 'StreamQueue',
+            'queued_items': queued_items,
+            'queued_bytes': queued_bytes,
+            'bytes_served': self.bytes_read}
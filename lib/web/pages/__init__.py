@@ -3,3 +3,4 @@ import lib.web.pages.index_js
 import lib.web.pages.web_urls
 import lib.web.pages.dashstatus_json
 import lib.web.pages.manifest
+import lib.web.pages.diagnostics_html
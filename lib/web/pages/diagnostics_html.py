@@ -0,0 +1,237 @@
+"""
+MIT License
+
+Copyright (C) 2023 ROCKY4546
+https://github.com/rocky4546
+
+This file is part of Cabernet
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+and associated documentation files (the "Software"), to deal in the Software without restriction,
+including without limitation the rights to use, copy, modify, merge, publish, distribute,
+sublicense, and/or sell copies of the Software, and to permit persons to whom the Software
+is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+"""
+
+import datetime
+import html
+import logging
+import urllib.parse
+
+import lib.common.memory_stats as memory_stats
+from lib.common.decorators import getrequest
+from lib.common.startup_timeline import get_timelines
+
+TRACE_SECONDS = 60
+
+
+@getrequest.route('/api/diagnostics')
+def get_diagnostics_html(_webserver):
+    diagnostics_html = DiagnosticsHTML(_webserver.config)
+    if 'trace' in _webserver.query_data:
+        process_name = urllib.parse.unquote(_webserver.query_data['trace'])
+        memory_stats.request_trace(_webserver.config, process_name, TRACE_SECONDS)
+    _webserver.do_mime_response(200, 'text/html', diagnostics_html.get())
+
+
+def format_bytes(_bytes):
+    if _bytes is None:
+        return ''
+    for unit in ['B', 'KB', 'MB']:
+        if abs(_bytes) < 1024:
+            return '{:.1f} {}'.format(_bytes, unit)
+        _bytes /= 1024
+    return '{:.1f} GB'.format(_bytes)
+
+
+class DiagnosticsHTML:
+
+    def __init__(self, _config):
+        self.logger = logging.getLogger(__name__)
+        self.config = _config
+
+    def get(self):
+        return ''.join([self.header, self.body])
+
+    @property
+    def header(self):
+        return ''.join([
+            '<!DOCTYPE html><html><head>',
+            '<meta charset="utf-8"/><meta name="author" content="rocky4546">',
+            '<meta name="description" content="diagnostics for Cabernet">',
+            '<title>Diagnostics</title>',
+            '<meta name="viewport" content="width=device-width, ',
+            'minimum-scale=1.0, maximum-scale=1.0">',
+            '<link rel="stylesheet" type="text/css" href="/modules/datamgmt/datamgmt.css">',
+            '<link rel="stylesheet" type="text/css" href="/modules/table/table.css">',
+            '<script src="/modules/datamgmt/datamgmt.js"></script>',
+            '</head>'
+        ])
+
+    @property
+    def title(self):
+        return ''.join([
+            '<div class="container">',
+            '<h2>Diagnostics</h2>'
+        ])
+
+    @property
+    def body(self):
+        return ''.join(['<body>', self.title, self.startup_timeline,
+                        self.memory_usage, self.memory_traces,
+                        '</div></body></html>'
+                        ])
+
+    @property
+    def startup_timeline(self):
+        """
+        Displays the startup phases of each process with the offset
+        from the start of the main process
+        """
+        timelines = get_timelines(self.config)
+        html_list = [
+            '<div class="dmSection">Startup Timeline</div>'
+        ]
+        if not timelines:
+            html_list.append('<p>No startup timeline recorded</p>')
+            return ''.join(html_list)
+
+        base_time = timelines[0]['start']
+        end_time = base_time
+        for timeline in timelines:
+            for phase in timeline['phases']:
+                end_time = max(end_time, phase['start'] + phase['duration'])
+        total = max(end_time - base_time, 0.001)
+        started = datetime.datetime.fromtimestamp(base_time).strftime('%Y-%m-%d %H:%M:%S')
+        html_list.extend([
+            '<p>Started ', started, ', last phase completed after ',
+            '{:.3f}'.format(total), ' seconds</p>',
+            '<div id="tablecontent"><table class="dmTable">',
+            '<thead><tr><th>Process</th><th>Category</th><th>Phase</th>',
+            '<th>Offset (s)</th><th>Duration (s)</th><th width="40%"></th></tr></thead>'
+        ])
+        for timeline in timelines:
+            for phase in timeline['phases']:
+                offset = phase['start'] - base_time
+                left = int(offset / total * 100)
+                width = max(int(phase['duration'] / total * 100), 1)
+                html_list.extend([
+                    '<tr><td>', html.escape(timeline['process']),
+                    ' (', str(timeline['pid']), ')</td>',
+                    '<td>', html.escape(phase['category']), '</td>',
+                    '<td>', html.escape(phase['name']), '</td>',
+                    '<td>{:.3f}</td>'.format(offset),
+                    '<td>{:.3f}</td>'.format(phase['duration']),
+                    '<td><div style="margin-left:', str(left), '%; width:', str(width),
+                    '%; height:0.8em; background: var(--theme-primary-color, #52B54B);"></div></td>',
+                    '</tr>'
+                ])
+        html_list.append('</table></div>')
+        return ''.join(html_list)
+
+    @property
+    def memory_usage(self):
+        """
+        Displays the latest memory sample for each running process
+        and the buffers queued by each stream
+        """
+        stats_list = memory_stats.get_memory_stats(self.config)
+        html_list = [
+            '<div class="dmSection">Memory Usage &nbsp; ',
+            '<a href="#" onclick=\'load_dm_url("/api/diagnostics")\'>',
+            '<i class="md-icon">refresh</i></a></div>'
+        ]
+        if not stats_list:
+            html_list.append('<p>No memory statistics recorded</p>')
+            return ''.join(html_list)
+
+        html_list.extend([
+            '<div id="tablecontent"><table class="dmTable">',
+            '<thead><tr><th>Process</th><th>RSS</th><th>Peak RSS</th>',
+            '<th>Heap Blocks</th><th>Threads</th><th>Streams</th>',
+            '<th>Queued</th><th>Sampled</th><th></th></tr></thead>'
+        ])
+        stream_list = []
+        for stats in stats_list:
+            sampled = datetime.datetime.fromtimestamp(stats['time']).strftime('%H:%M:%S')
+            trace_url = '/api/diagnostics?trace={}'.format(
+                urllib.parse.quote(stats['process']))
+            html_list.extend([
+                '<tr><td>', html.escape(stats['process']),
+                ' (', str(stats['pid']), ')</td>',
+                '<td>', format_bytes(stats['rss']), '</td>',
+                '<td>', format_bytes(stats['peak_rss']), '</td>',
+                '<td>', str(stats['heap_blocks']), '</td>',
+                '<td>', str(stats['threads']), '</td>',
+                '<td>', str(len(stats['streams'])), '</td>',
+                '<td>', format_bytes(stats['queued_bytes']), '</td>',
+                '<td>', sampled, '</td>',
+                '<td><a href="#" title="Trace allocations for ', str(TRACE_SECONDS),
+                ' seconds" onclick=\'load_dm_url("', trace_url, '")\'>Trace</a></td>',
+                '</tr>'
+            ])
+            for stream in stats['streams']:
+                stream_list.append((stats, stream))
+        html_list.append('</table></div>')
+
+        if stream_list:
+            html_list.extend([
+                '<div id="tablecontent"><table class="dmTable">',
+                '<thead><tr><th>Process</th><th>Channel</th><th>Type</th>',
+                '<th>Queued Items</th><th>Queued</th><th>Served</th>',
+                '<th>Started</th></tr></thead>'
+            ])
+            for stats, stream in stream_list:
+                started = datetime.datetime.fromtimestamp(stream['start']).strftime('%H:%M:%S')
+                queued_items = stream.get('queued_items')
+                html_list.extend([
+                    '<tr><td>', html.escape(stats['process']), '</td>',
+                    '<td>', html.escape(str(stream['channel'])), '</td>',
+                    '<td>', stream['type'], '</td>',
+                    '<td>', '' if queued_items is None else str(queued_items), '</td>',
+                    '<td>', format_bytes(stream.get('queued_bytes')), '</td>',
+                    '<td>', format_bytes(stream.get('bytes_served')), '</td>',
+                    '<td>', started, '</td></tr>'
+                ])
+            html_list.append('</table></div>')
+        return ''.join(html_list)
+
+    @property
+    def memory_traces(self):
+        """
+        Displays the allocations that grew the most during each
+        requested tracemalloc window
+        """
+        traces = memory_stats.get_memory_traces(self.config)
+        if not traces:
+            return ''
+        html_list = ['<div class="dmSection">Memory Traces</div>']
+        for trace in traces:
+            started = datetime.datetime.fromtimestamp(trace['start']).strftime('%Y-%m-%d %H:%M:%S')
+            html_list.extend([
+                '<p><b>', html.escape(trace['process']), ' (', str(trace['pid']), ')</b> ',
+                started, ' for ', str(trace['seconds']), ' seconds: ', trace['status']
+            ])
+            if trace['status'] != 'Complete':
+                html_list.append('</p>')
+                continue
+            html_list.extend([
+                ', growth ', format_bytes(trace['size_diff']),
+                ', peak traced ', format_bytes(trace['peak']), '</p>',
+                '<div id="tablecontent"><table class="dmTable">',
+                '<thead><tr><th>Location</th><th>Growth</th><th>Size</th>',
+                '<th>New Blocks</th><th>Blocks</th></tr></thead>'
+            ])
+            for stat in trace['top']:
+                html_list.extend([
+                    '<tr><td>', html.escape(stat['file']), ':', str(stat['line']), '</td>',
+                    '<td>', format_bytes(stat['size_diff']), '</td>',
+                    '<td>', format_bytes(stat['size']), '</td>',
+                    '<td>', str(stat['count_diff']), '</td>',
+                    '<td>', str(stat['count']), '</td></tr>'
+                ])
+            html_list.append('</table></div>')
+        return ''.join(html_list)
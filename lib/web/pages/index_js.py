@@ -59,6 +59,7 @@ class IndexJS:
             'lookup_title.set("/api/schedulehtml", "Cabernet Scheduler"); ',
             'lookup_title.set("/api/datamgmt", "Cabernet Data Management"); ',
             'lookup_title.set("/api/plugins", "Cabernet Plugins"); ',
+            'lookup_title.set("/api/diagnostics", "Cabernet Diagnostics"); ',
             'function load_url(url, title) {',
             '$(\"#content\").load(url);',
             'document.title = title;',